@@ -54,5 +54,6 @@ romance_score.addPart(Part(romance_chords))
 romance_score.addPart(Part(romance_bass))
 romance_score.addPart(Part(romance_arpeggio))
 
-Write.midi(romance_score, "RomanceInteraccion.mid")
+Write.midi(romance_score, "RomanceInteraccion.mid", incremental=True, async_=True)
 Play.midi(romance_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
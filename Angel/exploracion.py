@@ -76,6 +76,7 @@ exploration_valley_score.addPart(Part(exploration_arpeggio))
 exploration_valley_score.addPart(Part(ambient_wind))   
 exploration_valley_score.addPart(Part(ambient_birds)) 
 
-Write.midi(exploration_valley_score, "tema_exploracion.mid")
+Write.midi(exploration_valley_score, "tema_exploracion.mid", incremental=True, async_=True)
 
 Play.midi(exploration_valley_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
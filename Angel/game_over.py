@@ -38,6 +38,7 @@ game_over_score.addPart(Part(game_over_chords))
 game_over_score.addPart(Part(game_over_bass))
 game_over_score.addPart(Part(game_over_strings))
 
-Write.midi(game_over_score, "tema_game_over_melancolico.mid")
+Write.midi(game_over_score, "tema_game_over_melancolico.mid", incremental=True, async_=True)
 
 Play.midi(game_over_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
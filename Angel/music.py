@@ -1,5 +1,5 @@
 ##########################################################################################################################################
-# music.py      Version 4.18         25-Oct-2024       Bill Manaris, John-Anthony Thevos, Marge Marshall, Chris Benson, and Kenneth Hanson
+# music.py      Version 4.43         17-Oct-2026       Bill Manaris, John-Anthony Thevos, Marge Marshall, Chris Benson, and Kenneth Hanson
 
 ###########################################################################
 #
@@ -28,6 +28,109 @@
 #
 # REVISIONS:
 #
+# 4.43   17-Oct-2026 Added TempoMap, and tempo changes on Score (addTempoChange()), sudden or gradual (ramps), compiled into
+#				cumulative times, so beats convert to milliseconds with a binary search.  Play functions and Write.midi()
+#				follow them.  Also, a part's (or phrase's) tempo no longer carries over to the following parts (or phrases).
+#
+# 4.42   17-Oct-2026 Added Repeat, a Phrase which plays its notes several times in a row, without copying them.
+#				Play functions, Write.midi(), and playback plans expand repetitions as they go.
+#
+# 4.41   17-Oct-2026 Phrase.getNoteStartTime() (and PackedPhrase's) now uses running sums of note durations, recomputed
+#				only when material changes, so going through all notes' start times takes linear time.
+#
+# 4.40   17-Oct-2026 Phrase.addNoteList() now adds all notes in a single call into jMusic (when there are no chords),
+#				and PackedPhrase.addNoteList() appends whole columns (when all pitches are MIDI pitches).
+#
+# 4.39   17-Oct-2026 Added PackedPhrase, a phrase which stores notes in parallel arrays (instead of Java Note objects),
+#				for large phrases.  It supports Phrase's note methods (e.g., addNoteList(), getNoteList()), and can be
+#				given to Mod and Play functions in place of a Phrase.
+#
+# 4.38   17-Oct-2026 Added Write.midi(score, filename, optimize=True) (also Write.midiBytes()), which removes redundant 
+#				program, controller, pitch bend, and tempo events, uses running status, and merges tracks (format 0, 
+#				unless midiFormat=1).  Optimized output is checked against the original before it is used.
+#
+# 4.37   17-Oct-2026 Added Write.midiBytes() and Read.midiBytes(), to convert scores to and from the bytes of a MIDI 
+#				file in memory (e.g., to send cues to another process, or to cache them), without temporary files.
+#
+# 4.36   17-Oct-2026 Added NoteArrays, which holds notes in parallel arrays (start, duration, pitch, velocity, channel, 
+#				and program), instead of a Score of Note objects.  Read.midi(NoteArrays(), filename) imports into
+#				arrays, and NoteArrays convert to and from Scores (toScore(), fromScore()) and MidiTracks.
+#
+# 4.35   17-Oct-2026 Added Write.midi(score, filename, async_=True), which snapshots the score's events and writes the
+#				file on a background thread, returning a MidiWriteFuture right away.  Pending writes are finished
+#				on exit, or by Write.flush().
+#
+# 4.34   17-Oct-2026 Added MidiSequence.seek() and getPosition(), to resume a sequence from any time.  Events are 
+#				indexed once, on load (see SequenceIndex), with channel state checkpoints and a tempo map, so seeking
+#				is a binary search plus a few events, and restores instruments, controllers, and notes sounding.
+#				MidiSequence.setPitch() now keeps its place by tick position (instead of microseconds).
+#
+# 4.33   17-Oct-2026 Added SoundtrackBank, a single file packing the compiled playback plans of many cues, with an
+#				index up front.  Banks are mapped into memory, and cues (BankCue) are views into the file, so they
+#				need no parsing or copying.  Play.midi() now also accepts PlaybackPlans (e.g., bank cues).
+#
+# 4.32   17-Oct-2026 Added headless mode (see HEADLESS), where Play.midi() and Play.audio() play nothing, and the Java
+#				synthesizer is not opened.  Used by build_soundtrack.py, which builds all scenes in parallel.
+#
+# 4.31   17-Oct-2026 Added incremental mode to Write.midi(), which writes a MIDI file only if its content has changed,
+#				using content hashes kept in a manifest next to the files (see MIDI_MANIFEST).
+#
+# 4.30   17-Oct-2026 Added MidiFile (and Read.midiFile()), which maps a MIDI file into memory, locates its tracks, and decodes 
+#				their events lazily (only as far as needed) into MidiTracks.  Getting a file's tempo and length no longer
+#				requires parsing it into a Score.  MidiSequence(filename) now loads the score only when first needed.
+#
+# 4.29   17-Oct-2026 Write.midi() now writes standard MIDI files itself (see MidiTrack), instead of going through jMusic.
+#				Files are byte for byte the same as jMusic's.  Added Write.midi(..., runningStatus=True) for smaller files, and
+#				writing from MidiTracks filled directly from note arrays (see MidiTrack.addNotes()).
+#
+# 4.28   17-Oct-2026 Play.code() functions are now called by a bounded pool of worker threads (see CallbackExecutor), one call
+#				at a time per channel, so slow functions no longer delay the music or other triggers.  Added Play.code(..., batch=True)
+#				to combine notes starting together on a channel into one call, Play.code(..., overrun="queue"/"drop"/"coalesce"), 
+#				Play.setCodeWorkers(), and Play.getCodeStats() (including missed deadlines).
+#
+# 4.27   17-Oct-2026 Added SchedulingMonitor and LatencyHistogram, to measure how late events are dispatched compared to 
+#				their scheduled time.  Turn on via Play.setInstrumentation(True), then see Play.getLatency(channel), a playback
+#				handle's getLatency() (median, 99th percentile, and max lateness), and Play.getSchedulingCounts().
+#
+# 4.26   17-Oct-2026 Scores are now flattened by lazily merging their phrases (which are already in time order), instead of
+#				collecting all notes and sorting them.  Added Play.midi(material, streaming=True) and Play.audio(..., streaming=True), 
+#				which pull notes into the scheduler only a window (STREAMING_WINDOW) ahead of playback, so the first note
+#				plays right away, and memory stays flat, regardless of score length.
+#
+# 4.25   17-Oct-2026 Chords are now onsets in PlaybackPlan (i.e., notes that start together, stored next to each other).
+#				They are collected per phrase while compiling (no sorting and accumulation of zero-duration notes), and 
+#				Play.midi() and Play.audio() schedule each chord as one event, so all its notes start in the same dispatch.
+#
+# 4.24   17-Oct-2026 Added MidiChannelState, a shadow of the Java synthesizer's channel state (instrument, volume, panning,
+#				and pitch bend).  Play functions now send these messages only when the state actually changes (e.g., 
+#				Play.midi() sends about one message per note, instead of four), and channel handles are looked up once.
+#
+# 4.23   17-Oct-2026 notesCurrentlyPlaying is now an ActiveNotes table, which counts instances of each (pitch, channel), 
+#				instead of a list.  Play.frequencyOn() and Play.frequencyOff() take constant time, are thread-safe, and
+#				turning off a note that is not sounding no longer raises an error.
+#
+# 4.22   17-Oct-2026 Play.midi(), Play.audio(), and Play.code() now return a PlaybackHandle, which can cancel(), pause(), 
+#				and resume() all events of that playback at once (in constant time, regardless of how many are pending).  
+#				Cancelling or pausing also turns off the playback's sounding notes.  Play.code() now uses its own 
+#				EventScheduler (instead of Timer2 objects), and Play.stop() cancels all playbacks.
+#
+# 4.21   17-Oct-2026 Added PlaybackPlan.  Play.midi(), Play.audio(), and Play.code() no longer flatten and sort the whole
+#				score on every call.  The score is compiled once into a plan (notes ordered by start time, in flat arrays),
+#				which is cached against a fingerprint of the material's content.  Mod functions, Phrase.addNoteList(),
+#				Phrase.addChord(), and Note.setDuration() record material changes (see MaterialCallable), so plans are
+#				recompiled only when needed.  Replaying a theme now costs only scheduling.
+#
+# 4.20   17-Oct-2026 Added Play.midi(material, engine="sequencer").  It compiles the material into a javax.sound.midi Sequence
+#				(including instrument, panning, and pitch bend for microtones), which is played by a Java Sequencer wired to
+#				Java_synthesizer.  This way, Java does the timing, and no Python code runs while the music is playing.
+#				Sequencers are reused when idle.  Default engine is "timer" (i.e., our own EventScheduler).
+#
+# 4.19   17-Oct-2026 Added EventScheduler - a single dispatcher thread servicing a time-ordered heap of future events.
+#				Play.midi(), Play.audio(), Play.note(), Play.frequency(), and Play.audioNote() now use it, instead of creating
+#				two Timer2 objects (and threads) per note.  Thread count stays flat regardless of score size.  Also, the
+#				dispatcher wakes up a little before an event is due (see Play.setLookahead()) and waits out the rest precisely,
+#				dispatching all due events together - this reduces timing jitter under load.
+#
 # 4.18   25-Oct-2024 (bm) Fixed a bug in Play.audio() that prevented AudioSamples with a loopFlag set to True to loop.
 #				It had to do with intializing default loopFlags and Envelopes properly.
 #
@@ -765,6 +868,55 @@ class Callable:
         self.__call__ = functionName
 
 
+# Keep track of changes to musical material (e.g., via Mod functions, or Phrase.addNoteList()), so that 
+# anything compiled from material (e.g., playback plans, see Play.midi()) knows when to be recompiled.
+# Every Phrase also keeps its own version (see Phrase.__notesChanged__()), so a change to one phrase does not 
+# invalidate what was compiled from others.
+__materialVersion__ = 0    # incremented every time material is (or may have been) changed
+
+def __touchMaterial__(*materials):
+   """Records that some musical material has changed.  If given, the versions of the Phrases in 'materials'
+      (Scores, Parts, or Phrases) are also incremented.
+   """
+
+   global __materialVersion__
+   __materialVersion__ = __materialVersion__ + 1
+
+   for material in materials:
+      for phrase in __phrasesOf__(material):
+         if isinstance(phrase, Phrase):   # one of ours? (only they have a version)
+            phrase.notesVersion = phrase.__dict__.get("notesVersion", 0) + 1
+
+def __phrasesOf__(material):
+   """Returns the phrases in 'material' (a Score, Part, or Phrase - anything else has none)."""
+
+   if isinstance(material, jScore):
+      return [phrase for part in material.getPartArray() for phrase in part.getPhraseArray()]
+   elif isinstance(material, Part):
+      return list( material.getPhraseArray() )
+   elif isinstance(material, jPhrase):
+      return [material]
+   else:
+      return []
+
+# A wrapper, similar to Callable, for functions that modify musical material (e.g., Mod functions).
+# PackedPhrases (see PackedPhrase) are given to these functions as Phrases, and then updated from them.
+class MaterialCallable(Callable):
+    def __init__(self, functionName):
+        def call(*arguments):
+           packed = [(i, arguments[i]) for i in range(len(arguments)) if isinstance(arguments[i], PackedPhrase)]
+           if packed != []:                    # any PackedPhrases?
+              arguments = list(arguments)         # yes, so unpack them
+              for i, packedPhrase in packed:
+                 arguments[i] = packedPhrase.toPhrase()
+           result = functionName(*arguments)   # modify the material...
+           for i, packedPhrase in packed:
+              packedPhrase.setPhrase( arguments[i] )   # (repack modified phrases)
+           __touchMaterial__(*arguments)       # ...and record that it has changed
+           return result
+        self.__call__ = call
+
+
 ######################################################################################
 #### jMusic Mod extensions #########################################################
 ######################################################################################
@@ -828,11 +980,11 @@ class Mod(jMod):
             elongatePart(part, scaleFactor)
       
       # check type of material and call the appropriate function
-      if type(material) == Score:
+      if isinstance(material, jScore):
          elongateScore(material, scaleFactor)
       elif type(material) == Part:
          elongatePart(material, scaleFactor)
-      elif type(material) == Phrase or type(material) == jPhrase:
+      elif isinstance(material, jPhrase):   # (our Phrases, Repeats, and jMusic default Phrases)
          elongatePhrase(material, scaleFactor)
       elif type(material) == Note:
          elongateNote(material, scaleFactor)
@@ -869,11 +1021,11 @@ class Mod(jMod):
          raise TypeError( "Unrecognized time type " + str(type(time)) + " - expected int or float." )
 
       # check type of material and call the appropriate function
-      if type(material) == Score:
+      if isinstance(material, jScore):
          shiftScore(material, time)
       elif type(material) == Part:
          shiftPart(material, time)
-      elif type(material) == Phrase or type(material) == jPhrase:
+      elif isinstance(material, jPhrase):   # (our Phrases, Repeats, and jMusic default Phrases)
          shiftPhrase(material, time)
       else:   # error check   
          raise TypeError( "Unrecognized material type " + str(type(material)) + " - expected Phrase, Part, or Score." )
@@ -897,12 +1049,12 @@ class Mod(jMod):
             score1.addPart(part)
       
       # check type of material and call the appropriate function
-      if type(material1) == Score and type(material2) == Score:
+      if isinstance(material1, jScore) and isinstance(material2, jScore):
          mergeScores(material1, material2)
       elif type(material1) == Part and type(material2) == Part:
          mergeParts(material1, material2)
-      elif (type(material1) == Part and type(material2) == Score) or \
-           (type(material1) == Score and type(material2) == Part):
+      elif (type(material1) == Part and isinstance(material2, jScore)) or \
+           (isinstance(material1, jScore) and type(material2) == Part):
          raise TypeError( "Cannot merge Score and Part - arguments must be of the same type (both Score or both Part)." )
       else:       
          raise TypeError( "Arguments must be both either Score or Part." )
@@ -982,24 +1134,37 @@ class Mod(jMod):
 
 
       # check type of material and call the appropriate function
-      if type(material) == Score:
+      if isinstance(material, jScore):
          retrogradeScore(material)
       elif type(material) == Part:
          retrogradePart(material)
-      elif type(material) == Phrase or type(material) == jPhrase:
+      elif isinstance(material, jPhrase):   # (our Phrases, Repeats, and jMusic default Phrases)
          jMod.retrograde(material)
       else:   # error check   
          raise TypeError( "Unrecognized material type " + str(type(material)) + " - expected Phrase, Part, or Score." )
 
 
    # make these function callable without having to instantiate this class
-   normalize = Callable(normalize)  
-   invert = Callable(invert)  
-   mutate = Callable(mutate)  
-   elongate = Callable(elongate)  
-   shift = Callable(shift)  
-   merge = Callable(merge)
-   retrograde = Callable(retrograde)
+   # (since they modify material, also record the change - see MaterialCallable)
+   normalize = MaterialCallable(normalize)  
+   invert = MaterialCallable(invert)  
+   mutate = MaterialCallable(mutate)  
+   elongate = MaterialCallable(elongate)  
+   shift = MaterialCallable(shift)  
+   merge = MaterialCallable(merge)
+   retrograde = MaterialCallable(retrograde)
+
+# also wrap the jMusic Mod functions which modify material (e.g., Mod.transpose()), so that they record changes,
+# and accept PackedPhrases, too (only those present in this jMusic version)
+MATERIAL_MOD_FUNCTIONS = ["accents", "append", "bounce", "changeLength", "compress", "consolidate", "crescendo",
+                          "cycle", "decrescendo", "diminuendo", "expandIntervals", "fadeIn", "fadeOut", "fillRests",
+                          "increaseDynamic", "inversion", "palindrome", "quantise", "quantize", "randomize", "repeat",
+                          "rotate", "shake", "shuffle", "slurDown", "slurUp", "spread", "tiePitches", "tieRests",
+                          "transpose", "varyLength"]
+for name in MATERIAL_MOD_FUNCTIONS:
+   if hasattr(jMod, name):
+      setattr(Mod, name, MaterialCallable(getattr(jMod, name)))
+del name
    
    
 ######################################################################################
@@ -1056,16 +1221,66 @@ from image import *                # import Image class and related Java librari
 class Read(jRead):
 
    def midi(score, filename):
-      """Import a standard MIDI file to a jMusic score."""
+      """Import a standard MIDI file to a jMusic score.  If 'score' is NoteArrays, notes are imported into
+         its arrays instead (this is much lighter - see NoteArrays)."""
       
       # JEM working directory fix (see above)
       filename = fixWorkingDirForJEM( filename )   # does nothing if not in JEM
+
+      # importing into arrays?
+      if isinstance(score, NoteArrays):
+         score.addTracks( MidiFile(filename).getTracks() )   # yes, so no need for jMusic
+         return
       
       # use fixed filename with jMusic's Read.midi() 
       jRead.midi(score, filename)
 
+   def midiFile(filename):
+      """Opens a standard MIDI file for lazy reading (see MidiFile).  This is much faster than Read.midi(), 
+         e.g., to check a file's tempo and length, or to get some of its events."""
+
+      return MidiFile(filename)
+
+   def midiBytes(data, score=None):
+      """Imports the bytes of a standard MIDI file (a string, bytearray, memoryview, array, or Java byte array), 
+         without going through a file.  Returns a jMusic score (or imports into 'score', if given - this may 
+         also be NoteArrays)."""
+
+      data = __byteString__(data)
+
+      if score == None:
+         score = Score()
+
+      if isinstance(score, NoteArrays):   # importing into arrays?
+         score.addTracks( MidiFile(data=data).getTracks() )   # yes, so no need for jMusic
+      else:                               # no, so let jMusic parse it (as Read.midi() does, but from memory)
+         smf = SMF()
+         smf.read( ByteArrayInputStream( jarray.array(array.array('b', data), 'b') ) )
+         MidiParser.SMFToScore(score, smf)
+
+      return score
+
    # make this function callable without having to instantiate this class
    midi = Callable(midi)  
+   midiFile = Callable(midiFile)
+   midiBytes = Callable(midiBytes)
+
+from jm.midi import SMF, MidiParser       # needed to read MIDI bytes (see Read.midiBytes())
+from java.io import ByteArrayInputStream
+
+def __byteString__(data):
+   """Returns these bytes (a string, bytearray, memoryview, array, or Java byte array) as a string."""
+
+   if type(data) == str:
+      return data
+   elif isinstance(data, memoryview):
+      return data.tobytes()
+   elif isinstance(data, array.array):
+      return data.tostring()
+   elif isinstance(data, bytearray):
+      return str(data)
+   else:      # a Java byte array, or a list of byte values
+      return "".join([chr(byte & 0xFF) for byte in data])   # (Java bytes are signed)
 
 ######################################################################################
 #### jMusic Write extensions #########################################################
@@ -1073,15 +1288,1086 @@ class Read(jRead):
 
 from jm.util import Write as jWrite  # needed to wrap more functionality below
 
+
+##################################################################################################################
+# Standard MIDI File writer
+#
+# Write.midi() used to hand the score to jMusic's Write.midi(), which goes through jMusic's whole SMF object model
+# (and prints a dot for every note).  Now we write the bytes ourselves - the output is the same as jMusic's (i.e., 
+# format 1, 480 ticks per quarter note, a tempo/time signature/key signature track, then one track per part), so 
+# existing .mid files are reproduced byte for byte.  Optionally, running status can be used to make files smaller.
+#
+# Events are first collected in MidiTracks (flat arrays of times, in quarter notes, and message bytes), which can also 
+# be filled directly from arrays of notes (see MidiTrack.addNotes()), and then serialized (see __midiTracksToBytes__()).
+
+import array      # needed to store track events, and to build file bytes
+import math       # needed for time signature denominators
+import bisect     # needed to find events within a time range (see MidiFile)
+import jarray     # needed to copy bytes from Java (see MidiFile)
+
+MIDI_RESOLUTION = 480     # ticks per quarter note (same as jMusic)
+
+class MidiTrack():
+   """Holds the events of a MIDI track, in flat arrays (times are in quarter notes, from the start of the piece)."""
+
+   def __init__(self):
+
+      self.times = array.array('d')      # event times (in quarter notes)
+      self.statuses = array.array('i')   # status bytes (e.g., 0x90 for note-on on channel 0), or 0xFF for meta events (0xF0 or 0xF7 for system exclusive)
+      self.data1 = array.array('i')      # first data byte, or meta event type
+      self.data2 = array.array('i')      # second data byte, or index of meta event (or system exclusive) data (see metaData)
+      self.metaData = []                 # holds data bytes of meta (and system exclusive) events (lists of ints)
+
+   def addEvent(self, time, status, data1, data2=0):
+      """Adds a MIDI channel message (e.g., note-on) at 'time' (in quarter notes)."""
+
+      self.times.append( time )
+      self.statuses.append( status )
+      self.data1.append( data1 )
+      self.data2.append( data2 )
+
+   def addMeta(self, time, metaType, data):
+      """Adds a meta event (e.g., 0x51 for tempo) with 'data' (a list of ints) at 'time' (in quarter notes)."""
+
+      self.addEvent( time, 0xFF, metaType, len(self.metaData) )
+      self.metaData.append( data )
+
+   def addTempo(self, time, tempo):
+      """Adds a tempo change (in beats per minute) at 'time' (in quarter notes)."""
+
+      microseconds = int(60000000.0 / tempo)    # microseconds per quarter note
+      self.addMeta( time, 0x51, [(microseconds >> 16) & 0xFF, (microseconds >> 8) & 0xFF, microseconds & 0xFF] )
+
+   def addNotes(self, starts, lengths, pitches, dynamics, channel=0):
+      """Adds notes from parallel arrays of start times and lengths (in quarter notes), MIDI pitches, and dynamics.  
+         Each note becomes a note-on, and a note-on with velocity 0 at its end (as jMusic does).  Rests are skipped.
+      """
+
+      status = 0x90 | channel
+      for i in range( len(starts) ):
+         if pitches[i] != REST:
+            self.addEvent( starts[i], status, pitches[i], dynamics[i] )
+            self.addEvent( starts[i] + lengths[i], status, pitches[i], 0 )
+
+   def size(self):
+      """Returns the number of events in the track."""
+
+      return len(self.times)
+
+
+class __TickRounder__():
+   """Rounds note durations to whole ticks, carrying the remainder over to the next note (so that times do not 
+      drift).  This is exactly how jMusic does it, so we do too (to produce identical files)."""
+
+   def __init__(self, resolution=MIDI_RESOLUTION):
+      self.tick = 1.0 / resolution
+      self.halfTick = 1.0 / (resolution * 2)
+      self.remainder = 0.0
+
+   def round(self, time):
+      rounded = int(time / self.tick) * self.tick
+      self.remainder = self.remainder + (time - rounded)
+      if self.remainder > self.halfTick:
+         rounded = rounded + self.tick
+         self.remainder = self.remainder - self.tick
+      return rounded
+
+
+def __scoreToMidiTracks__(score, asJMusic=False):
+   """Converts a score to a list of MidiTracks, the same way jMusic does (first track holds tempo, time signature,
+      and key signature - then, there is one track per part).  
+      Tempos follow the same rule as Play.midi() (see __scoreOnsets__()):  The score's tempo changes (see TempoMap) 
+      go in the first track, and a part (or phrase) with its own tempo is played at that tempo, i.e., its notes are
+      placed where they fall in time.  If 'asJMusic' is True, tempos are as jMusic itself plays them (the score tempo
+      only, plus a tempo event for each part with its own tempo), e.g., to index what MidiSynth plays."""
+
+   scoreTempo = score.getTempo()
+   if asJMusic:
+      tempoMap = TempoMap( scoreTempo )
+   else:
+      tempoMap = __tempoMapOf__(score)
+
+   # first track holds global information
+   track = MidiTrack()
+   for beat, tempo in tempoMap.getTempoEvents():   # (just the score tempo, unless it has tempo changes)
+      track.addTempo( beat, tempo )
+   denominator = int( round( math.log(score.getDenominator()) / math.log(2) ) )   # MIDI stores denominator as a power of 2
+   track.addMeta( 0.0, 0x58, [score.getNumerator(), denominator, 24, 8] )
+   track.addMeta( 0.0, 0x59, [score.getKeySignature() & 0xFF, score.getKeyQuality()] )
+   tracks = [track]
+
+   # then, one track per part
+   for part in score.getPartArray():
+      track = MidiTrack()
+      channel = part.getChannel()
+
+      # set up tempo difference between score and part - if any
+      partTempoRatio = 1.0
+      if part.getTempo() > -1:    # has the part tempo been set?
+         partTempoRatio = scoreTempo / part.getTempo()
+         if asJMusic:
+            track.addTempo( 0.0, part.getTempo() )
+
+      if part.getInstrument() > -1:    # has the part instrument been set?
+         track.addEvent( 0.0, 0xC0 | channel, part.getInstrument() )
+
+      # go through phrases, ordered by start time
+      phrases = list( part.getPhraseArray() )
+      phrases.sort( key=lambda phrase: phrase.getStartTime() )
+      for phrase in phrases:
+         if phrase.getInstrument() > -1:    # has the phrase instrument been set?
+            track.addEvent( 0.0, 0xC0 | channel, phrase.getInstrument() )
+
+         phraseTempoRatio = partTempoRatio
+         if phrase.getTempo() > -1:         # has the phrase tempo been set?
+            phraseTempoRatio = scoreTempo / phrase.getTempo()
+         ownTempo = part.getTempo() > -1 or phrase.getTempo() > -1
+
+         if asJMusic:                       # (jMusic places phrases using the part tempo only)
+            startTime = phrase.getStartTime() * partTempoRatio
+         else:
+            startTime = phrase.getStartTime() * phraseTempoRatio
+
+         # times below are in quarter notes at the score tempo - if the phrase has its own tempo, and the score has 
+         # tempo changes, place them where they fall in time, in the score's beats
+         place = None
+         if ownTempo and not tempoMap.isConstant():
+            place = lambda time: tempoMap.toBeats( time * 60000.0 / scoreTempo )
+
+         pan = -1.0                          # force a panning message before the first note
+         rounder = __TickRounder__()         # durations are rounded to ticks within each phrase
+         for note in __phraseNotes__(phrase):     # (a Repeat's notes are written as many times as they are played)
+            offset = note.getOffset()
+            onTime = startTime + offset
+            offTime = startTime + note.getLength() * phraseTempoRatio + offset
+            if place != None:
+               onTime, offTime = place(onTime), place(offTime)
+
+            # add a panning message, if panning has changed
+            if note.getPan() != pan:
+               pan = note.getPan()
+               track.addEvent( onTime, 0xB0 | channel, 10, int(pan * 127) )
+
+            frequency = note.getFrequency()
+            if frequency != float(REST):    # skip rests (they only advance time)
+               pitch, bend = freqToNote( frequency )    # (frequencies are rounded to the closest MIDI pitch, as in jMusic)
+               track.addEvent( onTime, 0x90 | channel, pitch, note.getDynamic() )
+               track.addEvent( offTime, 0x90 | channel, pitch, 0 )
+
+            # move forward by the note's duration (rounded to ticks)
+            startTime = startTime + rounder.round( note.getDuration() * phraseTempoRatio )
+
+      tracks.append( track )
+
+   return tracks
+
+
+def __writeVariableLength__(out, value):
+   """Appends 'value' to 'out' (an array of bytes) as a MIDI variable-length quantity."""
+
+   buffer = [value & 0x7F]
+   value = value >> 7
+   while value > 0:
+      buffer.append( (value & 0x7F) | 0x80 )
+      value = value >> 7
+   buffer.reverse()
+   out.extend( buffer )
+
+def __midiTrackToBytes__(track, resolution=MIDI_RESOLUTION, runningStatus=False):
+   """Returns the bytes of a MIDI track chunk ("MTrk")."""
+
+   # order events by time (keeping the order they were added for events with the same time, as jMusic does)
+   order = range( track.size() )
+   order.sort( key=lambda i: track.times[i] )    # (sort is stable)
+
+   # write events with delta times (rounded to ticks, and measured from the previous *rounded* time, as jMusic does)
+   out = array.array('B')
+   previousTime = 0.0      # time of previous event (in quarter notes)
+   lastStatus = None       # status of previous channel message (for running status)
+   for i in order:
+      ticks = int( (track.times[i] - previousTime) * resolution + 0.5 )
+      previousTime = previousTime + float(ticks) / resolution
+      __writeVariableLength__( out, ticks )
+
+      status = track.statuses[i]
+      if status == 0xFF:    # a meta event?
+         data = track.metaData[ track.data2[i] ]
+         out.extend( [0xFF, track.data1[i]] )
+         __writeVariableLength__( out, len(data) )
+         out.extend( data )
+         lastStatus = None     # meta events cancel running status
+      elif status == 0xF0 or status == 0xF7:    # a system exclusive event?
+         data = track.metaData[ track.data2[i] ]
+         out.append( status )
+         __writeVariableLength__( out, len(data) )
+         out.extend( data )
+         lastStatus = None     # so do system exclusive events
+      else:                 # a channel message
+         if not runningStatus or status != lastStatus:   # (with running status, repeated status bytes are omitted)
+            out.append( status )
+         lastStatus = status
+         out.append( track.data1[i] )
+         if status & 0xF0 != 0xC0 and status & 0xF0 != 0xD0:   # program change and channel pressure have one data byte
+            out.append( track.data2[i] )
+
+   # end of track
+   out.extend( [0x00, 0xFF, 0x2F, 0x00] )
+
+   # and wrap it into a chunk
+   chunk = array.array('B', "MTrk")
+   length = len(out)
+   chunk.extend( [(length >> 24) & 0xFF, (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF] )
+   chunk.extend( out )
+
+   return chunk
+
+def __midiTracksToBytes__(tracks, resolution=MIDI_RESOLUTION, runningStatus=False, midiFormat=1):
+   """Returns the bytes of a standard MIDI file (format 1, or format 0 for a single track) holding these MidiTracks, 
+      as a string."""
+
+   out = array.array('B', "MThd")
+   out.extend( [0, 0, 0, 6,                                           # header length
+                0, midiFormat,                                        # format 1 (multiple tracks), or 0 (one track)
+                (len(tracks) >> 8) & 0xFF, len(tracks) & 0xFF,        # number of tracks
+                (resolution >> 8) & 0xFF, resolution & 0xFF] )        # ticks per quarter note
+   for track in tracks:
+      out.extend( __midiTrackToBytes__(track, resolution, runningStatus) )
+
+   return out.tostring()
+
+
+
+##################################################################################################################
+# MIDI export optimizer
+#
+# Write.midi(score, filename, optimize=True) makes files smaller (and faster to parse), e.g., for banks and downloads:
+#
+#   - redundant events are removed, i.e., program changes, controller changes (e.g., the panning jMusic sends at 
+#     the start of every phrase), pitch bends, and tempos which do not change anything,
+#   - note-offs are sent as note-ons with velocity 0 (so running status covers them too),
+#   - running status is used, and
+#   - all tracks are merged into one (format 0), unless format 1 is requested (e.g., to keep parts apart for editing).
+#
+# The result is decoded again and compared to the original (notes, and the channel state when each note starts).  
+# If they differ, the original is written instead.
+
+# controllers which are not state, i.e., repeating them is not redundant (data entry, (N)RPN, and channel mode messages)
+NON_STATE_CONTROLLERS = [6, 38, 96, 97, 98, 99, 100, 101] + range(120, 128)
+RESET_ALL_CONTROLLERS = 121    # after this, a channel's controllers and pitch bend are no longer known
+
+def __optimizeMidiTracks__(tracks, resolution=MIDI_RESOLUTION, midiFormat=0):
+   """Returns optimized MidiTracks (one if 'midiFormat' is 0) with the same musical content (see above)."""
+
+   # get all events in the order they will be written, with times rounded to ticks (as the writer does)
+   events = []      # holds (tick, track index, order, event index)
+   for trackIndex in range( len(tracks) ):
+      track = tracks[trackIndex]
+      order = range( track.size() )
+      order.sort( key=lambda i: track.times[i] )    # (sort is stable)
+      previousTime = 0.0
+      for k in range( len(order) ):
+         i = order[k]
+         ticks = int( (track.times[i] - previousTime) * resolution + 0.5 )
+         previousTime = previousTime + float(ticks) / resolution
+         events.append( (int( round(previousTime * resolution) ), trackIndex, k, i) )
+   events.sort()     # in time order (ties keep track order, as the tracks are played together)
+
+   # copy events which change something
+   if midiFormat == 0:
+      optimized = [MidiTrack()]
+   else:
+      optimized = [MidiTrack() for track in tracks]
+   programs = {}       # holds current program, indexed by channel
+   controllers = {}    # holds current controller value, indexed by (channel, controller)
+   pitchBends = {}     # holds current pitch bend (both data bytes), indexed by channel
+   tempo = None        # current tempo (meta event data)
+   for ticks, trackIndex, k, i in events:
+      track = tracks[trackIndex]
+      target = optimized[ min(trackIndex, len(optimized) - 1) ]
+      time = float(ticks) / resolution
+      status = track.statuses[i]
+      data1 = track.data1[i]
+      data2 = track.data2[i]
+      command = status & 0xF0
+      channel = status & 0x0F
+
+      if status == 0xFF or status == 0xF0 or status == 0xF7:   # meta (or system exclusive) event?
+         data = track.metaData[data2]
+         if status == 0xFF and data1 == 0x51:     # a tempo?
+            if data == tempo:                        # no change?
+               continue                                 # so skip it
+            tempo = data
+         target.times.append( time )
+         target.statuses.append( status )
+         target.data1.append( data1 )
+         target.data2.append( len(target.metaData) )
+         target.metaData.append( data )
+         continue
+
+      if command == 0x80:                  # note off?
+         status, data2 = 0x90 | channel, 0    # as a note on, with velocity 0
+      elif command == 0xC0:                # program change
+         if programs.get(channel) == data1:   # no change?
+            continue                             # so skip it
+         programs[channel] = data1
+      elif command == 0xB0 and data1 == RESET_ALL_CONTROLLERS:      # controllers reset (to the synthesizer's defaults)
+         for key in controllers.keys():
+            if key[0] == channel:
+               del controllers[key]                  # so, what follows changes something
+         pitchBends.pop( channel, None )
+      elif command == 0xB0 and data1 not in NON_STATE_CONTROLLERS:   # controller change
+         if controllers.get( (channel, data1) ) == data2:   # no change?
+            continue                                          # so skip it
+         controllers[(channel, data1)] = data2
+      elif command == 0xE0:                # pitch bend
+         if pitchBends.get(channel) == (data1, data2):   # no change?
+            continue                                        # so skip it
+         pitchBends[channel] = (data1, data2)
+
+      target.addEvent( time, status, data1, data2 )
+
+   return optimized
+
+def __midiSignature__(data):
+   """Returns what matters musically in these MIDI file bytes - when notes start (with the state of their channel 
+      at that time) and end - used to check that optimizing did not change anything."""
+
+   tracks = MidiFile(data=data).getTracks()
+   events = []
+   for trackIndex in range( len(tracks) ):
+      track = tracks[trackIndex]
+      for i in range( track.size() ):
+         status = track.statuses[i]
+         if status == 0xFF and track.data1[i] == 0x51:     # tempo
+            events.append( (track.times[i], trackIndex, i, status, 0x51, tuple(track.metaData[track.data2[i]])) )
+         elif 0x80 <= status < 0xF0:                        # channel message
+            events.append( (track.times[i], trackIndex, i, status, track.data1[i], track.data2[i]) )
+   events.sort()
+
+   signature = []
+   state = SequenceState()
+   tempo = None
+   for time, trackIndex, i, status, data1, data2 in events:
+      channel = status & 0x0F
+      if status == 0xFF:
+         tempo = data2
+      elif status & 0xF0 == 0x90 and data2 > 0:   # a note starts
+         signature.append( (time, channel, data1, data2, tempo, state.programs.get(channel), state.pitchBends.get(channel),
+                            tuple(sorted([(key, value) for key, value in state.controllers.items() if key[0] == channel]))) )
+      elif status & 0xF0 == 0x80 or status & 0xF0 == 0x90:   # a note ends
+         signature.append( (time, channel, data1, 0) )
+      state.update( status, data1, data2 )
+
+   signature.sort()
+   return signature
+
+def __encodeMidiTracks__(tracks, runningStatus=False, optimize=False, midiFormat=None):
+   """Returns the bytes of a standard MIDI file for these tracks, optimized if so requested (see above)."""
+
+   data = __midiTracksToBytes__(tracks, MIDI_RESOLUTION, runningStatus)
+   if not optimize:
+      return data
+
+   if midiFormat == None:
+      midiFormat = 0                  # smallest (and fastest to parse)
+   optimized = __midiTracksToBytes__( __optimizeMidiTracks__(tracks, MIDI_RESOLUTION, midiFormat), MIDI_RESOLUTION, True, midiFormat )
+
+   # make sure nothing has changed
+   signature = __midiSignature__(data)
+   optimizedSignature = __midiSignature__(optimized)
+   if optimizedSignature != signature:
+      first = 0     # find the first difference (for the message)
+      while first < min(len(signature), len(optimizedSignature)) and signature[first] == optimizedSignature[first]:
+         first = first + 1
+      if first < len(signature):
+         time = signature[first][0]
+      else:
+         time = optimizedSignature[first][0]
+      print "Write.midi(): Optimized MIDI data differs from the original at quarter note " + str(time) + ", so it is not optimized."
+      return data
+
+   return optimized
+
 # Create Write.image(image, "test.jpg") to write an image to file, in addition 
 # to Write's default functionality.
 # This class is not meant to be instantiated, hence no "self" in function definitions.
 # Functions are made callable through class Callable, above.
 
+##################################################################################################################
+# Standard MIDI File reader
+#
+# Read.midi() (and MidiSequence(filename)) parse a whole MIDI file into a jMusic Score, before anything else can
+# happen.  For large files, this is slow, even if we only want to peek at the tempo or length.  A MidiFile instead 
+# maps the file into memory, and only indexes where the tracks are (reading just a few bytes per track).  Tracks
+# are decoded lazily, into MidiTracks (see above), and only as far as needed (e.g., for the events within a time range).
+
+from java.io import RandomAccessFile       # needed to map MIDI files into memory
+from java.nio.channels import FileChannel
+
+class __MappedBytes__():
+   """Read-only access to the bytes of a file, mapped into memory."""
+
+   def __init__(self, filename):
+      randomAccessFile = RandomAccessFile(filename, "r")
+      try:
+         channel = randomAccessFile.getChannel()
+         self.buffer = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size())   # (stays valid after closing)
+      finally:
+         randomAccessFile.close()
+
+   def size(self):
+      return self.buffer.capacity()
+
+   def getBytes(self, start, end):
+      """Returns the bytes from 'start' up to (but not including) 'end', as an array of unsigned bytes."""
+      javaBytes = jarray.zeros(end - start, 'b')
+      view = self.buffer.duplicate()        # (so that concurrent readers do not disturb each other's position)
+      view.position(start)
+      view.get(javaBytes)
+      return array.array('B', [b & 0xFF for b in javaBytes])   # Java bytes are signed
+
+class __MemoryBytes__():
+   """Read-only access to bytes in memory (e.g., a string), with the same interface as __MappedBytes__."""
+
+   def __init__(self, data):
+      self.data = array.array('B', data)
+
+   def size(self):
+      return len(self.data)
+
+   def getBytes(self, start, end):
+      return self.data[start:end]
+
+
+class MidiFile():
+   """A standard MIDI file, decoded lazily.  Opening it only reads the header and locates the tracks.
+      Track events are decoded on demand, into MidiTracks (times are in quarter notes).
+   """
+
+   def __init__(self, filename=None, data=None):
+
+      if filename != None:      # read from a file?
+         filename = fixWorkingDirForJEM( filename )   # JEM working directory fix (does nothing if not in JEM)
+         self.bytes = __MappedBytes__(filename)
+      else:                     # no, from bytes in memory
+         self.bytes = __MemoryBytes__(data)
+      self.filename = filename
+
+      # read header
+      header = self.bytes.getBytes(0, 14)
+      if header[0:4].tostring() != "MThd":
+         raise ValueError, "MidiFile: Not a standard MIDI file (" + str(filename) + ")."
+      headerLength = __readInt__(header, 4, 4)
+      self.format = __readInt__(header, 8, 2)          # 0 (one track), 1 (many tracks), or 2 (many sequences)
+      trackCount = __readInt__(header, 10, 2)
+      self.resolution = __readInt__(header, 12, 2)     # ticks per quarter note
+      if self.resolution & 0x8000:
+         raise ValueError, "MidiFile: SMPTE time division is not supported (" + str(filename) + ")."
+
+      # locate track chunks (skipping any other chunks)
+      self.trackChunks = []     # holds (start, end) of each track's events
+      position = 8 + headerLength
+      while position + 8 <= self.bytes.size() and len(self.trackChunks) < trackCount:
+         chunkHeader = self.bytes.getBytes(position, position + 8)
+         length = __readInt__(chunkHeader, 4, 4)
+         if chunkHeader[0:4].tostring() == "MTrk":
+            self.trackChunks.append( (position + 8, min(position + 8 + length, self.bytes.size())) )
+         position = position + 8 + length
+
+      self.decoders = {}        # holds decoders of tracks accessed so far, indexed by track number
+
+   def getFormat(self):
+      """Returns the MIDI file format (0, 1, or 2)."""
+      return self.format
+
+   def getResolution(self):
+      """Returns the number of ticks per quarter note."""
+      return self.resolution
+
+   def getTrackCount(self):
+      """Returns the number of tracks."""
+      return len(self.trackChunks)
+
+   def getTrack(self, index):
+      """Returns all events of this track, as a MidiTrack (decoding it, if needed)."""
+
+      decoder = self.__getDecoder__(index)
+      decoder.decodeUntil(None)
+      return decoder.track
+
+   def getEvents(self, index, startTime=0.0, endTime=None):
+      """Returns the events of this track from 'startTime' up to (but not including) 'endTime' (in quarter notes), 
+         as a MidiTrack.  Only as much of the track as needed is decoded."""
+
+      decoder = self.__getDecoder__(index)
+      decoder.decodeUntil(endTime)
+      track = decoder.track
+
+      # find the events in range (they are ordered by time)
+      first = bisect.bisect_left(track.times, startTime)
+      if endTime == None:
+         last = track.size()
+      else:
+         last = bisect.bisect_left(track.times, endTime)
+
+      events = MidiTrack()
+      for i in range(first, last):
+         if track.statuses[i] == 0xFF or track.statuses[i] == 0xF0 or track.statuses[i] == 0xF7:   # meta (or system exclusive) event?
+            events.times.append( track.times[i] )
+            events.statuses.append( track.statuses[i] )
+            events.data1.append( track.data1[i] )
+            events.data2.append( len(events.metaData) )
+            events.metaData.append( track.metaData[track.data2[i]] )
+         else:
+            events.addEvent( track.times[i], track.statuses[i], track.data1[i], track.data2[i] )
+      return events
+
+   def getTracks(self):
+      """Returns all tracks, as a list of MidiTracks."""
+      return [self.getTrack(i) for i in range( self.getTrackCount() )]
+
+   def getTempo(self):
+      """Returns the initial tempo (in beats per minute), i.e., the first tempo event in the first track (default is 120).
+         Only the beginning of the track is decoded."""
+
+      if self.getTrackCount() == 0:
+         return 120.0
+
+      decoder = self.__getDecoder__(0)
+      track = decoder.track
+      i = 0
+      while True:
+         while i < track.size():               # look through decoded events
+            if track.statuses[i] == 0xFF and track.data1[i] == 0x51:   # a tempo event?
+               data = track.metaData[track.data2[i]]
+               return 60000000.0 / ((data[0] << 16) | (data[1] << 8) | data[2])
+            i = i + 1
+         if decoder.isDone():                  # no more events?
+            return 120.0                          # so, use MIDI's default tempo
+         decoder.decodeNext()                  # decode one more event, and keep looking
+
+   def getLength(self):
+      """Returns the length of the longest track (in quarter notes).  Tracks are only scanned, not decoded."""
+
+      length = 0
+      for i in range( self.getTrackCount() ):
+         if i in self.decoders and self.decoders[i].isDone():   # already decoded?
+            ticks = self.decoders[i].tick
+         else:
+            start, end = self.trackChunks[i]
+            ticks = __scanTrackLength__( self.bytes.getBytes(start, end) )
+         length = max(length, ticks)
+      return float(length) / self.resolution
+
+   def toScore(self):
+      """Returns a jMusic Score with the contents of the file (this parses the whole file, see Read.midi())."""
+
+      score = Score()
+      if self.filename != None:
+         jRead.midi(score, self.filename)
+      else:
+         raise ValueError, "MidiFile.toScore(): Only files can be converted to a Score."
+      return score
+
+   def __getDecoder__(self, index):
+      """Returns the decoder of this track (creating it, if needed)."""
+
+      if index not in self.decoders:
+         start, end = self.trackChunks[index]
+         self.decoders[index] = __MidiTrackDecoder__( self.bytes.getBytes(start, end), self.resolution )
+      return self.decoders[index]
+
+
+def __readInt__(data, position, length):
+   """Returns the big-endian unsigned integer of 'length' bytes at 'position' in 'data'."""
+
+   value = 0
+   for i in range(position, position + length):
+      value = (value << 8) | data[i]
+   return value
+
+def __readVariableLength__(data, position):
+   """Returns the MIDI variable-length quantity at 'position' in 'data', and the position after it."""
+
+   value = 0
+   while True:
+      byte = data[position]
+      position = position + 1
+      value = (value << 7) | (byte & 0x7F)
+      if byte < 0x80:
+         return value, position
+
+def __scanTrackLength__(data):
+   """Returns the length (in ticks) of the track events in 'data', without decoding them."""
+
+   ticks = 0
+   position = 0
+   status = 0
+   end = len(data)
+   while position < end:
+      delta, position = __readVariableLength__(data, position)
+      ticks = ticks + delta
+      if data[position] >= 0x80:         # a new status (otherwise, running status)
+         status = data[position]
+         position = position + 1
+      if status == 0xFF:                 # a meta event
+         metaType = data[position]
+         length, position = __readVariableLength__(data, position + 1)
+         position = position + length
+         if metaType == 0x2F:               # end of track
+            break
+      elif status == 0xF0 or status == 0xF7:    # a system exclusive event
+         length, position = __readVariableLength__(data, position)
+         position = position + length
+      elif status & 0xF0 == 0xC0 or status & 0xF0 == 0xD0:   # one data byte
+         position = position + 1
+      else:                              # two data bytes
+         position = position + 2
+   return ticks
+
+class __MidiTrackDecoder__():
+   """Decodes the events of a track chunk into a MidiTrack, a few at a time (as needed)."""
+
+   def __init__(self, data, resolution):
+      self.data = data              # the track's bytes
+      self.resolution = resolution  # ticks per quarter note
+      self.position = 0             # position of next event in data
+      self.tick = 0                 # time of last event decoded (in ticks)
+      self.status = 0               # last status (for running status)
+      self.done = len(data) == 0    # have all events been decoded?
+      self.track = MidiTrack()      # holds events decoded so far
+
+   def isDone(self):
+      return self.done
+
+   def decodeUntil(self, time):
+      """Decodes events up to (and including the first event after) 'time' (in quarter notes), or all events if None."""
+
+      while not self.done and (time == None or self.track.size() == 0 or self.track.times[-1] < time):
+         self.decodeNext()
+
+   def decodeNext(self):
+      """Decodes the next event."""
+
+      data = self.data
+      delta, position = __readVariableLength__(data, self.position)
+      self.tick = self.tick + delta
+      time = float(self.tick) / self.resolution
+
+      if data[position] >= 0x80:     # a new status (otherwise, running status)
+         self.status = data[position]
+         position = position + 1
+      status = self.status
+
+      if status == 0xFF:             # a meta event
+         metaType = data[position]
+         length, position = __readVariableLength__(data, position + 1)
+         if metaType == 0x2F:           # end of track (not stored - writers add it)
+            self.done = True
+         else:
+            self.track.addMeta( time, metaType, list(data[position:position + length]) )
+         position = position + length
+      elif status == 0xF0 or status == 0xF7:    # a system exclusive event
+         length, position = __readVariableLength__(data, position)
+         self.track.addEvent( time, status, 0, len(self.track.metaData) )
+         self.track.metaData.append( list(data[position:position + length]) )
+         position = position + length
+      elif status & 0xF0 == 0xC0 or status & 0xF0 == 0xD0:   # one data byte
+         self.track.addEvent( time, status, data[position], 0 )
+         position = position + 1
+      else:                          # two data bytes
+         self.track.addEvent( time, status, data[position], data[position + 1] )
+         position = position + 2
+
+      self.position = position
+      if self.position >= len(data):
+         self.done = True
+
+
+##################################################################################################################
+# Columnar note arrays
+#
+# A jMusic Score holds a Java object for every note (plus phrases and parts).  When a MIDI file only needs to be 
+# analyzed, transformed, or re-timed (e.g., batch jobs over many files), NoteArrays is much lighter - all notes are 
+# kept in parallel arrays (start, duration, pitch, velocity, channel, and program), one element per note.
+# NoteArrays are read with Read.midi(NoteArrays(), filename), and convert to and from Scores (see toScore(), fromScore()).
+
+class NoteArrays():
+   """Notes in parallel arrays, ordered by start time (times are in quarter notes).  A program of -1 means that
+      no instrument has been set for the channel."""
+
+   def __init__(self):
+
+      self.starts     = array.array('d')   # start times (in quarter notes)
+      self.durations  = array.array('d')   # how long notes sound (in quarter notes)
+      self.pitches    = array.array('i')   # MIDI pitches (0-127)
+      self.velocities = array.array('i')   # velocities (1-127)
+      self.channels   = array.array('i')   # MIDI channels (0-15)
+      self.programs   = array.array('i')   # instruments (0-127), or -1 if not set
+      self.tempo = 120.0                   # initial tempo (in beats per minute)
+
+   def size(self):
+      """Returns the number of notes."""
+      return len(self.starts)
+
+   def __len__(self):
+      return len(self.starts)
+
+   def getNote(self, index):
+      """Returns the note at 'index' as a (start, duration, pitch, velocity, channel, program) tuple."""
+
+      return (self.starts[index], self.durations[index], self.pitches[index], self.velocities[index], 
+              self.channels[index], self.programs[index])
+
+   def addNote(self, start, duration, pitch, velocity, channel=0, program=-1):
+      """Appends a note (notes should be added in start time order)."""
+
+      self.starts.append( start )
+      self.durations.append( duration )
+      self.pitches.append( pitch )
+      self.velocities.append( velocity )
+      self.channels.append( channel )
+      self.programs.append( program )
+
+   def addTracks(self, tracks):
+      """Adds the notes in these MidiTracks (e.g., from a MidiFile), pairing note-on and note-off events."""
+
+      # merge channel messages of all tracks in time order (ties keep track order)
+      events = []
+      for trackIndex in range( len(tracks) ):
+         track = tracks[trackIndex]
+         for i in range( track.size() ):
+            status = track.statuses[i]
+            if status == 0xFF:
+               if track.data1[i] == 0x51 and trackIndex == 0 and track.times[i] == 0.0:   # initial tempo?
+                  data = track.metaData[ track.data2[i] ]
+                  self.tempo = 60000000.0 / ((data[0] << 16) | (data[1] << 8) | data[2])
+            elif 0x80 <= status < 0xF0:
+               events.append( (track.times[i], trackIndex, i, status, track.data1[i], track.data2[i]) )
+      events.sort()
+
+      # pair note-ons with note-offs (first on, first off - for repeated notes)
+      programs = {}     # holds current program, indexed by channel
+      sounding = {}     # holds lists of (start, velocity, program) of notes sounding, indexed by (channel, pitch)
+      notes = []        # holds (start, order, duration, pitch, velocity, channel, program)
+      order = 0         # order of note-ons (breaks ties between notes starting together)
+      for time, trackIndex, i, status, data1, data2 in events:
+         command = status & 0xF0
+         channel = status & 0x0F
+         if command == 0xC0:
+            programs[channel] = data1
+         elif command == 0x90 and data2 > 0:   # note on
+            sounding.setdefault( (channel, data1), [] ).append( (time, order, data2, programs.get(channel, -1)) )
+            order = order + 1
+         elif command == 0x80 or command == 0x90:   # note off (or note on with zero velocity)
+            if sounding.get( (channel, data1) ):
+               start, noteOrder, velocity, program = sounding[(channel, data1)].pop(0)
+               notes.append( (start, noteOrder, time - start, data1, velocity, channel, program) )
+
+      # notes never turned off end with the last event
+      end = 0.0
+      if events != []:
+         end = events[-1][0]
+      for (channel, pitch), starts in sounding.items():
+         for start, noteOrder, velocity, program in starts:
+            notes.append( (start, noteOrder, end - start, pitch, velocity, channel, program) )
+
+      # and store them in start time order
+      notes.sort()
+      for start, noteOrder, duration, pitch, velocity, channel, program in notes:
+         self.addNote( start, duration, pitch, velocity, channel, program )
+
+   def toMidiTracks(self):
+      """Returns these notes as MidiTracks (a tempo track, and one track per channel), e.g., for Write.midi()."""
+
+      tempoTrack = MidiTrack()
+      tempoTrack.addTempo( 0.0, self.tempo )
+      tracks = {}       # holds tracks, indexed by channel
+      programs = {}     # holds program of each channel (so far)
+      for i in range( self.size() ):
+         channel = self.channels[i]
+         if channel not in tracks:
+            tracks[channel] = MidiTrack()
+         if self.programs[i] > -1 and programs.get(channel) != self.programs[i]:   # instrument change?
+            tracks[channel].addEvent( self.starts[i], 0xC0 | channel, self.programs[i] )
+            programs[channel] = self.programs[i]
+         tracks[channel].addEvent( self.starts[i], 0x90 | channel, self.pitches[i], self.velocities[i] )
+         tracks[channel].addEvent( self.starts[i] + self.durations[i], 0x90 | channel, self.pitches[i], 0 )
+
+      return [tempoTrack] + [tracks[channel] for channel in sorted(tracks.keys())]
+
+   def toScore(self):
+      """Returns these notes as a Score, with a Part for each channel and program.  Overlapping notes 
+         (e.g., chords) go to separate Phrases."""
+
+      score = Score()
+      score.setTempo( self.tempo )
+      parts = {}        # holds (part, voices) indexed by (channel, program) - a voice is a [phrase, end time] pair
+      for i in range( self.size() ):
+         key = (self.channels[i], self.programs[i])
+         if key not in parts:
+            part = Part()
+            part.setChannel( self.channels[i] )
+            if self.programs[i] > -1:
+               part.setInstrument( self.programs[i] )
+            score.addPart( part )
+            parts[key] = (part, [])
+         part, voices = parts[key]
+
+         # find a voice which is free by this note's start time (or start a new one)
+         start = self.starts[i]
+         duration = self.durations[i]
+         for voice in voices:
+            if voice[1] <= start:
+               break
+         else:
+            voice = [Phrase(), start]
+            voice[0].setStartTime( start )
+            part.addPhrase( voice[0] )
+            voices.append( voice )
+
+         if voice[1] < start:   # a gap before this note?
+            voice[0].addNote( Note(REST, start - voice[1]) )
+         voice[0].addNote( Note(self.pitches[i], duration, self.velocities[i], 0.5, duration) )
+         voice[1] = start + duration
+
+      return score
+
+   # static functions to create note arrays
+   def fromTracks(tracks):
+      """Returns NoteArrays with the notes in these MidiTracks."""
+
+      noteArrays = NoteArrays()
+      noteArrays.addTracks( tracks )
+      return noteArrays
+
+   def fromScore(score):
+      """Returns NoteArrays with the notes in this Score (as they would be written to a MIDI file)."""
+
+      noteArrays = NoteArrays.fromTracks( __scoreToMidiTracks__(score) )
+      noteArrays.tempo = score.getTempo()
+      return noteArrays
+
+   fromTracks = Callable(fromTracks)
+   fromScore = Callable(fromScore)
+
+
+##################################################################################################################
+# Incremental MIDI export
+#
+# Scene scripts write their .mid files every time they run.  With Write.midi(score, filename, incremental=True), 
+# the file is only written if its content has changed.  A content hash of each file written is kept in a manifest, 
+# next to the files (see MIDI_MANIFEST), so rebuilding a soundtrack after changing one cue touches only that cue.
+#
+# We hash the bytes the writer produces (not the score), so anything that ends up in the file (e.g., a part's title, 
+# or the running status option) counts as a change.  If a file has been modified (or removed) since we wrote it, 
+# it is written again.
+
+import json       # needed to store the manifest
+import hashlib    # needed to hash file contents
+
+MIDI_MANIFEST = "midi_manifest.json"    # name of manifest file (one per directory of MIDI files)
+
+def __manifestFilename__(filename):
+   """Returns the name of the manifest for this MIDI file (it is in the same directory)."""
+   return os.path.join( os.path.dirname(os.path.abspath(filename)), MIDI_MANIFEST )
+
+def __readMidiManifest__(manifestFilename):
+   """Returns the manifest entries (a dictionary indexed by MIDI file name), or an empty dictionary if none."""
+
+   try:
+      manifestFile = open(manifestFilename, "r")
+      try:
+         manifest = json.load(manifestFile)
+      finally:
+         manifestFile.close()
+   except:   # no manifest (or an unreadable one), so everything will be written again
+      manifest = {}
+
+   if type(manifest) != dict:
+      manifest = {}
+   return manifest
+
+def __writeMidiFileIfChanged__(filename, data):
+   """Writes these bytes to this MIDI file, unless it is up to date (see above), and records their content hash 
+      (and the file's size and modification time) in the manifest.  Returns True if the file was written."""
+
+   manifestFilename = __manifestFilename__(filename)
+   digest = hashlib.sha1(data).hexdigest()
+
+   # several scenes may be built at the same time (see build_soundtrack.py), so lock the manifest from checking it
+   # until it is updated (otherwise, two writers could both find a file out of date, and overwrite each other)
+   lockFile = RandomAccessFile(manifestFilename + ".lock", "rw")
+   try:
+      lock = lockFile.getChannel().lock()
+      try:
+         manifest = __readMidiManifest__(manifestFilename)
+         if __isMidiFileCurrent__(filename, digest, manifest.get( os.path.basename(filename) )):   # up to date?
+            return False                                                                          # yes, so done
+
+         __writeFile__(filename, data)
+         manifest[os.path.basename(filename)] = {"sha1": digest, "size": os.path.getsize(filename), 
+                                                 "modified": os.path.getmtime(filename)}
+         manifestFile = open(manifestFilename, "w")
+         try:
+            json.dump(manifest, manifestFile, indent=2, sort_keys=True)
+         finally:
+            manifestFile.close()
+      finally:
+         lock.release()
+   finally:
+      lockFile.close()
+
+   return True
+
+def __isMidiFileCurrent__(filename, digest, entry):
+   """Returns True if this MIDI file exists, has this content hash, and is unchanged since it was written
+      (as recorded in its manifest 'entry', if any)."""
+
+   return (entry != None and entry.get("sha1") == digest and os.path.exists(filename) and
+           entry.get("size") == os.path.getsize(filename) and entry.get("modified") == os.path.getmtime(filename))
+
+def __writeFile__(filename, data):
+   """Writes these bytes to a file."""
+
+   outputFile = open(filename, "wb")
+   try:
+      outputFile.write( data )
+   finally:
+      outputFile.close()
+
+
+##################################################################################################################
+# Background MIDI writer
+#
+# Write.midi(score, filename, async_=True) takes a snapshot of the score's events (i.e., its MidiTracks) and returns 
+# right away, with a MidiWriteFuture.  A background thread then encodes and writes the file, so playback (e.g., 
+# Play.midi() right after Write.midi(), as in scene scripts) does not wait for the disk.  Writes happen in the order 
+# requested.  The writer thread runs only while there are pending writes (so the program does not exit before 
+# they are finished), but System.exit() (or JEM's Stop button) does not wait for it - scripts which write in the 
+# background should call Write.flush() before they end.
+
+import threading  # needed for the writer thread
+import Queue      # needed to hand writes to the writer thread
+import atexit     # needed to finish pending writes on exit
+import sys        # needed to report write errors
+
+class MidiWriteFuture():
+   """The result of a background MIDI write (see Write.midi())."""
+
+   def __init__(self, filename):
+      self.filename = filename
+      self.error = None
+      self.finished = threading.Event()
+
+   def isDone(self):
+      """Returns True if the write has finished (successfully or not)."""
+      return self.finished.isSet()
+
+   def wait(self, timeout=None):
+      """Waits for the write to finish (at most 'timeout' seconds, if given).  Returns True if finished."""
+
+      self.finished.wait(timeout)
+      return self.finished.isSet()
+
+   def getResult(self, timeout=None):
+      """Waits for the write to finish, and returns the filename written (or raises the error it failed with)."""
+
+      if not self.wait(timeout):
+         raise RuntimeError, "MIDI file '" + self.filename + "' not written yet."
+      if self.error != None:
+         raise self.error
+      return self.filename
+
+   def getError(self):
+      """Returns the error the write failed with (or None)."""
+      return self.error
+
+   def __finish__(self, error=None):
+      self.error = error
+      self.finished.set()
+
+
+class MidiWriter():
+   """Writes MIDI files on a background thread, in the order requested."""
+
+   def __init__(self):
+      self.queue = Queue.Queue()    # holds pending writes
+      self.thread = None            # started on first write
+      self.lock = threading.Lock()  # guards thread creation
+
+   def submit(self, tracks, filename, runningStatus, incremental, title, optimize=False, midiFormat=None):
+      """Schedules writing these tracks (see __writeMidiTracks__()).  Returns a MidiWriteFuture."""
+
+      future = MidiWriteFuture(filename)
+      self.lock.acquire()
+      try:
+         self.queue.put( (future, (tracks, filename, runningStatus, incremental, title, optimize, midiFormat)) )
+         if self.thread == None:    # not running?
+            self.thread = threading.Thread(target=self.__run__, name="MidiWriter")
+            self.thread.start()        # (not a daemon, so the JVM waits for pending writes)
+      finally:
+         self.lock.release()
+      return future
+
+   def flush(self):
+      """Waits until all pending writes have finished."""
+      self.queue.join()
+
+   def __run__(self):
+      """The writer loop - writes files as they are requested, and ends when there are none left."""
+
+      while True:
+         self.lock.acquire()
+         try:
+            if self.queue.empty():    # nothing left to write?
+               self.thread = None        # yes, so end (submit() starts a new thread)
+               return
+            future, parameters = self.queue.get()
+         finally:
+            self.lock.release()
+
+         try:
+            __writeMidiTracks__( *parameters )
+            future.__finish__()
+         except:
+            error = sys.exc_info()[1]
+            print "Write.midi(): Could not write MIDI file '" + future.filename + "' (" + str(error) + ")."
+            future.__finish__(error)
+         self.queue.task_done()
+
+__midiWriter__ = MidiWriter()
+atexit.register( __midiWriter__.flush )   # finish pending writes before exiting (also, see above)
+
+def __writeMidiTracks__(tracks, filename, runningStatus, incremental, title, optimize=False, midiFormat=None):
+   """Writes these tracks to a standard MIDI file (see Write.midi())."""
+
+   # convert tracks to bytes (with our own writer, instead of jMusic's Write.midi())
+   data = __encodeMidiTracks__(tracks, runningStatus, optimize, midiFormat)
+
+   # write file (if incremental, only if it is not up to date)
+   if incremental:
+      if not __writeMidiFileIfChanged__(filename, data):    # up to date?
+         if title != None:
+            print "MIDI file '" + filename + "' is up to date with score '" + title + "'."
+         return                                               # yes, so nothing to do
+   else:
+      __writeFile__(filename, data)
+
+   if title != None:
+      print "MIDI file '" + filename + "' written from score '" + title + "'."
+
+
 class Write(jWrite):
 
-   def midi(score, filename):
-      """Save a standard MIDI file from a jMusic score."""
+   def midi(score, filename, runningStatus=False, incremental=False, async_=False, optimize=False, midiFormat=None):
+      """Save a standard MIDI file from a jMusic score (or a list of MidiTracks).  The file is the same as the one 
+         written by jMusic, unless 'runningStatus' is True (this omits repeated status bytes, for smaller files).
+         If 'incremental' is True, the file is written only if its content has changed (see MIDI_MANIFEST).
+         If 'async_' is True, the score is copied, and the file is written in the background - a MidiWriteFuture is
+         returned right away (see MidiWriter).
+         If 'optimize' is True, the file is made as small as possible (see __optimizeMidiTracks__()) - it has a 
+         single track, unless 'midiFormat' is 1."""
       
       # JEM working directory fix (see above)
       filename = fixWorkingDirForJEM( filename )   # does nothing if not in JEM
@@ -1089,11 +2375,44 @@ class Write(jWrite):
       #***
       #print "fixWorkingDirForJEM( filename ) =", filename
       
-      # use fixed filename with jMusic's Write.midi() 
-      jWrite.midi(score, filename)
+      # get tracks (unless we were given tracks already) - these are a snapshot of the score's events
+      if type(score) == list:
+         tracks = list(score)
+         title = None
+      else:
+         tracks = __scoreToMidiTracks__(score)
+         title = score.getTitle()
+
+      # and write them (in the background, if so requested)
+      if async_:
+         return __midiWriter__.submit( tracks, filename, runningStatus, incremental, title, optimize, midiFormat )
+      else:
+         __midiWriter__.flush()   # earlier background writes go first (e.g., in case they are to the same file)
+         __writeMidiTracks__( tracks, filename, runningStatus, incremental, title, optimize, midiFormat )
+
+   def flush():
+      """Waits until all background writes have finished (see Write.midi())."""
+
+      __midiWriter__.flush()
+
+   def midiBytes(score, runningStatus=False, optimize=False, midiFormat=None):
+      """Returns the bytes of a standard MIDI file (a string) for a jMusic score (or a list of MidiTracks, 
+         or NoteArrays), without writing a file, e.g., to send it to another process, or to cache it.
+         Parameters 'runningStatus', 'optimize', and 'midiFormat' are as in Write.midi()."""
+
+      if type(score) == list:
+         tracks = score
+      elif isinstance(score, NoteArrays):
+         tracks = score.toMidiTracks()
+      else:
+         tracks = __scoreToMidiTracks__(score)
+
+      return __encodeMidiTracks__(tracks, runningStatus, optimize, midiFormat)
 
    # make this function callable without having to instantiate this class
    midi = Callable(midi)  
+   flush = Callable(flush)
+   midiBytes = Callable(midiBytes)
 
 ######################################################################################
 #### jMusic Note extensions ########################################################
@@ -1212,17 +2531,20 @@ class Note(jNote):
       # so, let's fix it
       return self.toString()
 
-   def __init__(self, value, duration, dynamic=85, pan=0.5, length=None):   
+   def __init__(self, value, duration, dynamic=85, pan=0.5, length=None, checkValues=True):   
 
       # NOTE: If value is an int, it signifies pitch; otherwise, if it is a float,
       # it signifies a frequency.
+      # ('checkValues' is for internal use - Phrase.addNoteList() checks all values at once, so it skips the checks below)
 
       # set note length (if needed)
       if length == None:   # not provided?
          length = duration * jNote.DEFAULT_LENGTH_MULTIPLIER  # normally, duration * 0.9
 
       # do some basic error checking
-      if type(value) == int and value != REST and (value < 0 or value > 127):
+      if not checkValues:
+        pass
+      elif type(value) == int and value != REST and (value < 0 or value > 127):
         raise TypeError( "Note pitch should be an integer between 0 and 127 (it was " + str(value) + ")." )
       elif type(value) == float and not value > 0.0:
         raise TypeError( "Note frequency should be a float greater than 0.0 (it was " + str(value) + ")." )
@@ -1255,6 +2577,17 @@ class Note(jNote):
       jNote.setDuration(self, duration )
       self.setLength(duration * lengthFactor )
 
+      self.__durationChanged__()
+
+   def setRhythmValue(self, *arguments):
+      jNote.setRhythmValue(self, *arguments)
+      self.__durationChanged__()
+
+   def __durationChanged__(self):
+      """Records that this note's duration has changed (e.g., so that its phrase's start times are recomputed)."""
+
+      __touchMaterial__( self.getMyPhrase() )   # record the change (and let our phrase know, if any)
+
    # fix error message returned from getPitch() if frequency and pitch are not equivalent
    def getPitch(self):
    
@@ -1284,277 +2617,2599 @@ class Note(jNote):
       return bend + PITCHBEND_NORMAL
 
 
-######################################################################################
-#### jMusic Phrase extensions ########################################################
-######################################################################################
+######################################################################################
+#### jMusic Phrase extensions ########################################################
+######################################################################################
+
+from jm.music.data import Phrase as jPhrase  # needed to wrap more functionality below
+
+# update Phrase's addNoteList to handle chords, i.e., lists of pitches, 
+# in addition to single pitches (the default functionality).
+class Phrase(jPhrase):
+
+   def __str__(self):    
+      # we disrupted access to jMusic's (Java's) Phrase.toString() method,
+      # so, let's fix it
+      return self.toString()
+
+   def __repr__(self):    
+      # we disrupted access to jMusic's (Java's) Phrase.toString() method,
+      # so, let's fix it
+      return self.toString()
+
+   def addChord(self, pitches, duration, dynamic=85, panoramic=0.5, length=None):    
+      # set chord length (if needed)
+      if length == None:   # not provided?
+         length = duration * jNote.DEFAULT_LENGTH_MULTIPLIER  # normally, duration * 0.9
+
+      # add all notes, minus the last one, as having no duration, yet normal length 
+      # (exploiting how Play.midi() and Write.midi() work)
+      for i in range( len(pitches)-1 ):
+         n = Note(pitches[i], 0.0, dynamic, panoramic, length)
+         self.addNote(n)
+
+      # now, add the last note with the proper duration (and length)
+      n = Note(pitches[-1], duration, dynamic, panoramic, length)
+      self.addNote(n)
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def addNoteList(self, pitches, durations, dynamics=[], panoramics=[], lengths=[]):   
+      """Add notes to the phrase using provided lists of pitches, durations, etc. """ 
+
+      # check if provided lists have equal lengths
+      if len(pitches) != len(durations) or \
+         (len(dynamics) != 0) and (len(pitches) != len(dynamics)) or \
+         (len(panoramics) != 0) and (len(pitches) != len(panoramics)) or \
+         (len(lengths) != 0) and (len(pitches) != len(lengths)):
+         raise ValueError("The provided lists should have the same length.")
+
+      # if dynamics was not provided, construct it with max value
+      if dynamics == []:
+         dynamics = [85] * len(pitches)
+      
+      # if panoramics was not provided, construct it at CENTER
+      if panoramics == []:
+         panoramics = [0.5] * len(pitches)
+               
+      # if note lengths was not provided, construct it at 90% of note duration
+      if lengths == []:
+         lengths = [duration * jNote.DEFAULT_LENGTH_MULTIPLIER for duration in durations]
+
+      # if there are no chords (the usual case), check all pitches at once, create all notes (skipping the checks 
+      # in Note(), as they have been done), and add them in one go (i.e., a single call into jMusic)
+      pitchTypes = set( map(type, pitches) )
+      if pitchTypes <= set([int, float]):
+         __checkNoteValues__( pitches, pitchTypes )
+         notes = []
+         for i in range( len(pitches) ):
+            notes.append( Note(pitches[i], durations[i], dynamics[i], panoramics[i], lengths[i], False) )
+         jPhrase.addNoteList(self, jarray.array(notes, jNote))     # add them
+
+      else:   # otherwise, traverse the pitch list and handle every item appropriately
+         for i in range( len(pitches) ):        
+            if type(pitches[i]) == list:              # is it a chord?
+               self.addChord(pitches[i], durations[i], dynamics[i], panoramics[i], lengths[i])  # yes, so add it
+            else:                                     # else, it's a note
+               n = Note(pitches[i], durations[i], dynamics[i], panoramics[i], lengths[i])       # create note
+               self.addNote(n)                                                                  # and add it
+
+      self.__notesChanged__()   # record the change
+
+   # jMusic's methods which change the phrase's notes also record the change (see __getNoteOffsets__())
+   def addNote(self, *arguments):
+      jPhrase.addNote(self, *arguments)
+      self.__notesChanged__()
+
+   def addRest(self, *arguments):
+      jPhrase.addRest(self, *arguments)
+      self.__notesChanged__()
+
+   def insertNote(self, *arguments):
+      jPhrase.insertNote(self, *arguments)
+      self.__notesChanged__()
+
+   def removeNote(self, *arguments):
+      result = jPhrase.removeNote(self, *arguments)
+      self.__notesChanged__()
+      return result
+
+   def removeLastNote(self):
+      jPhrase.removeLastNote(self)
+      self.__notesChanged__()
+
+   def setNote(self, *arguments):
+      jPhrase.setNote(self, *arguments)
+      self.__notesChanged__()
+
+   def setNoteList(self, *arguments):
+      jPhrase.setNoteList(self, *arguments)
+      self.__notesChanged__()
+
+   def empty(self):
+      jPhrase.empty(self)
+      self.__notesChanged__()
+
+   def __notesChanged__(self):
+      """Records that this phrase's notes have changed."""
+      __touchMaterial__(self)   # (increments this phrase's version, too)
+
+   def getNoteStartTime(self, index):
+      """Returns the start time of the note at 'index' (or -1.0 if there is no such note).  jMusic adds up the
+         durations of all earlier notes every time, so going through a phrase this way takes quadratic time.  
+         Instead, we keep the running sums of durations, and recompute them only when notes have changed
+         (via this phrase's methods, Note.setDuration(), or Mod functions).  
+         NOTE:  Notes created by jMusic itself (e.g., by Read.midi()) are not Notes of ours, so changing their duration 
+                directly is not noticed."""
+
+      if index < 0 or index >= self.size():
+         return -1.0
+      return self.getStartTime() + self.__getNoteOffsets__()[index]
+
+   def __getNoteOffsets__(self):
+      """Returns the time of each note from the start of the phrase (i.e., running sums of durations)."""
+
+      # offsets are valid while notes are unchanged (this phrase's methods record changes to this phrase - 
+      # Note.setDuration() and Mod functions record changes to any material)
+      key = (__materialVersion__, self.__dict__.get("notesVersion", 0), self.size())
+      if self.__dict__.get("noteOffsetsKey") != key:
+         offsets = array.array('d', [0.0])
+         time = 0.0
+         for note in self.getNoteArray():
+            time = time + note.getDuration()
+            offsets.append( time )
+         self.noteOffsets = offsets
+         self.noteOffsetsKey = key
+      return self.noteOffsets
+
+# Do NOT make these functions callable - Phrase class is meant to be instantiated,
+# i.e., we will always call these from a Phrase object - not the class, e.g., as in Mod.
+
+def __checkNoteValues__(values, valueTypes):
+   """Checks a list of note pitches (ints) and frequencies (floats), all at once (as Note() does for one value).
+      'valueTypes' is the set of their types."""
+
+   if int in valueTypes:
+      sounding = [value for value in values if type(value) == int and value != REST]
+      if sounding != [] and (min(sounding) < 0 or max(sounding) > 127):
+         value = [value for value in sounding if value < 0 or value > 127][0]
+         raise TypeError( "Note pitch should be an integer between 0 and 127 (it was " + str(value) + ")." )
+   if float in valueTypes:
+      frequencies = [value for value in values if type(value) == float]
+      if not min(frequencies) > 0.0:
+         raise TypeError( "Note frequency should be a float greater than 0.0 (it was " + str(min(frequencies)) + ")." )
+
+
+######################################################################################
+# Repeat
+#
+# To play a phrase several times in a row (e.g., to extend a theme, or to loop a game cue), its notes used to be
+# added again and again (e.g., calling addNoteList() twice with the same lists).  A Repeat holds the notes once,
+# and how many times to play them.  It is a Phrase, so it can be added to Parts, changed with Mod functions, etc.
+# Play functions, Write.midi(), and playback plans go through its notes as many times as needed (see __phraseNotes__()),
+# so memory stays proportional to the notes, not to the playing time.
+#
+# NOTE:  Methods about individual notes (e.g., size(), getNoteList(), getNoteStartTime()) refer to one repetition,
+#        whereas getEndTime() includes all repetitions.
+#
+# NOTE:  jMusic's own functions (e.g., View.show(), jMusic's MidiSynth) see only one repetition.  MidiSequence expands
+#        Repeats before handing a score to jMusic (see __expandRepeats__()) - elsewhere, use toPhrase() to expand one.
+
+class Repeat(Phrase):
+   """A phrase which plays its notes 'times' times in a row.  If a 'phrase' is given, its notes (shared, not copied),
+      start time, instrument, tempo, and title are used."""
+
+   def __init__(self, phrase=None, times=2):
+
+      jPhrase.__init__(self)
+      self.times = times
+      if phrase != None:
+         self.getNoteList().addAll( phrase.getNoteList() )   # share notes (adding them would make them ours, as in addNote())
+         self.__notesChanged__()
+         __copyPhraseAttributes__(phrase, self)
+
+   def getTimes(self):
+      """Returns how many times the notes are played."""
+      return self.times
+
+   def setTimes(self, times):
+      """Sets how many times the notes are played."""
+
+      self.times = times
+      self.__notesChanged__()   # record the change
+
+   def getEndTime(self):
+      """Returns the end time of the phrase, including all repetitions."""
+
+      startTime = self.getStartTime()
+      return startTime + self.times * (jPhrase.getEndTime(self) - startTime)
+
+   def copy(self):
+      """Returns a copy of this Repeat (with copies of its notes)."""
+
+      repeat = Repeat(times=self.times)
+      jPhrase.addNoteList(repeat, jarray.array([note.copy() for note in self.getNoteArray()], jNote))
+      __copyPhraseAttributes__(self, repeat)
+      return repeat
+
+   def toPhrase(self):
+      """Returns a Phrase with the notes of all repetitions (copies of the notes), e.g., for jMusic's own functions."""
+
+      phrase = Phrase()
+      jPhrase.addNoteList(phrase, jarray.array([note.copy() for note in __phraseNotes__(self)], jNote))
+      __copyPhraseAttributes__(self, phrase)
+      return phrase
+
+def __copyPhraseAttributes__(phrase, otherPhrase):
+   """Copies start time, instrument, tempo (if set), and title of a phrase to another."""
+
+   otherPhrase.setStartTime( phrase.getStartTime() )
+   if phrase.getInstrument() > -1:
+      otherPhrase.setInstrument( phrase.getInstrument() )
+   if phrase.getTempo() > -1:
+      otherPhrase.setTempo( phrase.getTempo() )
+   otherPhrase.setTitle( phrase.getTitle() )
+
+def __expandRepeats__(score):
+   """Returns a copy of the score with every Repeat replaced by a Phrase with all its repetitions (see toPhrase()),
+      for jMusic's own functions, which see only one repetition.  Returns the score itself, if it has no Repeats."""
+
+   repeats = [phrase for part in score.getPartArray() for phrase in part.getPhraseArray() if isinstance(phrase, Repeat)]
+   if repeats == []:
+      return score
+
+   expanded = score.copy()
+   for partIndex in range( score.size() ):
+      originals = score.getPart(partIndex).getPhraseArray()
+      copyPart = expanded.getPart(partIndex)
+      copies = list( copyPart.getPhraseArray() )
+      copyPart.empty()
+      for original, phraseCopy in zip(originals, copies):   # keep phrase order
+         if isinstance(original, Repeat):
+            phraseCopy = original.toPhrase()
+         copyPart.addPhrase( phraseCopy )
+   return expanded
+
+def __phraseNotes__(phrase):
+   """Returns an iterator over the notes of a phrase, as they are played (i.e., a Repeat's notes are repeated)."""
+
+   if isinstance(phrase, Repeat):
+      return itertools.chain( *([phrase.getNoteArray()] * phrase.getTimes()) )
+   else:
+      return iter( phrase.getNoteArray() )
+
+import itertools   # needed to repeat notes lazily
+
+
+######################################################################################
+# PackedPhrase
+#
+# A Phrase is a Java object holding a Java Note object for each note.  For large (e.g., generated) phrases, 
+# this takes a lot of memory, and going through notes means crossing into Java for every note.  A PackedPhrase 
+# instead stores notes in parallel arrays (pitch, frequency, duration, length, dynamic, and panning), which take
+# several times less memory, and can be read directly from Python (e.g., getPitches()).
+#
+# It has the same methods for adding and getting notes as Phrase (e.g., addNoteList(), getNoteList()), and can be 
+# given to Mod functions and Play functions in place of a Phrase (it is converted to a Phrase as needed).  
+# Use toPhrase() and PackedPhrase.fromPhrase() to convert explicitly (e.g., to add it to a Part).
+
+class PackedPhrase(object):
+   """A phrase whose notes are stored in parallel arrays (see above).  A pitch of -1 means that the note was
+      given by frequency (not a MIDI pitch)."""
+
+   __slots__ = ["pitches", "frequencies", "durations", "lengths", "dynamics", "pannings", 
+                "startTime", "instrument", "tempo", "title", "noteOffsets", "noteOffsetsKey"]
+
+   def __init__(self, startTime=0.0):
+
+      self.pitches     = array.array('i')   # MIDI pitches (0-127), REST, or -1 (for notes given by frequency)
+      self.frequencies = array.array('d')   # frequencies (in Hz)
+      self.durations   = array.array('d')   # durations (in quarter notes), i.e., time until next note
+      self.lengths     = array.array('d')   # lengths (in quarter notes), i.e., how long notes sound
+      self.dynamics    = array.array('i')   # dynamics (0-127)
+      self.pannings    = array.array('d')   # pannings (0.0 - 1.0)
+      self.startTime = startTime
+      self.instrument = -1                  # (not set)
+      self.tempo = -1.0                     # (not set)
+      self.title = "Untitled Phrase"
+      self.noteOffsets = None               # running sums of durations (see getNoteStartTime())
+      self.noteOffsetsKey = None
+
+   def addNote(self, value, duration=None, dynamic=85, pan=0.5, length=None):
+      """Adds a note, given either as a Note, or as a pitch (int) or frequency (float), and a duration, etc."""
+
+      if isinstance(value, jNote):          # a Note?
+         note = value
+         if note.isRest():
+            self.__append__( REST, float(REST), note.getDuration(), note.getLength(), note.getDynamic(), note.getPan() )
+         else:
+            self.__appendValue__( note.getFrequency(), note.getDuration(), note.getDynamic(), note.getPan(), note.getLength() )
+      else:
+         self.__appendValue__( value, duration, dynamic, pan, length )
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def addChord(self, pitches, duration, dynamic=85, panoramic=0.5, length=None):
+      """Adds a chord (see Phrase.addChord())."""
+
+      if length == None:   # not provided?
+         length = duration * jNote.DEFAULT_LENGTH_MULTIPLIER  # normally, duration * 0.9
+
+      # all notes, minus the last one, have no duration (see Phrase.addChord())
+      for i in range( len(pitches)-1 ):
+         self.__appendValue__( pitches[i], 0.0, dynamic, panoramic, length )
+      self.__appendValue__( pitches[-1], duration, dynamic, panoramic, length )
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def addNoteList(self, pitches, durations, dynamics=[], panoramics=[], lengths=[]):   
+      """Add notes to the phrase using provided lists of pitches, durations, etc. (see Phrase.addNoteList())."""
+
+      # check if provided lists have equal lengths
+      if len(pitches) != len(durations) or \
+         (len(dynamics) != 0) and (len(pitches) != len(dynamics)) or \
+         (len(panoramics) != 0) and (len(pitches) != len(panoramics)) or \
+         (len(lengths) != 0) and (len(pitches) != len(lengths)):
+         raise ValueError("The provided lists should have the same length.")
+
+      # if all pitches are MIDI pitches (the usual case), check them all at once, and append whole columns
+      sounding = [pitch for pitch in pitches if pitch != REST]
+      if set(map(type, pitches)) == set([int]) and (sounding == [] or (0 <= min(sounding) and max(sounding) <= 127)):
+         if dynamics == []:
+            dynamics = [85] * len(pitches)
+         if panoramics == []:
+            panoramics = [0.5] * len(pitches)
+         if lengths == []:
+            lengths = [duration * jNote.DEFAULT_LENGTH_MULTIPLIER for duration in durations]
+         for pitch in pitches:
+            if pitch == REST:
+               self.frequencies.append( float(REST) )
+            else:
+               self.frequencies.append( noteToFreq(pitch) )
+         self.pitches.extend( pitches )
+         self.durations.extend( map(float, durations) )
+         self.lengths.extend( map(float, lengths) )
+         self.dynamics.extend( dynamics )
+         self.pannings.extend( map(float, panoramics) )
+         __touchMaterial__()   # record the change (see MaterialCallable)
+         return
+
+      for i in range( len(pitches) ):
+         dynamic = 85
+         if dynamics != []:
+            dynamic = dynamics[i]
+         panoramic = 0.5
+         if panoramics != []:
+            panoramic = panoramics[i]
+         length = None
+         if lengths != []:
+            length = lengths[i]
+
+         if type(pitches[i]) == list:              # is it a chord?
+            self.addChord(pitches[i], durations[i], dynamic, panoramic, length)
+         else:                                     # else, it's a note
+            self.__appendValue__( pitches[i], durations[i], dynamic, panoramic, length )
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def __appendValue__(self, value, duration, dynamic, pan, length):
+      """Appends a note given by pitch (int) or frequency (float)."""
+
+      if length == None:   # not provided?
+         length = duration * jNote.DEFAULT_LENGTH_MULTIPLIER  # normally, duration * 0.9
+
+      if type(value) == int:                  # a pitch?
+         if value != REST and (value < 0 or value > 127):
+            raise TypeError( "Note pitch should be an integer between 0 and 127 (it was " + str(value) + ")." )
+         if value == REST:
+            frequency = float(REST)
+         else:
+            frequency = noteToFreq(value)
+         self.__append__( value, frequency, duration, length, dynamic, pan )
+      elif type(value) == float:              # a frequency?
+         if not value > 0.0:
+            raise TypeError( "Note frequency should be a float greater than 0.0 (it was " + str(value) + ")." )
+         pitch, bend = freqToNote(value)
+         if bend != 0:                           # not exactly a MIDI pitch?
+            pitch = -1                              # so, remember it was given by frequency
+         self.__append__( pitch, value, duration, length, dynamic, pan )
+      else:
+         raise TypeError( "Note first parameter should be a pitch (int) or a frequency (float) - it was " + str(type(value)) + "." )
+
+   def __append__(self, pitch, frequency, duration, length, dynamic, pan):
+      self.pitches.append( pitch )
+      self.frequencies.append( frequency )
+      self.durations.append( duration )
+      self.lengths.append( length )
+      self.dynamics.append( dynamic )
+      self.pannings.append( pan )
+
+   def size(self):
+      """Returns the number of notes."""
+      return len(self.pitches)
+
+   def __len__(self):
+      return len(self.pitches)
+
+   def getNote(self, index):
+      """Returns the note at 'index' (a new Note object)."""
+
+      pitch = self.pitches[index]
+      if pitch == -1:        # given by frequency?
+         value = self.frequencies[index]
+      else:
+         value = pitch
+      return Note(value, self.durations[index], self.dynamics[index], self.pannings[index], self.lengths[index])
+
+   def getNoteList(self):
+      """Returns a list of the notes (new Note objects - changing them does not change the phrase)."""
+      return [self.getNote(i) for i in range( self.size() )]
+
+   def getNoteArray(self):
+      """Same as getNoteList()."""
+      return self.getNoteList()
+
+   def getPitches(self):
+      """Returns the pitches (an array - no Note objects are created)."""
+      return self.pitches
+
+   def getFrequencies(self):
+      return self.frequencies
+
+   def getDurations(self):
+      return self.durations
+
+   def getLengths(self):
+      return self.lengths
+
+   def getDynamics(self):
+      return self.dynamics
+
+   def getPannings(self):
+      return self.pannings
+
+   def getStartTime(self):
+      return self.startTime
+
+   def setStartTime(self, startTime):
+      self.startTime = startTime
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def getNoteStartTime(self, index):
+      """Returns the start time of the note at 'index' (or -1.0 if there is no such note), via running sums of
+         durations (see Phrase.getNoteStartTime())."""
+
+      if index < 0 or index >= self.size():
+         return -1.0
+
+      key = (__materialVersion__, self.size())     # sums are valid while material (and size) is unchanged
+      if self.noteOffsetsKey != key:
+         offsets = array.array('d', [0.0])
+         time = 0.0
+         for duration in self.durations:
+            time = time + duration
+            offsets.append( time )
+         self.noteOffsets = offsets
+         self.noteOffsetsKey = key
+      return self.startTime + self.noteOffsets[index]
+
+   def getEndTime(self):
+      """Returns the end time of the phrase (start time, plus all note durations)."""
+      return self.startTime + sum(self.durations)
+
+   def getInstrument(self):
+      return self.instrument
+
+   def setInstrument(self, instrument):
+      self.instrument = instrument
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def getTempo(self):
+      return self.tempo
+
+   def setTempo(self, tempo):
+      self.tempo = tempo
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def getTitle(self):
+      return self.title
+
+   def setTitle(self, title):
+      self.title = title
+
+   def toPhrase(self):
+      """Returns a Phrase with the same notes and attributes."""
+
+      phrase = Phrase(self.startTime)
+      for i in range( self.size() ):
+         phrase.addNote( self.getNote(i) )
+      if self.instrument > -1:
+         phrase.setInstrument( self.instrument )
+      if self.tempo > -1:
+         phrase.setTempo( self.tempo )
+      phrase.setTitle( self.title )
+      return phrase
+
+   def setPhrase(self, phrase):
+      """Replaces notes and attributes with those of this Phrase."""
+
+      for column in [self.pitches, self.frequencies, self.durations, self.lengths, self.dynamics, self.pannings]:
+         del column[:]
+      for note in phrase.getNoteArray():
+         self.addNote( note )
+      self.startTime = phrase.getStartTime()
+      self.instrument = phrase.getInstrument()
+      self.tempo = phrase.getTempo()
+      self.title = phrase.getTitle()
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   # static functions
+   def fromPhrase(phrase):
+      """Returns a PackedPhrase with the same notes and attributes as this Phrase."""
+
+      packedPhrase = PackedPhrase()
+      packedPhrase.setPhrase( phrase )
+      return packedPhrase
+
+   fromPhrase = Callable(fromPhrase)
+
+
+######################################################################################
+#### jMusic Score extensions #########################################################
+######################################################################################
+
+from jm.music.data import Score as jScore  # needed to wrap more functionality below
+
+
+######################################################################################
+# TempoMap
+#
+# A score has a single tempo, so time conversion used one factor (60000 / tempo) for all notes.  A TempoMap
+# holds a tempo which changes over time, either suddenly (at a given beat), or gradually (a ramp, i.e., tempo changes
+# linearly, beat by beat, up to a given beat).  Tempo changes are compiled into segments, with the time (in milliseconds)
+# at which each segment starts, so a beat is converted to milliseconds by finding its segment (a binary search), and
+# adding the time within the segment (for a ramp, this is the integral of 60000 / tempo, i.e., a logarithm).
+#
+# Scores hold their tempo changes (see Score.addTempoChange()), which Play.midi(), Play.audio(), Play.code(), and
+# Write.midi() follow (MIDI files get tempo events - ramps are written as small steps, see TEMPO_RAMP_STEP).
+# A part (or phrase) with its own tempo is played at that tempo, ignoring the score's tempo changes (Write.midi() 
+# places its notes where they fall in time - see __scoreToMidiTracks__()).
+#
+# NOTE:  MidiSequence plays Scores through jMusic, which only knows a single tempo, so it ignores tempo changes,
+#        and part (or phrase) tempos are played as jMusic does (write the score with Write.midi() and give the 
+#        filename to MidiSequence instead).
+
+TEMPO_RAMP_STEP = 0.25   # length of tempo steps (in quarter notes) used to write tempo ramps to MIDI files
+
+class TempoMap():
+   """Converts between beats (quarter notes) and milliseconds, for a tempo (in beats per minute) which starts at
+      'tempo', and may change over time (see addChange())."""
+
+   def __init__(self, tempo=60.0):
+
+      if tempo <= 0:
+         raise ValueError, "TempoMap(): Tempo should be positive (it was " + str(tempo) + ")."
+
+      self.tempo = float(tempo)
+      self.changes = []       # holds (beat, tempo, ramp) tuples, ordered by beat
+      self.beats = None       # start beat of each segment (compiled when needed - see __compile__())
+      self.times = None       # start time (in milliseconds) of each segment
+      self.tempos = None      # tempo at the start of each segment
+      self.slopes = None      # tempo change per beat within each segment (0.0, unless it is a ramp)
+
+   def addChange(self, beat, tempo, ramp=False):
+      """Changes tempo to 'tempo' at 'beat'.  If 'ramp' is True, tempo changes gradually (linearly) from the previous
+         change (or from the beginning) up to 'beat' - otherwise, it changes right at 'beat'."""
+
+      if tempo <= 0:
+         raise ValueError, "TempoMap.addChange(): Tempo should be positive (it was " + str(tempo) + ")."
+      if beat < 0:
+         raise ValueError, "TempoMap.addChange(): Beat should not be negative (it was " + str(beat) + ")."
+
+      self.changes.append( (float(beat), float(tempo), bool(ramp)) )
+      self.changes.sort( key=lambda change: change[0] )   # (stable, so changes at the same beat keep their order)
+      self.beats = None                                    # segments need to be compiled again
+
+   def getChanges(self):
+      """Returns the tempo changes, as a list of (beat, tempo, ramp) tuples, ordered by beat."""
+      return list(self.changes)
+
+   def isConstant(self):
+      """Returns True, if tempo never changes."""
+      return self.changes == []
+
+   def getTempo(self, beat=0.0):
+      """Returns the tempo (in beats per minute) at 'beat'."""
+
+      i = self.__segment__( self.__getBeats__(), beat )
+      return self.tempos[i] + self.slopes[i] * (beat - self.beats[i])
+
+   def toMilliseconds(self, beat):
+      """Returns the time (in milliseconds) of 'beat' (in quarter notes)."""
+
+      i = self.__segment__( self.__getBeats__(), beat )
+      return self.times[i] + __segmentMilliseconds__( beat - self.beats[i], self.tempos[i], self.slopes[i] )
+
+   def toBeats(self, milliseconds):
+      """Returns the beat (in quarter notes) at time 'milliseconds'."""
+
+      self.__getBeats__()
+      i = self.__segment__( self.times, milliseconds )
+      return self.beats[i] + __segmentBeats__( milliseconds - self.times[i], self.tempos[i], self.slopes[i] )
+
+   def getTempoEvents(self, step=TEMPO_RAMP_STEP):
+      """Returns (beat, tempo) tuples for writing this tempo map to a MIDI file.  Ramps become steps of 'step'
+         quarter notes, each with the tempo which takes as long as the ramp does (so times match at every step)."""
+
+      self.__getBeats__()
+      events = []
+      for i in range( len(self.beats) ):
+         if self.slopes[i] == 0.0:       # constant tempo?
+            events.append( (self.beats[i], self.tempos[i]) )
+         else:                           # a ramp (always followed by another segment)
+            beat = self.beats[i]
+            while beat < self.beats[i+1]:
+               length = min(step, self.beats[i+1] - beat)
+               tempo = self.tempos[i] + self.slopes[i] * (beat - self.beats[i])
+               events.append( (beat, 60000.0 * length / __segmentMilliseconds__(length, tempo, self.slopes[i])) )
+               beat = beat + length
+
+      # keep only the last event at any beat, and only actual changes
+      tempoEvents = []
+      for beat, tempo in events:
+         if tempoEvents != [] and tempoEvents[-1][0] == beat:
+            del tempoEvents[-1]
+         if tempoEvents == [] or tempoEvents[-1][1] != tempo:
+            tempoEvents.append( (beat, tempo) )
+
+      return tempoEvents
+
+   def __getBeats__(self):
+      """Returns the start beats of segments (compiling segments, if needed)."""
+
+      if self.beats == None:
+         self.__compile__()
+      return self.beats
+
+   def __compile__(self):
+      """Compiles tempo changes into segments, with cumulative start times (see above)."""
+
+      beats  = [0.0]
+      times  = [0.0]
+      tempos = [self.tempo]
+      slopes = [0.0]
+      for beat, tempo, ramp in self.changes:
+         length = beat - beats[-1]
+         if ramp and length > 0:   # ramp to this tempo over the previous segment
+            slopes[-1] = (tempo - tempos[-1]) / length
+         beats.append( beat )
+         times.append( times[-1] + __segmentMilliseconds__(length, tempos[-1], slopes[-1]) )
+         tempos.append( tempo )
+         slopes.append( 0.0 )
+
+      self.times = times
+      self.tempos = tempos
+      self.slopes = slopes
+      self.beats = beats    # (last, as it marks segments as compiled)
+
+   def __segment__(self, starts, value):
+      """Returns the index of the (last) segment which contains 'value', given segment 'starts'."""
+      return max(0, bisect.bisect_right(starts, value) - 1)
+
+def __segmentMilliseconds__(length, tempo, slope):
+   """Returns how long (in milliseconds) 'length' quarter notes take, starting at 'tempo', changing by 'slope' per beat."""
+
+   if slope == 0.0:
+      return length * 60000.0 / tempo
+   else:
+      return 60000.0 / slope * math.log( (tempo + slope * length) / tempo )
+
+def __segmentBeats__(milliseconds, tempo, slope):
+   """Returns how many quarter notes are played in 'milliseconds', starting at 'tempo', changing by 'slope' per beat
+      (the inverse of __segmentMilliseconds__())."""
+
+   if slope == 0.0:
+      return milliseconds * tempo / 60000.0
+   else:
+      return tempo * (math.exp( milliseconds * slope / 60000.0 ) - 1.0) / slope
+
+def __tempoMapOf__(score):
+   """Returns the tempo map of a score (jMusic's Scores have a constant tempo)."""
+
+   if isinstance(score, Score):
+      return score.getTempoMap()
+   else:
+      return TempoMap( score.getTempo() )
+
+
+# update Score to hold tempo changes (see TempoMap above)
+class Score(jScore):
+
+   def __init__(self, *args):
+      jScore.__init__(self, *args)
+      self.tempoChanges = []     # holds (beat, tempo, ramp) tuples, in the order added
+      self.tempoMap = None       # compiled tempo map (see getTempoMap())
+
+   def __str__(self):    
+      # we disrupted access to jMusic's (Java's) Score.toString() method,
+      # so, let's fix it
+      return self.toString()
+
+   def __repr__(self):    
+      # we disrupted access to jMusic's (Java's) Score.toString() method,
+      # so, let's fix it
+      return self.toString()
+
+   def addTempoChange(self, beat, tempo, ramp=False):
+      """Changes tempo to 'tempo' at 'beat' (in quarter notes).  If 'ramp' is True, tempo changes gradually 
+         from the previous change (or from the score tempo, at the beginning) up to 'beat'."""
+
+      TempoMap().addChange( beat, tempo, ramp )   # check arguments
+      self.tempoChanges.append( (float(beat), float(tempo), bool(ramp)) )
+      self.tempoMap = None                          # needs to be compiled again
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def getTempoChanges(self):
+      """Returns the tempo changes, as a list of (beat, tempo, ramp) tuples, ordered by beat."""
+      return self.getTempoMap().getChanges()
+
+   def clearTempoChanges(self):
+      """Removes all tempo changes (i.e., the score tempo is used throughout)."""
+
+      self.tempoChanges = []
+      self.tempoMap = None
+
+      __touchMaterial__()   # record the change (see MaterialCallable)
+
+   def getTempoMap(self):
+      """Returns the score's TempoMap (starting at the score tempo)."""
+
+      # compile again, if tempo changes were added, or the score tempo was changed (e.g., with setTempo())
+      if self.tempoMap == None or self.tempoMap.tempo != self.getTempo():
+         self.tempoMap = TempoMap( self.getTempo() )
+         for beat, tempo, ramp in self.tempoChanges:
+            self.tempoMap.addChange( beat, tempo, ramp )
+      return self.tempoMap
+
+
+######################################################################################
+#### jMusic Play extensions ##########################################################
+######################################################################################
+
+from jm.util import Play as jPlay  # needed to wrap more functionality below
+
+# Create Play.noteOn(pitch, velocity, channel) to start a MIDI note sounding,  
+#        Play.noteOff(pitch, channel) to stop the corresponding note from sounding, and
+#        Play.setInstrument(instrument, channel) to change instrument for this channel.
+#
+# This adds to existing Play functionality.
+# This class is not meant to be instantiated, hence no "self" in function definitions.
+# Functions are made callable through class Callable, above.
+
+from javax.sound.midi import *
+
+# In headless mode (e.g., when building all scene MIDI files - see build_soundtrack.py), nothing is played, 
+# i.e., Play.midi() and Play.audio() return right away, and the Java synthesizer is not opened (so no audio 
+# device is needed).  To run headless, set environment variable JYTHONMUSIC_HEADLESS (to anything but 0).
+HEADLESS = os.environ.get("JYTHONMUSIC_HEADLESS", "0") not in ["", "0"]
+
+# NOTE: Opening the Java synthesizer below generates some low-level noise in the audio output.
+# But we need it to be open, in case the end-user wishes to use functions like Play.noteOn(), below. 
+# ( *** Is there a way to open it just-in-time, and/or close it when not used? I cannot think of one.)
+ 
+Java_synthesizer = MidiSystem.getSynthesizer()  # get a Java synthesizer
+if not HEADLESS:
+   Java_synthesizer.open()                      # and activate it (should we worry about close()???)
+
+# make all instruments available
+Java_synthesizer.loadAllInstruments(Java_synthesizer.getDefaultSoundbank())   
+ 
+
+# The MIDI specification stipulates that pitch bend be a 14-bit value, where zero is 
+# maximum downward bend, 16383 is maximum upward bend, and 8192 is the center (no pitch bend).
+PITCHBEND_MIN = 0 
+PITCHBEND_MAX = 16383 
+PITCHBEND_NORMAL = 8192
+
+# calculate constants from the way we handle pitch bend
+OUR_PITCHBEND_MAX    = PITCHBEND_MAX - PITCHBEND_NORMAL
+OUR_PITCHBEND_MIN    = -PITCHBEND_NORMAL 
+OUR_PITCHBEND_NORMAL = 0 
+
+# initialize pitchbend across channels to 0
+CURRENT_PITCHBEND = {}    # holds pitchbend to be used when playing a note / frequency (see below)
+for i in range(16):
+   CURRENT_PITCHBEND[i] = 0   # set this channel's pitchbend to zero
+
+
+# Keep a copy (shadow) of the state of the Java synthesizer's channels (instrument, volume, panning, and
+# pitch bend), so that we send a message only when the state actually changes.  For example, Play.midi() sets the
+# instrument, pitch bend, and panning for every note - without the shadow, this is about four messages per note,
+# whereas, with it, it is usually only one (the NOTE_ON itself).  Also, channel handles are looked up only once.
+#
+# NOTE:  Sequencers (see Play.midi(engine="sequencer")) change channel state directly, so, while a sequencer is 
+#        playing on a channel, we do not trust the shadow for that channel (and re-read the synthesizer state).
+
+import threading   # needed to guard channel state
+
+class MidiChannelState():
+   """Shadows the state of a Java synthesizer's MIDI channels, to suppress redundant messages."""
+
+   def __init__(self, synthesizer):
+
+      self.channels = synthesizer.getChannels()   # handles to the synthesizer's channels (looked up once)
+      self.programs = {}              # holds last instrument sent, indexed by channel
+      self.controllers = {}           # holds last controller value sent (e.g., volume, panning), indexed by (channel, controller)
+      self.pitchBends = {}            # holds last (MIDI) pitch bend sent, indexed by channel
+      self.sequencers = {}            # holds Sequencers currently controlling a channel, indexed by channel
+      self.lock = threading.Lock()    # guards shadow state (messages are sent from several threads)
+
+   def getChannel(self, channel):
+      """Returns the handle to this channel of the Java synthesizer."""
+
+      return self.channels[channel]
+
+   def setProgram(self, channel, instrument):
+      """Sends a patch change message for this channel (only if instrument is different from the current one)."""
+
+      self.lock.acquire()
+      try:
+         if not self.__isShadowed__(channel) or self.programs.get(channel) != instrument:
+            self.channels[channel].programChange(channel, instrument)   # send the message
+            self.programs[channel] = instrument
+      finally:
+         self.lock.release()
+
+   def getProgram(self, channel):
+      """Returns the current instrument for this channel."""
+
+      self.lock.acquire()
+      try:
+         if not self.__isShadowed__(channel) or channel not in self.programs:
+            self.programs[channel] = self.channels[channel].getProgram()   # ask the synthesizer
+         return self.programs[channel]
+      finally:
+         self.lock.release()
+
+   def setController(self, channel, controller, value):
+      """Sends a control change message for this channel (only if value is different from the current one)."""
+
+      controllerID = (channel, controller)
+      self.lock.acquire()
+      try:
+         if not self.__isShadowed__(channel) or self.controllers.get(controllerID) != value:
+            self.channels[channel].controlChange(controller, value)   # send the message
+            self.controllers[controllerID] = value
+      finally:
+         self.lock.release()
+
+   def getController(self, channel, controller):
+      """Returns the current value of this controller for this channel."""
+
+      controllerID = (channel, controller)
+      self.lock.acquire()
+      try:
+         if not self.__isShadowed__(channel) or controllerID not in self.controllers:
+            self.controllers[controllerID] = self.channels[channel].getController(controller)   # ask the synthesizer
+         return self.controllers[controllerID]
+      finally:
+         self.lock.release()
+
+   def setPitchBend(self, channel, bend):
+      """Sends a pitch bend message (MIDI value) for this channel (only if different from the current one)."""
+
+      self.lock.acquire()
+      try:
+         if not self.__isShadowed__(channel) or self.pitchBends.get(channel) != bend:
+            self.channels[channel].setPitchBend(bend)   # send the message
+            self.pitchBends[channel] = bend
+      finally:
+         self.lock.release()
+
+   def invalidate(self, channel=None):
+      """Forgets the shadow state of a channel (or all channels, if none given), e.g., after messages were sent to
+         the synthesizer by other means.  The next message for the channel is sent regardless.
+      """
+
+      self.lock.acquire()
+      try:
+         if channel == None:
+            self.programs.clear()
+            self.controllers.clear()
+            self.pitchBends.clear()
+         else:
+            self.__forget__(channel)
+      finally:
+         self.lock.release()
+
+   def addSequencer(self, sequencer, channels):
+      """Records that 'sequencer' is about to change the state of these channels directly (see Play.midi())."""
+
+      self.lock.acquire()
+      try:
+         for channel in channels:
+            self.sequencers.setdefault(channel, []).append( sequencer )
+            self.__forget__(channel)
+      finally:
+         self.lock.release()
+
+   def __isShadowed__(self, channel):
+      """Returns True if the shadow state of this channel can be trusted, i.e., no sequencers are playing 
+         on it (caller should hold the lock)."""
+
+      if channel in self.sequencers:     # have sequencers played on this channel?
+         for sequencer in self.sequencers[channel]:
+            if sequencer.isRunning():       # is any still playing?
+               self.__forget__(channel)        # yes, so we cannot trust the shadow
+               return False
+
+         # all done, so forget them (the channel's state is not known, so it will be re-read / re-sent)
+         del self.sequencers[channel]
+         self.__forget__(channel)
+
+      return True
+
+   def __forget__(self, channel):
+      """Forgets the shadow state of a channel (caller should hold the lock)."""
+
+      if channel in self.programs:
+         del self.programs[channel]
+      if channel in self.pitchBends:
+         del self.pitchBends[channel]
+      for controllerID in self.controllers.keys():
+         if controllerID[0] == channel:
+            del self.controllers[controllerID]
+
+# the shadow state for all Play functions
+__channelState__ = MidiChannelState(Java_synthesizer)
+
+  
+#########
+# NOTE:  The following code addresses Play.midi() functionality.  In order to be able to stop music
+# that is currently playing, we wrap the jMusic Play class inside a Python Play class and rebuild 
+# play music functionality from basic elements.
+
+from jm.midi import MidiSynth  # needed to play and loop MIDI
+from time import sleep         # needed to implement efficient busy-wait loops (see below)
+from timer import *            # needed to schedule future tasks
+
+# allocate enough MidiSynths and reuse them (when available)
+__midiSynths__ = []            # holds all available jMusic MidiSynths 
+MAX_MIDI_SYNTHS = 12           # max number of concurrent MidiSynths allowed 
+                               # NOTE: This is an empirical value - not documented - may change.                               
+                               
+def __getMidiSynth__():
+   """Returns the next available MidiSynth (if any), or None."""
+         
+   # make sure all possible MidiSynths are allocated 
+   if __midiSynths__ == []:
+      for i in range(MAX_MIDI_SYNTHS):
+         __midiSynths__.append( MidiSynth() )   # create a new MIDI synthesizer
+   # now, all MidiSynths are allocated
+      
+   # find an available MidiSynth to play the material (it's possible that all are allocated,
+   # since this function may be called repeatedly, while other music is still sounding
+   i = 0
+   while i < MAX_MIDI_SYNTHS and __midiSynths__[i].isPlaying():
+      i = i + 1     # check if the next MidiSynth is available
+   # now, i either points to the next available MidiSynth, or MAX_MIDI_SYNTHS if none is available
+      
+   # did we find an available MidiSynth?
+   if i < MAX_MIDI_SYNTHS:
+      midiSynth = __midiSynths__[i]
+   else:
+      midiSynth = None
+
+   return midiSynth    # let them have it (hopefully, they will use it right away)
+
+# Provide a way to stop all MidiSynths from playing.
+def __stopMidiSynths__():
+   """Stops all MidiSynths from playing."""
+   for midiSynth in __midiSynths__:
+      if midiSynth.isPlaying():    # if playing, stop it
+         midiSynth.stop()
+
+
+##################################################################################################################
+# EventScheduler
+#
+# Schedules future events (e.g., note-on and note-off messages) using a single dispatcher thread.
+# All pending events are kept in one heap, ordered by time (in milliseconds).  The dispatcher sleeps
+# until the next event is about to come due (i.e., it is within the lookahead window), and then waits
+# out the remaining time precisely, and dispatches all events that are due together.
+#
+# Java's Object.wait() (behind threading.Condition) only has millisecond precision, and may wake up a bit late.
+# So, it is used only to sleep until the lookahead window.  The rest is waited out with LockSupport.parkNanos(), 
+# which is a timed wait, too (i.e., no spinning), but much more precise (typically, a few tens of microseconds).
+# Newly scheduled events which are earlier than the one being waited for wake up the dispatcher in either case.
+#
+# Previously, Play.note() created two Timer2 objects (i.e., two threads) for every note.  Long scores
+# ended up creating thousands of threads, with the corresponding overhead (and timing jitter).  Now,
+# the number of threads stays flat, regardless of how many notes a score has.
+
+import sys         # needed to report errors from dispatched events
+import heapq       # needed to keep pending events ordered by time
+import threading   # needed for the dispatcher thread
+from java.lang import System   # needed for a monotonic clock with sub-millisecond accuracy (nanoTime)
+from java.lang import Thread as JThread             # needed to wake up the dispatcher while waiting precisely
+from java.util.concurrent.locks import LockSupport  # needed to wait precisely (see above)
+
+class EventScheduler():
+   """Calls functions at specific times in the future, using a single dispatcher thread."""
+
+   def __init__(self, lookahead=5.0):
+
+      self.lookahead = lookahead      # how early (in milliseconds) to wake up before an event is due
+      self.events = []                # heap of pending events - (time, sequence, function, parameters, channel) tuples
+      self.sequence = 0               # used to break ties, so events with the same time are dispatched in order scheduled
+      self.condition = threading.Condition()   # guards pending events (and used to wake up dispatcher)
+      self.thread = None              # the dispatcher thread (created the first time something is scheduled)
+      self.javaThread = None          # the same, as a Java thread (used to wake it up - see __wake__())
+
+   def now(self):
+      """Returns the current time in milliseconds (this is the scheduler's clock)."""
+
+      return System.nanoTime() / 1000000.0
+
+   def schedule(self, delay, function, parameters=[], channel=None):
+      """Schedules 'function' to be called with 'parameters', 'delay' milliseconds from now.
+         Optional 'channel' is used to report scheduling accuracy per channel (see SchedulingMonitor)."""
+
+      self.scheduleAt( self.now() + delay, function, parameters, channel )
+
+   def scheduleAt(self, time, function, parameters=[], channel=None):
+      """Schedules 'function' to be called with 'parameters' at 'time' (in scheduler's clock, see now()).
+         Optional 'channel' is used to report scheduling accuracy per channel (see SchedulingMonitor).
+         A 'channel' of UNMONITORED means that the event's accuracy is not recorded (e.g., it is measured elsewhere)."""
+
+      self.condition.acquire()
+      try:
+         heapq.heappush( self.events, (time, self.sequence, function, parameters, channel) )
+         self.sequence = self.sequence + 1
+         self.__startDispatcher__()
+         if self.events[0][1] == self.sequence - 1:   # is this event earlier than what the dispatcher is waiting for?
+            self.__wake__()                              # yes, so let it know
+      finally:
+         self.condition.release()
+
+   def scheduleAll(self, events, origin=None):
+      """Schedules a list of (delay, function, parameters) events at once.  All delays are measured from
+         the same 'origin' (default is now), so events keep their exact relative timing.  Events may also
+         have a fourth item, a channel (see scheduleAt()).
+      """
+
+      if origin == None:    # no origin provided?
+         origin = self.now()   # so, use now
+
+      self.condition.acquire()
+      try:
+         for event in events:
+            channel = None                  # assume no channel provided
+            if len(event) > 3:              # was it?
+               channel = event[3]              # yes, so remember it
+            self.events.append( (origin + event[0], self.sequence, event[1], event[2], channel) )
+            self.sequence = self.sequence + 1
+         heapq.heapify( self.events )   # restore heap order in one pass (cheaper than pushing one by one)
+         self.__startDispatcher__()
+         self.__wake__()
+      finally:
+         self.condition.release()
+
+   def clear(self):
+      """Removes all pending events."""
+
+      self.condition.acquire()
+      try:
+         self.events = []
+         self.__wake__()
+      finally:
+         self.condition.release()
+
+   def pending(self):
+      """Returns the number of pending events."""
+
+      return len(self.events)
+
+   def setLookahead(self, lookahead):
+      """Sets how early (in milliseconds) the dispatcher wakes up before an event is due, and starts waiting out
+         the rest precisely (see above).  It should be more than how late the coarse wait may wake up (a millisecond
+         or two, depending on the platform), otherwise events may be dispatched that late.  A larger lookahead does 
+         not keep a processor busy (the rest is waited out with a timed wait, too)."""
+
+      self.lookahead = lookahead
+
+   def getLookahead(self):
+      """Returns how early (in milliseconds) the dispatcher wakes up before an event is due."""
+
+      return self.lookahead
+
+   def __wake__(self):
+      """Wakes up the dispatcher, whichever way it is waiting (caller should hold the lock)."""
+
+      self.condition.notify()
+      if self.javaThread != None:
+         LockSupport.unpark( self.javaThread )
+
+   def __startDispatcher__(self):
+      """Starts the dispatcher thread, if not running already (caller should hold the lock)."""
+
+      if self.thread == None or not self.thread.isAlive():
+         self.thread = threading.Thread(target=self.__dispatch__, name="EventScheduler")
+         self.thread.setDaemon(True)    # do not keep the JVM alive because of us
+         self.thread.start()
+
+   def __dispatch__(self):
+      """The dispatcher loop - waits for events to come due, and calls them."""
+
+      self.javaThread = JThread.currentThread()   # (so we can be woken up while parked - see __wake__())
+
+      while True:
+
+         # first, wait until the next event is within the lookahead window
+         self.condition.acquire()
+         try:
+            while True:
+               if self.events == []:    # nothing to do?
+                  self.condition.wait()    # yes, so wait to be notified
+
+               else:                    # otherwise, see how long until next event
+                  remaining = self.events[0][0] - self.now()
+                  if remaining <= self.lookahead:   # is it within the lookahead window?
+                     break                             # yes, so get ready
+                  self.condition.wait( (remaining - self.lookahead) / 1000.0 )   # no, so sleep (we may be notified earlier)
+         finally:
+            self.condition.release()
+
+         # now, wait out the remaining time precisely (parking is a timed wait, so there is no spinning), checking
+         # the next event again every time we wake up (an earlier one may have been scheduled - see __wake__())
+         while True:
+            self.condition.acquire()
+            try:
+               if self.events == []:      # were events cleared meanwhile?
+                  break                      # yes, so nothing to wait for
+               remaining = self.events[0][0] - self.now()
+            finally:
+               self.condition.release()
+            if remaining <= 0.0:          # is it due?
+               break                         # yes, so go dispatch it
+            LockSupport.parkNanos( long(remaining * 1000000.0) )   # no, so wait (we may be woken up earlier)
+
+         # collect all events that are due (these may include some that were scheduled while we were waiting)
+         dueEvents = []
+         self.condition.acquire()
+         try:
+            now = self.now()
+            while self.events != [] and self.events[0][0] <= now:
+               dueEvents.append( heapq.heappop(self.events) )
+         finally:
+            self.condition.release()
+
+         # and dispatch them (outside the lock, so that they may schedule more events)
+         for time, sequence, function, parameters, channel in dueEvents:
+            if __schedulingMonitor__.enabled and channel != UNMONITORED:     # are we measuring accuracy?
+               __schedulingMonitor__.record( self.now() - time, channel )       # yes, so record how late this event is
+            try:
+               function( *parameters )
+            except:    # one bad event should not stop the music
+               print "EventScheduler: Error calling " + str(function) + " - " + str(sys.exc_info()[1])
+
+
+# the scheduler used by all Play functions (one thread, regardless of how many notes are scheduled)
+__playScheduler__ = EventScheduler()
+
+
+
+##################################################################################################################
+# SchedulingMonitor
+#
+# Measures how accurately events are dispatched, i.e., how late each event is called compared to its scheduled 
+# time (its lateness).  This is off by default (it costs a little for every event) - turn it on with 
+# Play.setInstrumentation(True), and then, get statistics (e.g., median, 99th percentile, and maximum lateness)
+# overall, per channel (via Play.getLatency()), or per playback (via a playback handle's getLatency()).
+
+UNMONITORED = -1     # channel given to events whose accuracy should not be recorded (see EventScheduler.scheduleAt())
+
+class LatencyHistogram():
+   """Counts event lateness values (in milliseconds) in buckets of fixed size (default is 0.1 ms)."""
+
+   def __init__(self, resolution=0.1):
+
+      self.resolution = resolution   # size of buckets (in milliseconds)
+      self.buckets = {}              # holds number of values, indexed by bucket (i.e., lateness / resolution)
+      self.count = 0                 # number of values recorded
+      self.total = 0.0               # sum of values recorded (for the mean)
+      self.maximum = 0.0             # largest value recorded
+
+   def record(self, lateness):
+      """Records an event's lateness (in milliseconds)."""
+
+      lateness = max(lateness, 0.0)   # early events count as on time
+      bucket = int(lateness / self.resolution)
+      self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+      self.count = self.count + 1
+      self.total = self.total + lateness
+      self.maximum = max(self.maximum, lateness)
+
+   def getPercentile(self, percentile):
+      """Returns the lateness (in milliseconds) below which 'percentile' (0 to 100) percent of the values fall."""
+
+      if self.count == 0:
+         return 0.0
+
+      wanted = ceil( self.count * percentile / 100.0 )   # how many values should be at or below the answer
+      counted = 0
+      for bucket in sorted( self.buckets.keys() ):
+         counted = counted + self.buckets[bucket]
+         if counted >= wanted:
+            return min( (bucket + 1) * self.resolution, self.maximum )   # upper edge of this bucket (but no more than the max)
+
+      return self.maximum
+
+   def getMean(self):
+      """Returns the average lateness (in milliseconds)."""
+
+      if self.count == 0:
+         return 0.0
+      return self.total / self.count
+
+   def getSummary(self):
+      """Returns a dictionary with the number of events, and their median (p50), 99th percentile (p99), maximum,
+         and mean lateness (in milliseconds)."""
+
+      return {"count": self.count, "p50": self.getPercentile(50), "p99": self.getPercentile(99), 
+              "max": self.maximum, "mean": self.getMean()}
+
+   def __str__(self):
+      return "LatencyHistogram(count = %d, p50 = %.2f ms, p99 = %.2f ms, max = %.2f ms)" % \
+             (self.count, self.getPercentile(50), self.getPercentile(99), self.maximum)
+
+   def __repr__(self):
+      return str(self)
+
+
+class SchedulingMonitor():
+   """Collects lateness statistics for dispatched events (overall, and per channel)."""
+
+   def __init__(self):
+
+      self.enabled = False                  # only record when enabled (see Play.setInstrumentation())
+      self.overall = LatencyHistogram()     # lateness of all events
+      self.channels = {}                    # holds lateness of events per channel, indexed by channel
+      self.lock = threading.Lock()          # guards histograms (events are dispatched from several threads)
+
+   def record(self, lateness, channel=None, playback=None):
+      """Records an event's lateness (in milliseconds), also for its channel and playback (if provided)."""
+
+      self.lock.acquire()
+      try:
+         self.overall.record( lateness )
+         if channel != None:
+            if channel not in self.channels:
+               self.channels[channel] = LatencyHistogram()
+            self.channels[channel].record( lateness )
+         if playback != None:
+            playback.latency.record( lateness )
+      finally:
+         self.lock.release()
+
+   def reset(self):
+      """Forgets all statistics collected so far."""
+
+      self.lock.acquire()
+      try:
+         self.overall = LatencyHistogram()
+         self.channels = {}
+      finally:
+         self.lock.release()
+
+   def getLatency(self, channel=None):
+      """Returns the lateness histogram for this channel (or all events, if no channel given)."""
+
+      if channel == None:
+         return self.overall
+      return self.channels.get(channel, LatencyHistogram())
+
+   def getCounts(self):
+      """Returns a dictionary with the number of pending events, active playbacks, and live threads."""
+
+      return {"pendingEvents": __playScheduler__.pending(),
+              "activePlaybacks": len(__activePlaybacks__),
+              "pythonThreads": threading.activeCount(),
+              "javaThreads": Thread.activeCount()}
+
+# the monitor used by all Play functions
+__schedulingMonitor__ = SchedulingMonitor()
+
+
+##################################################################################################################
+# CallbackExecutor
+#
+# Play.code() calls arbitrary functions (e.g., to draw something, or to drive game logic).  These may take long,
+# so they should not be called by the scheduler's dispatcher thread (it would delay every note after them).
+# Instead, the dispatcher hands them to a CallbackExecutor, which calls them using a small pool of worker threads.
+#
+# Calls for the same channel are made one at a time, in order (so a function never runs concurrently with itself).
+# If calls for a channel come faster than its function can handle, the overrun policy decides what happens:
+#
+#    "queue"    - calls wait their turn (default) - up to MAX_QUEUED_CALLS per channel, then the oldest are dropped
+#    "drop"     - new calls are dropped while the channel's function is busy
+#    "coalesce" - only the latest call waits (older waiting calls are dropped)
+#
+# Also, calls which start more than CODE_DEADLINE milliseconds after they were due are counted as missed deadlines
+# (see Play.getCodeStats()).
+
+from collections import deque   # needed for per-channel call queues
+from java.util.concurrent import ThreadPoolExecutor, ThreadFactory, LinkedBlockingQueue, TimeUnit   # needed for worker threads
+from java.lang import Runnable, Thread, Runtime   # needed for worker threads (Thread is also used to count live threads)
+
+CODE_WORKERS = min(4, Runtime.getRuntime().availableProcessors())   # number of worker threads calling Play.code() functions
+CODE_DEADLINE = 10.0        # calls starting later than this (in milliseconds) count as missed deadlines
+MAX_QUEUED_CALLS = 64       # max number of calls waiting per channel (see "queue" policy above)
+OVERRUN_POLICIES = ["queue", "drop", "coalesce"]
+
+class __DaemonThreadFactory__(ThreadFactory):
+   """Creates worker threads which do not keep the JVM alive."""
+
+   def newThread(self, runnable):
+      thread = Thread(runnable, "Play.code worker")
+      thread.setDaemon(True)
+      return thread
+
+class __ChannelCalls__(Runnable):
+   """The calls of a channel waiting for a worker (a worker runs them one at a time)."""
+
+   def __init__(self, executor, channel):
+      self.executor = executor
+      self.channel = channel
+      self.calls = deque()     # holds (function, arguments, submit time) tuples
+      self.running = False     # is a worker running (or about to run) our calls?
+
+   def run(self):
+      self.executor.__drain__(self)
+
+class CallbackExecutor():
+   """Calls functions using a bounded pool of worker threads, one call at a time per channel."""
+
+   def __init__(self, workers=CODE_WORKERS, deadline=CODE_DEADLINE):
+
+      self.pool = ThreadPoolExecutor(workers, workers, 60, TimeUnit.SECONDS, LinkedBlockingQueue(), __DaemonThreadFactory__())
+      self.pool.allowCoreThreadTimeOut(True)   # let idle workers go away
+      self.deadline = deadline                 # calls starting later than this (in milliseconds) miss their deadline
+      self.channels = {}                       # holds calls waiting, indexed by channel
+      self.lock = threading.Lock()             # guards calls waiting and counters
+      self.resetStats()
+
+   def submit(self, channel, function, arguments, overrun="queue"):
+      """Calls 'function' with 'arguments' as soon as a worker is available (and previous calls for this 
+         channel are done).  Parameter 'overrun' decides what happens if this channel's calls are falling behind
+         (see OVERRUN_POLICIES).
+      """
+
+      self.lock.acquire()
+      try:
+         self.stats["submitted"] = self.stats["submitted"] + 1
+         if channel not in self.channels:
+            self.channels[channel] = __ChannelCalls__(self, channel)
+         channelCalls = self.channels[channel]
+
+         # is this channel busy (i.e., falling behind)?
+         if channelCalls.running:
+            if overrun == "drop":                      # drop this call?
+               self.stats["dropped"] = self.stats["dropped"] + 1
+               return
+            elif overrun == "coalesce":                # keep only this call?
+               self.stats["coalesced"] = self.stats["coalesced"] + len(channelCalls.calls)
+               channelCalls.calls.clear()
+            elif len(channelCalls.calls) >= MAX_QUEUED_CALLS:   # queue, but is it full?
+               channelCalls.calls.popleft()                        # yes, so make room
+               self.stats["dropped"] = self.stats["dropped"] + 1
+
+         channelCalls.calls.append( (function, arguments, System.nanoTime() / 1000000.0) )
+
+         # and make sure a worker takes care of it
+         if not channelCalls.running:
+            channelCalls.running = True
+            self.pool.execute( channelCalls )
+      finally:
+         self.lock.release()
+
+   def clear(self):
+      """Drops all calls waiting for a worker."""
+
+      self.lock.acquire()
+      try:
+         for channelCalls in self.channels.values():
+            channelCalls.calls.clear()
+      finally:
+         self.lock.release()
+
+   def setWorkers(self, workers):
+      """Sets the number of worker threads."""
+
+      if workers > self.pool.getMaximumPoolSize():   # (order matters, since core size may not exceed maximum size)
+         self.pool.setMaximumPoolSize(workers)
+         self.pool.setCorePoolSize(workers)
+      else:
+         self.pool.setCorePoolSize(workers)
+         self.pool.setMaximumPoolSize(workers)
+
+   def getStats(self):
+      """Returns a dictionary with the number of calls submitted, executed, dropped, coalesced, still waiting,
+         and those that missed their deadline (also per channel)."""
+
+      self.lock.acquire()
+      try:
+         stats = dict(self.stats)
+         stats["missedDeadlinesPerChannel"] = dict(self.stats["missedDeadlinesPerChannel"])
+         stats["waiting"] = sum( [len(channelCalls.calls) for channelCalls in self.channels.values()] )
+         return stats
+      finally:
+         self.lock.release()
+
+   def resetStats(self):
+      """Resets all counters."""
+
+      self.stats = {"submitted": 0, "executed": 0, "dropped": 0, "coalesced": 0, "missedDeadlines": 0,
+                    "missedDeadlinesPerChannel": {}}
+
+   def __drain__(self, channelCalls):
+      """Makes the waiting calls of a channel, one at a time (runs in a worker thread)."""
+
+      while True:
+
+         # get next call (if any)
+         self.lock.acquire()
+         try:
+            if len(channelCalls.calls) == 0:   # all done?
+               channelCalls.running = False       # yes, so let another worker pick up future calls
+               return
+            function, arguments, submitTime = channelCalls.calls.popleft()
+
+            # did it miss its deadline?
+            if System.nanoTime() / 1000000.0 - submitTime > self.deadline:
+               self.stats["missedDeadlines"] = self.stats["missedDeadlines"] + 1
+               missed = self.stats["missedDeadlinesPerChannel"]
+               missed[channelCalls.channel] = missed.get(channelCalls.channel, 0) + 1
+         finally:
+            self.lock.release()
+
+         # and make it
+         try:
+            function( *arguments )
+         except:    # one bad function should not stop the others
+            print "Play.code(): Error calling " + str(function) + " - " + str(sys.exc_info()[1])
+
+         self.lock.acquire()
+         self.stats["executed"] = self.stats["executed"] + 1
+         self.lock.release()
+
+# the executor used by Play.code()
+__codeExecutor__ = CallbackExecutor()
+
+
+##################################################################################################################
+# PlaybackHandle
+#
+# Play.midi(), Play.audio(), and Play.code() return a PlaybackHandle, which controls all events of that playback
+# together (i.e., cancel(), pause(), and resume()).
+#
+# A handle keeps its own events (in a heap, ordered by time).  It has only one entry in the scheduler at any
+# time (for its next event) - when that comes due, the handle dispatches all its events that are due, and 
+# reschedules itself for the next one.  So, cancelling or pausing a playback simply marks its scheduler entry 
+# as stale (which is then ignored), regardless of how many events are pending.  Resuming shifts the handle's time 
+# origin by how long it was paused, and reschedules it.
+#
+# Also, a handle remembers which of its notes are sounding, so that cancelling or pausing it turns them off
+# (and only them) right away - no fragments of stopped cues are left behind.
+#
+# Finally, a handle may stream its events from a source (see stream()), i.e., pull them in as playback 
+# approaches them, keeping only a window of upcoming events in memory (e.g., Play.midi(material, streaming=True)).
+
+STREAMING_WINDOW = 2000.0     # how far ahead (in milliseconds) streamed events are pulled in (see PlaybackHandle.stream())
+
+__activePlaybacks__ = []      # holds PlaybackHandles which have not finished yet (see Play.stop())
+
+class PlaybackHandle():
+   """Controls all events of a single playback (e.g., Play.midi()) together."""
+
+   def __init__(self, scheduler=None):
+
+      if scheduler == None:            # no scheduler provided?
+         scheduler = __playScheduler__    # so, use the one shared by all Play functions
+
+      self.scheduler = scheduler
+      self.events = []             # heap of pending events, i.e., (time, sequence, function, parameters, release, channel) tuples
+      self.sequence = 0            # used to identify events (and break ties, so events with the same time are dispatched in order added)
+      self.source = None           # iterator adding more events, as needed (see stream())
+      self.sourceTime = None       # time of the latest events added by the source
+      self.window = STREAMING_WINDOW   # how far ahead (in milliseconds) to pull in events from the source
+      self.origin = None           # scheduler time when playback started (shifted by pauses)
+      self.pauseTime = None        # scheduler time when playback was paused
+      self.generation = 0          # incremented on every pause or cancel (stale scheduler entries are ignored)
+      self.paused = False
+      self.cancelled = False
+      self.sounding = {}           # holds release events (i.e., note-offs) of notes currently sounding, indexed by sequence
+      self.released = {}           # holds sequences of release events already done early (e.g., by pause()), to be skipped
+      self.lock = threading.RLock()    # guards playback state (reentrant, since events may control their own playback)
+      self.latency = LatencyHistogram()   # lateness of our events (recorded only when instrumentation is on, see SchedulingMonitor)
+
+   def addEvent(self, time, function, parameters=[], channel=None):
+      """Adds an event calling 'function' with 'parameters', 'time' milliseconds after playback starts.
+         Optional 'channel' is used to report scheduling accuracy per channel (see SchedulingMonitor)."""
+
+      self.__addEvent__( (time, self.__nextSequence__(), function, parameters, None, channel) )
+
+   def addNote(self, time, duration, onFunction, onParameters, offFunction, offParameters, channel=None):
+      """Adds a note, i.e., an 'onFunction' event at 'time', and an 'offFunction' event 'duration' milliseconds later. 
+         If playback is cancelled (or paused) while the note is sounding, 'offFunction' is called right away.
+      """
+
+      onSequence = self.__nextSequence__()
+      offSequence = self.__nextSequence__()
+      self.__addEvent__( (time, onSequence, onFunction, onParameters, [(offSequence, offFunction, offParameters)], channel) )
+      self.__addEvent__( (time + duration, offSequence, offFunction, offParameters, None, channel) )
+
+   def addChord(self, time, durations, onFunction, onParametersList, offFunction, offParametersList, channel=None):
+      """Adds a chord, i.e., one event at 'time' calling 'onFunction' for each of 'onParametersList' (so all notes
+         start in the same dispatch), and events calling 'offFunction' for each of 'offParametersList', after the 
+         corresponding 'durations' (chord notes with the same duration are turned off in the same event).
+      """
+
+      # group note-offs by duration (usually, all chord notes have the same duration)
+      offs = {}     # holds parameters of note-offs, indexed by duration
+      for k in range( len(durations) ):
+         offs.setdefault(durations[k], []).append( offParametersList[k] )
+
+      onSequence = self.__nextSequence__()
+      releases = []    # note-off events, i.e., (sequence, function, parameters) tuples
+      for duration in offs.keys():
+         releases.append( (self.__nextSequence__(), __callEach__, [offFunction, offs[duration]]) )
+
+      self.__addEvent__( (time, onSequence, __callEach__, [onFunction, onParametersList], releases, channel) )
+      for duration, release in zip(offs.keys(), releases):
+         sequence, function, parameters = release
+         self.__addEvent__( (time + duration, sequence, function, parameters, None, channel) )
+
+   def stream(self, source, window=STREAMING_WINDOW):
+      """Sets an iterator which adds events as playback goes along (instead of adding all of them in advance).
+         Every step of the iterator should add the events of the next onset (e.g., via addNote()), and return its time 
+         (times should be ascending).  Events are pulled in 'window' milliseconds before they are due.
+      """
+
+      self.source = iter(source)
+      self.window = window
+
+      return self
+
+   def start(self):
+      """Starts playback (events are ordered once here)."""
+
+      self.lock.acquire()
+      try:
+         heapq.heapify( self.events )
+         self.origin = self.scheduler.now()
+         __activePlaybacks__.append( self )
+         self.__pull__( self.origin )
+         self.__scheduleNext__()
+      finally:
+         self.lock.release()
+
+      return self
+
+   def cancel(self):
+      """Stops playback for good - pending events are dropped, and sounding notes are turned off."""
+
+      self.lock.acquire()
+      try:
+         if not self.cancelled:
+            self.cancelled = True
+            self.generation = self.generation + 1    # ignore our entry in the scheduler
+            self.source = None                       # and stop streaming
+            self.__releaseSounding__()
+            self.__finished__()
+      finally:
+         self.lock.release()
+
+   def pause(self):
+      """Pauses playback - sounding notes are turned off, and pending events wait until resume()."""
+
+      self.lock.acquire()
+      try:
+         if not self.paused and not self.cancelled and not self.isDone():
+            self.paused = True
+            self.pauseTime = self.scheduler.now()
+            self.generation = self.generation + 1    # ignore our entry in the scheduler
+            self.__releaseSounding__()
+      finally:
+         self.lock.release()
+
+   def resume(self):
+      """Resumes a paused playback from where it was paused."""
+
+      self.lock.acquire()
+      try:
+         if self.paused and not self.cancelled:
+            self.paused = False
+            self.origin = self.origin + (self.scheduler.now() - self.pauseTime)   # shift remaining events by the pause
+            self.__scheduleNext__()
+      finally:
+         self.lock.release()
+
+   def isPlaying(self):
+      """Returns True if playback has pending events (and is not paused or cancelled)."""
+
+      return not self.paused and not self.cancelled and not self.isDone()
+
+   def isPaused(self):
+      """Returns True if playback is paused."""
+
+      return self.paused
+
+   def isDone(self):
+      """Returns True if playback has finished (or has been cancelled)."""
+
+      return self.cancelled or (self.events == [] and self.source == None)
+
+   def pending(self):
+      """Returns the number of events not dispatched yet (streamed events are counted once they are pulled in)."""
+
+      return len(self.events)
+
+   def getLatency(self):
+      """Returns the lateness histogram of this playback's events (see Play.setInstrumentation())."""
+
+      return self.latency
+
+   def __nextSequence__(self):
+      """Returns a new event sequence number."""
+
+      sequence = self.sequence
+      self.sequence = self.sequence + 1
+      return sequence
+
+   def __addEvent__(self, event):
+      """Adds an event (before playback starts, events are ordered all together, in start())."""
+
+      if self.origin == None:     # not started yet?
+         self.events.append( event )
+      else:
+         heapq.heappush( self.events, event )
+
+   def __pull__(self, now):
+      """Pulls in events from the source, up to the window ahead of 'now' (caller should hold the lock)."""
+
+      while self.source != None and (self.sourceTime == None or self.origin + self.sourceTime - self.window <= now):
+         try:
+            self.sourceTime = self.source.next()
+         except StopIteration:   # no more events?
+            self.source = None
+         except:                 # an error in the source should not leave the music hanging
+            print "PlaybackHandle: Error streaming events - " + str(sys.exc_info()[1])
+            self.source = None
+
+   def __scheduleNext__(self):
+      """Schedules our next event (or next pull from the source) with the scheduler (caller should hold the lock)."""
+
+      if self.events != [] or self.source != None:
+         nextTime = None
+         if self.events != []:
+            nextTime = self.origin + self.events[0][0]
+         if self.source != None:    # are we streaming?
+            pullTime = self.origin + self.sourceTime - self.window   # when to pull in more events
+            if nextTime == None or pullTime < nextTime:
+               nextTime = pullTime
+         self.scheduler.scheduleAt( nextTime, self.__dispatch__, [self.generation], UNMONITORED )   # (we measure our events ourselves)
+      else:
+         self.__finished__()
+
+   def __dispatch__(self, generation):
+      """Dispatches all events that are due (called by the scheduler)."""
+
+      self.lock.acquire()
+      try:
+         if generation != self.generation:   # have we been paused or cancelled since this was scheduled?
+            return                              # yes, so ignore it
+
+         now = self.scheduler.now()
+         self.__pull__( now )    # first, get upcoming events from the source (if any)
+         while self.events != [] and self.origin + self.events[0][0] <= now and generation == self.generation:
+            time, sequence, function, parameters, release, channel = heapq.heappop( self.events )
+
+            if sequence in self.released:    # was this already done early (e.g., a note-off by pause())?
+               del self.released[sequence]      # yes, so skip it
+               continue
+
+            if __schedulingMonitor__.enabled:    # are we measuring accuracy?
+               __schedulingMonitor__.record( self.scheduler.now() - (self.origin + time), channel, self )
+
+            try:
+               function( *parameters )
+            except:    # one bad event should not stop the music
+               print "PlaybackHandle: Error calling " + str(function) + " - " + str(sys.exc_info()[1])
+
+            if release != None:                       # did this start a note (or chord)?
+               for noteOff in release:                   # yes, so remember how to stop it
+                  self.sounding[noteOff[0]] = noteOff
+            elif sequence in self.sounding:           # did this stop a note?
+               del self.sounding[sequence]               # yes, so it's not sounding anymore
+
+         if generation == self.generation:    # still playing?
+            self.__scheduleNext__()              # yes, so continue with the next event
+      finally:
+         self.lock.release()
+
+   def __releaseSounding__(self):
+      """Turns off all our notes currently sounding (caller should hold the lock)."""
+
+      for sequence, function, parameters in self.sounding.values():
+         try:
+            function( *parameters )
+         except:
+            print "PlaybackHandle: Error calling " + str(function) + " - " + str(sys.exc_info()[1])
+         self.released[sequence] = True    # skip it when its time comes
+      self.sounding = {}
+
+   def __finished__(self):
+      """Removes this playback from the active ones (caller should hold the lock)."""
+
+      if self in __activePlaybacks__:
+         __activePlaybacks__.remove( self )
+
+def __callEach__(function, parametersList):
+   """Calls 'function' once for each of 'parametersList' (used to dispatch all notes of a chord at once)."""
+
+   for parameters in parametersList:
+      function( *parameters )
+
+def __scheduleMidiOnset__(handle, notes, globalInstruments):
+   """Adds the note-on and note-off events of an onset (i.e., single note or chord) to a playback handle (see Play.midi()).
+      Parameter 'globalInstruments' holds global instruments already looked up for channels.
+   """
+
+   notes = [note for note in notes if note[2] != REST]   # skip rests
+   if notes == []:
+      return
+   start, duration, pitch, velocity, channel, instrument, panning = notes[0]   # (all notes of an onset share these)
+
+   # set appropriate instrument for this channel
+   if instrument == -1:                             # no specific instrument?
+      if channel not in globalInstruments:             # so, use global instrument
+         globalInstruments[channel] = Play.getInstrument(channel)
+      instrument = globalInstruments[channel]
+   Play.setInstrument(instrument, channel)
+
+   # schedule it to play (note-on and note-off events)
+   if len(notes) == 1:   # a single note?
+      handle.addNote( start, duration, Play.noteOn, [pitch, velocity, channel, panning], Play.noteOff, [pitch, channel], channel )
+   else:                 # no, a chord, so start all its notes together
+      handle.addChord( start, [note[1] for note in notes],
+                       Play.noteOn, [[note[2], note[3], note[4], note[6]] for note in notes],
+                       Play.noteOff, [[note[2], note[4]] for note in notes], channel )
+
+def __scheduleAudioOnset__(handle, notes, audioSamples, loopFlags, envelopes):
+   """Adds the audio note-on and note-off events of an onset (i.e., single note or chord) to a playback handle 
+      (see Play.audio()).  NOTE: channel is used as an index for the audio voice.
+   """
+
+   notes = [note for note in notes if note[2] != REST]   # skip rests
+   if notes == []:
+      return
+   start, duration, pitch, velocity, channel, instrument, panning = notes[0]   # (all notes of an onset share these)
+
+   # schedule it to play (audio note-on and note-off events)
+   if len(notes) == 1:   # a single note?
+      handle.addNote( start, duration, 
+                      Play.audioOn, [pitch, audioSamples[channel], velocity, panning, loopFlags[channel], envelopes[channel]], 
+                      Play.audioOff, [pitch, audioSamples[channel], envelopes[channel]], channel )
+   else:                 # no, a chord, so start all its notes together
+      handle.addChord( start, [note[1] for note in notes],
+                       Play.audioOn, [[note[2], audioSamples[channel], note[3], note[6], loopFlags[channel], envelopes[channel]] for note in notes],
+                       Play.audioOff, [[note[2], audioSamples[channel], envelopes[channel]] for note in notes], channel )
+
+def __streamOnsets__(onsets, scheduleOnset, parameters):
+   """Generates the events of a playback (see PlaybackHandle.stream()) by scheduling one onset at a time, 
+      i.e., calling 'scheduleOnset' with its notes and 'parameters', and returns its start time.
+   """
+
+   for start, order, notes in onsets:
+      scheduleOnset( parameters[0], notes, *parameters[1:] )
+      yield start
+
+
+##################################################################################################################
+# PlaybackPlan
+#
+# Play.midi(), Play.audio(), and Play.code() need all notes in a Score flattened into a single list, ordered
+# by start time, with times converted to milliseconds (also, panning mapped to 0-127, chords resolved, etc.).
+# This is expensive for long scores, and the game replays the same material constantly.  So, we compile
+# this once into a PlaybackPlan (with notes stored in flat, parallel arrays), and reuse it.
+#
+# Plans are cached against a fingerprint of the material's content, so identical material (e.g., the same theme
+# built twice) shares one.  To avoid fingerprinting on every replay, we also remember which plan each material got, 
+# together with its version, i.e., a quick summary of its structure (parts, phrases, sizes, tempos) and the versions 
+# of its phrases (see __touchMaterial__()).  Only if this has changed is the material fingerprinted again.
+#
+# NOTE:  Changes made directly to notes (e.g., note.setPitch()), i.e., not via Mod functions, Phrase methods, 
+#        Note.setDuration(), etc., are not detected automatically - call PlaybackPlan.clearCache() after such changes.
+#        The same goes for jMusic's own phrases (e.g., from Read.midi()), which have no version of their own, except 
+#        that any change via Mod functions is noticed.
+
+import array     # needed to store plans in flat arrays
+import hashlib   # needed to fingerprint material
+
+class PlaybackPlan():
+   """A Score compiled for playback.  All notes are ordered by start time and stored in parallel arrays
+      (times are in milliseconds).  Notes are grouped into onsets, i.e., notes which start together as one chord
+      (notes of an onset are stored next to each other).  An instrument of -1 means that the channel's global 
+      instrument should be used (see Play.setInstrument()).
+   """
+
+   def __init__(self, score):
+
+      # create the parallel arrays
+      self.starts      = array.array('i')   # start times (in milliseconds)
+      self.durations   = array.array('i')   # durations, i.e., how long notes sound (in milliseconds)
+      self.frequencies = array.array('d')   # frequencies (in Hz), or REST
+      self.velocities  = array.array('i')   # velocities (0-127)
+      self.channels    = array.array('i')   # MIDI channels (0-15), or audio sample index (see Play.audio())
+      self.instruments = array.array('i')   # instruments (0-127), or -1 for the channel's global instrument
+      self.pannings    = array.array('i')   # pannings (0-127)
+      self.onsets      = array.array('i')   # index of the first note of each onset (i.e., single note or chord)
+
+      # and fill them in (onsets come from all phrases merged in start time order - see __scoreOnsets__())
+      for start, order, notes in __scoreOnsets__(score):
+         self.onsets.append( len(self.starts) )
+         for note in notes:
+            self.__append__( note )
+
+   def __append__(self, note):
+      """Appends a (start, duration, frequency, velocity, channel, instrument, panning) note to the plan."""
+
+      start, duration, frequency, velocity, channel, instrument, panning = note
+      self.starts.append( start )
+      self.durations.append( duration )
+      self.frequencies.append( frequency )
+      self.velocities.append( velocity )
+      self.channels.append( channel )
+      self.instruments.append( instrument )
+      self.pannings.append( panning )
+
+   def size(self):
+      """Returns the number of notes in the plan (including rests)."""
+
+      return len(self.starts)
+
+   def getNote(self, index):
+      """Returns the note at 'index' as a (start, duration, frequency, velocity, channel, instrument, panning) tuple."""
+
+      return (self.starts[index], self.durations[index], self.frequencies[index], self.velocities[index], 
+              self.channels[index], self.instruments[index], self.pannings[index])
+
+   def onsetCount(self):
+      """Returns the number of onsets (i.e., single notes or chords) in the plan."""
+
+      return len(self.onsets)
+
+   def getOnset(self, index):
+      """Returns the notes of the onset at 'index' (i.e., a single note or chord), as a list of 
+         (start, duration, frequency, velocity, channel, instrument, panning) tuples.
+      """
+
+      first = self.onsets[index]        # index of first note of this onset
+      if index + 1 < len(self.onsets):  # and of first note of the next one
+         last = self.onsets[index + 1]
+      else:
+         last = len(self.starts)
+
+      return [self.getNote(i) for i in range(first, last)]
+
+   def getLength(self):
+      """Returns how long the plan takes to play (in milliseconds)."""
+
+      length = 0
+      for i in range( self.size() ):
+         if self.frequencies[i] != REST:
+            length = max(length, self.starts[i] + self.durations[i])
+      return length
+
+   # static functions to access plans (see below)
+   def forMaterial(material, score):
+      """Returns the playback plan for 'material', which has been wrapped into 'score' (see Play.midi()).
+         The plan is compiled only if needed, i.e., if no plan exists for the material's current content.
+      """
+      return __getPlaybackPlan__(material, score)
+
+   def clearCache():
+      """Forgets all compiled plans (e.g., after changing notes directly, via note.setPitch(), etc.)."""
+      __clearPlaybackPlans__()
+
+   forMaterial = Callable(forMaterial)
+   clearCache = Callable(clearCache)
+
+
+# Phrase notes are already in time order, so a score's onsets are produced by merging its phrases (instead of 
+# collecting all notes and sorting them).  This is done lazily, one onset at a time, so it also supports streaming 
+# playback of very long scores (see Play.midi(material, streaming=True)).
+
+def __scoreOnsets__(score):
+   """Returns an iterator over all onsets (i.e., single notes or chords) in the score, ordered by start time, as 
+      (start, order, notes) tuples - see __phraseOnsets__().
+   """
+
+   phraseOnsets = []                        # holds an onset iterator for every phrase
+   scoreTempoMap = __tempoMapOf__(score)    # get global tempo map (can be overidden by part and phrase tempos)
+   for part in score.getPartArray():   # traverse all parts
+      channel = part.getChannel()        # get part channel
+      instrument = -1                    # assume global instrument for this channel
+      if part.getInstrument() > -1:      # has the part instrument been set?
+         instrument = part.getInstrument()  # yes, so it takes precedence
+      partTempoMap = scoreTempoMap       # assume score tempo (and tempo changes) for this part
+      if part.getTempo() > -1:           # has the part tempo been set?
+         partTempoMap = TempoMap( part.getTempo() )   # yes, so it takes precedence (for this part only)
+      for phrase in part.getPhraseArray():   # traverse all phrases in part
+         if phrase.getInstrument() > -1:        # is this phrase's instrument set?
+            instrument = phrase.getInstrument()    # yes, so it takes precedence
+         tempoMap = partTempoMap                # assume part tempo for this phrase
+         if phrase.getTempo() > -1:             # has the phrase tempo been set?
+            tempoMap = TempoMap( phrase.getTempo() )  # yes, so it takes precedence (for this phrase only)
+
+         phraseOnsets.append( __phraseOnsets__(phrase, len(phraseOnsets), tempoMap, channel, instrument) )
+
+   # merge phrases lazily (order breaks ties between phrases, so onsets starting together keep score order)
+   return heapq.merge( *phraseOnsets )
+
+def __phraseOnsets__(phrase, phraseIndex, tempoMap, channel, instrument):
+   """Generates the onsets (i.e., single notes or chords) of a phrase, as (start, order, notes) tuples, where 'notes' 
+      is a list of (start, duration, frequency, velocity, channel, instrument, panning) tuples (times in milliseconds,
+      converted from jMusic Score units with 'tempoMap').
+   """
+
+   # chords are denoted by a sequence of notes with 0 duration (i.e., the next note starts at the same time), 
+   # followed by the last note of the chord (see Phrase.addChord()), so we can collect them right here, as they 
+   # appear in the phrase (no need to sort first)
+   beat = phrase.getStartTime()                 # in jMusic Score units (quarter notes)
+   chordNotes = []                              # holds notes of the chord being collected
+   onsetIndex = 0                               # index of onset within phrase
+   for note in __phraseNotes__(phrase):         # (a Repeat's notes are played as many times as needed)
+      frequency = note.getFrequency()
+      panning = note.getPan()
+      panning = mapValue(panning, 0.0, 1.0, 0, 127)    # map from range 0.0..1.0 (Note panning) to range 0..127 (as expected by Java synthesizer)
+      startTime = tempoMap.toMilliseconds( beat )      # get this note's start time (in milliseconds)
+      start = int(startTime)                           # and remember it
+
+      # NOTE:  Below we use note length as opposed to duration (getLength() vs. getDuration())
+      # since note length gives us a more natural sounding note (with proper decay), whereas 
+      # note duration captures the more formal (printed score) duration (which sounds unnatural).
+      duration = int(tempoMap.toMilliseconds( beat + note.getLength() ) - startTime)   # get note length (as oppposed to duration!) in milliseconds
+      beat = beat + note.getDuration()                      # update start time (in quarter notes)
+      velocity = note.getDynamic()
+
+      chordNotes.append( (start, duration, frequency, velocity, channel, instrument, panning) )
+      if note.getDuration() == 0 and frequency != REST:    # is the chord still going (i.e., next note starts together)?
+         continue                                             # yes, so keep collecting
+
+      # this note ends the chord (or it is a single note, i.e., a chord of one), so 
+      # any chord notes with no length of their own get the length of this note
+      for k in range( len(chordNotes) - 1 ):
+         if chordNotes[k][1] == 0:
+            chordNotes[k] = (chordNotes[k][0], duration) + chordNotes[k][2:]
+      yield (chordNotes[0][0], (phraseIndex, onsetIndex), chordNotes)
+      chordNotes = []
+      onsetIndex = onsetIndex + 1
+
+   # chord notes left at the end of the phrase (nothing ended the chord) play only if they have a length of their own 
+   chordNotes = [chordNote for chordNote in chordNotes if chordNote[1] > 0]
+   if chordNotes != []:
+      yield (chordNotes[0][0], (phraseIndex, onsetIndex), chordNotes)
+
+
+MAX_PLAYBACK_PLANS = 64        # max number of plans to cache (when exceeded, cache starts over)
+
+__playbackPlans__ = {}         # holds compiled plans, indexed by material fingerprint
+__materialPlans__ = {}         # holds (material, version, fingerprint) for each material, indexed by id(material)
+
+def __fingerprint__(score):
+   """Returns a fingerprint (a hex digest) of the score's musical content."""
+
+   digest = hashlib.sha1()
+   digest.update( repr(score.getTempo()) )
+   digest.update( repr(__tempoMapOf__(score).getChanges()) )
+   for part in score.getPartArray():
+      digest.update( repr((part.getChannel(), part.getInstrument(), part.getTempo())) )
+      for phrase in part.getPhraseArray():
+         digest.update( repr((phrase.getStartTime(), phrase.getInstrument(), phrase.getTempo(), __repeatsOf__(phrase))) )
+         for note in phrase.getNoteArray():
+            digest.update( repr((note.getFrequency(), note.getDuration(), note.getLength(), note.getDynamic(), note.getPan())) )
+
+   return digest.hexdigest()
+
+def __versionOf__(score):
+   """Returns the version of the score's material, i.e., a quick summary of its structure, together with the versions
+      of its phrases (see __touchMaterial__()).
+   """
+
+   version = [score.getTempo(), tuple(__tempoMapOf__(score).getChanges())]
+   for part in score.getPartArray():
+      version.append( (part.getChannel(), part.getInstrument(), part.getTempo()) )
+      for phrase in part.getPhraseArray():
+         if isinstance(phrase, Phrase):                  # one of ours?
+            notesVersion = phrase.__dict__.get("notesVersion", 0)   # yes, so it has a version of its own
+         else:
+            notesVersion = __materialVersion__              # no, so any change to material may have changed it
+         version.append( (id(phrase), notesVersion, phrase.getStartTime(), phrase.getInstrument(), phrase.getTempo(), 
+                          phrase.size(), __repeatsOf__(phrase)) )
+
+   return tuple(version)
+
+def __repeatsOf__(phrase):
+   """Returns how many times a phrase is played (see Repeat)."""
+
+   if isinstance(phrase, Repeat):
+      return phrase.getTimes()
+   return 1
+
+def __getPlaybackPlan__(material, score):
+   """Returns the playback plan for 'material' (wrapped into 'score'), compiling it only if needed."""
+
+   # first, check if the material is unchanged since we last saw it (this is cheap)
+   version = __versionOf__(score)
+   if id(material) in __materialPlans__:
+      lastMaterial, lastVersion, fingerprint = __materialPlans__[id(material)]
+      if lastMaterial is material and lastVersion == version and fingerprint in __playbackPlans__:
+         return __playbackPlans__[fingerprint]     # unchanged, so reuse its plan
+
+   # material is new or changed, so fingerprint its content, and see if we have a plan for it
+   fingerprint = __fingerprint__(score)
+   if fingerprint not in __playbackPlans__:    # no plan for this content?
+
+      # keep cache bounded
+      if len(__playbackPlans__) >= MAX_PLAYBACK_PLANS:
+         __clearPlaybackPlans__()
+
+      __playbackPlans__[fingerprint] = PlaybackPlan(score)   # compile it
+
+   # remember this material's plan (for next time - the material itself is kept, so its id() is not reused)
+   if len(__materialPlans__) >= MAX_PLAYBACK_PLANS:
+      __materialPlans__.clear()
+   __materialPlans__[id(material)] = (material, version, fingerprint)
+
+   return __playbackPlans__[fingerprint]
+
+def __clearPlaybackPlans__():
+   """Forgets all compiled playback plans."""
+
+   __playbackPlans__.clear()
+   __materialPlans__.clear()
+
+
+##################################################################################################################
+# Soundtrack banks
+#
+# A game loads many cues at startup (e.g., menu, combat, victory), each from its own MIDI file, which then has to be 
+# parsed and compiled into a PlaybackPlan.  A SoundtrackBank packs the compiled plans of all cues into a single file, 
+# with an index at the front (name, tempo, length, and channels of each cue, and where its data is).  The bank is 
+# mapped into memory (and, optionally, read in one go), and a cue's columns are views into the mapped file, so
+# getting a cue involves no parsing and no copying.  Cues can be played directly, e.g., Play.midi(bank.getCue("menu")).
+#
+# File layout (big-endian, as Java's ByteBuffer):
+#
+#   magic "JMBANK01", cue count (int)
+#   for each cue:  name length (short), name (UTF-8), tempo (double), length in milliseconds (double), 
+#                  channels used (int, a bit per channel), note count (int), onset count (int), data offset (long)
+#   for each cue (at its data offset, aligned to 8 bytes):  frequencies (doubles), then starts, durations, 
+#                  velocities, channels, instruments, pannings (ints, one per note), and onsets (ints, one per onset)
+
+import struct     # needed to write soundtrack banks
+
+SOUNDTRACK_BANK_MAGIC = "JMBANK01"
 
-from jm.music.data import Phrase as jPhrase  # needed to wrap more functionality below
+class __BufferColumn__():
+   """A read-only column of a PlaybackPlan, backed by a Java IntBuffer or DoubleBuffer (e.g., in a mapped file)."""
 
-# update Phrase's addNoteList to handle chords, i.e., lists of pitches, 
-# in addition to single pitches (the default functionality).
-class Phrase(jPhrase):
+   def __init__(self, buffer):
+      self.buffer = buffer
 
-   def __str__(self):    
-      # we disrupted access to jMusic's (Java's) Phrase.toString() method,
-      # so, let's fix it
-      return self.toString()
+   def __len__(self):
+      return self.buffer.limit()
 
-   def __repr__(self):    
-      # we disrupted access to jMusic's (Java's) Phrase.toString() method,
-      # so, let's fix it
-      return self.toString()
+   def __getitem__(self, index):
+      if index < 0:
+         index = index + self.buffer.limit()
+      if index < 0 or index >= self.buffer.limit():
+         raise IndexError, "column index out of range"
+      return self.buffer.get(index)
 
-   def addChord(self, pitches, duration, dynamic=85, panoramic=0.5, length=None):    
-      # set chord length (if needed)
-      if length == None:   # not provided?
-         length = duration * jNote.DEFAULT_LENGTH_MULTIPLIER  # normally, duration * 0.9
 
-      # add all notes, minus the last one, as having no duration, yet normal length 
-      # (exploiting how Play.midi() and Write.midi() work)
-      for i in range( len(pitches)-1 ):
-         n = Note(pitches[i], 0.0, dynamic, panoramic, length)
-         self.addNote(n)
+class BankCue(PlaybackPlan):
+   """A cue in a SoundtrackBank, i.e., a PlaybackPlan whose columns are stored in the bank's (mapped) file."""
 
-      # now, add the last note with the proper duration (and length)
-      n = Note(pitches[-1], duration, dynamic, panoramic, length)
-      self.addNote(n)
+   def __init__(self, name, tempo, length, channels, buffer, offset, noteCount, onsetCount):
 
-   def addNoteList(self, pitches, durations, dynamics=[], panoramics=[], lengths=[]):   
-      """Add notes to the phrase using provided lists of pitches, durations, etc. """ 
+      self.name = name
+      self.tempo = tempo
+      self.length = length              # in milliseconds
+      self.channelsUsed = channels      # list of channels
+
+      # create views of the columns (no data is read until accessed)
+      def view(start, count, width):
+         data = buffer.duplicate()
+         data.position(start)
+         data = data.slice()
+         data.limit(count * width)
+         return data
+
+      position = offset
+      self.frequencies = __BufferColumn__( view(position, noteCount, 8).asDoubleBuffer() )
+      position = position + noteCount * 8
+      columns = []
+      for i in range(6):
+         columns.append( __BufferColumn__( view(position, noteCount, 4).asIntBuffer() ) )
+         position = position + noteCount * 4
+      self.starts, self.durations, self.velocities, self.channels, self.instruments, self.pannings = columns
+      self.onsets = __BufferColumn__( view(position, onsetCount, 4).asIntBuffer() )
+
+   def getName(self):
+      return self.name
 
-      # check if provided lists have equal lengths
-      if len(pitches) != len(durations) or \
-         (len(dynamics) != 0) and (len(pitches) != len(dynamics)) or \
-         (len(panoramics) != 0) and (len(pitches) != len(panoramics)) or \
-         (len(lengths) != 0) and (len(pitches) != len(lengths)):
-         raise ValueError("The provided lists should have the same length.")
+   def getTempo(self):
+      return self.tempo
 
-      # if dynamics was not provided, construct it with max value
-      if dynamics == []:
-         dynamics = [85] * len(pitches)
-      
-      # if panoramics was not provided, construct it at CENTER
-      if panoramics == []:
-         panoramics = [0.5] * len(pitches)
-               
-      # if note lengths was not provided, construct it at 90% of note duration
-      if lengths == []:
-         lengths = [duration * jNote.DEFAULT_LENGTH_MULTIPLIER for duration in durations]
-               
-      # traverse the pitch list and handle every item appropriately
-      for i in range( len(pitches) ):        
-         if type(pitches[i]) == list:              # is it a chord?
-            self.addChord(pitches[i], durations[i], dynamics[i], panoramics[i], lengths[i])  # yes, so add it
-         else:                                     # else, it's a note
-            n = Note(pitches[i], durations[i], dynamics[i], panoramics[i], lengths[i])       # create note
-            self.addNote(n)                                                                  # and add it
+   def getLength(self):
+      """Returns how long the cue takes to play (in milliseconds)."""
+      return self.length
 
-# Do NOT make these functions callable - Phrase class is meant to be instantiated,
-# i.e., we will always call these from a Phrase object - not the class, e.g., as in Mod.
+   def getChannels(self):
+      """Returns the list of channels used by the cue."""
+      return self.channelsUsed
 
-######################################################################################
-#### jMusic Play extensions ##########################################################
-######################################################################################
 
-from jm.util import Play as jPlay  # needed to wrap more functionality below
+class SoundtrackBank():
+   """A file holding compiled cues (see above), mapped into memory.  If 'preload' is True, the whole file is
+      read in at once (one sequential read), so that accessing cues later never waits for the disk.
+   """
 
-# Create Play.noteOn(pitch, velocity, channel) to start a MIDI note sounding,  
-#        Play.noteOff(pitch, channel) to stop the corresponding note from sounding, and
-#        Play.setInstrument(instrument, channel) to change instrument for this channel.
-#
-# This adds to existing Play functionality.
-# This class is not meant to be instantiated, hence no "self" in function definitions.
-# Functions are made callable through class Callable, above.
+   def __init__(self, filename, preload=True):
 
-from javax.sound.midi import *
+      filename = fixWorkingDirForJEM( filename )   # JEM working directory fix (does nothing if not in JEM)
+      self.filename = filename
 
-# NOTE: Opening the Java synthesizer below generates some low-level noise in the audio output.
-# But we need it to be open, in case the end-user wishes to use functions like Play.noteOn(), below. 
-# ( *** Is there a way to open it just-in-time, and/or close it when not used? I cannot think of one.)
- 
-Java_synthesizer = MidiSystem.getSynthesizer()  # get a Java synthesizer
-Java_synthesizer.open()                         # and activate it (should we worry about close()???)
+      # map file into memory
+      randomAccessFile = RandomAccessFile(filename, "r")
+      try:
+         channel = randomAccessFile.getChannel()
+         self.buffer = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size())   # (stays valid after closing)
+      finally:
+         randomAccessFile.close()
+      if preload:
+         self.buffer.load()
+
+      # read index
+      magic = "".join([chr(self.buffer.get(i)) for i in range( len(SOUNDTRACK_BANK_MAGIC) )])
+      if magic != SOUNDTRACK_BANK_MAGIC:
+         raise ValueError, "SoundtrackBank: Not a soundtrack bank (" + filename + ")."
+      index = self.buffer.duplicate()
+      index.position( len(SOUNDTRACK_BANK_MAGIC) )
+      self.names = []      # cue names, in bank order
+      self.cues = {}       # holds cues, indexed by name
+      for i in range( index.getInt() ):
+         nameBytes = jarray.zeros(index.getShort(), 'b')
+         index.get(nameBytes)
+         name = "".join([chr(b & 0xFF) for b in nameBytes]).decode("utf-8")   # Java bytes are signed
+         tempo = index.getDouble()
+         length = index.getDouble()
+         channelBits = index.getInt()
+         channels = [channel for channel in range(16) if channelBits & (1 << channel)]
+         noteCount = index.getInt()
+         onsetCount = index.getInt()
+         offset = int( index.getLong() )
+         self.names.append( name )
+         self.cues[name] = BankCue(name, tempo, length, channels, self.buffer, offset, noteCount, onsetCount)
+
+   def getNames(self):
+      """Returns the names of all cues in the bank."""
+      return list(self.names)
+
+   def getCue(self, name):
+      """Returns the cue with this name (a PlaybackPlan, which can be given to Play.midi())."""
+
+      if name not in self.cues:
+         raise KeyError, "SoundtrackBank: No cue named '" + str(name) + "' in " + self.filename + "."
+      return self.cues[name]
+
+   def __contains__(self, name):
+      return name in self.cues
+
+   def __len__(self):
+      return len(self.names)
+
+   def write(filename, cues):
+      """Writes a soundtrack bank with these cues, a list of (name, material) pairs, where material is a Score, 
+         Part, Phrase, or Note, or the name of a MIDI file.
+      """
 
-# make all instruments available
-Java_synthesizer.loadAllInstruments(Java_synthesizer.getDefaultSoundbank())   
- 
+      filename = fixWorkingDirForJEM( filename )   # JEM working directory fix (does nothing if not in JEM)
+
+      # compile all cues
+      entries = []    # holds (name, tempo, plan) for each cue
+      for name, material in cues:
+         if type(material) == str:      # a MIDI filename?
+            score = Score()
+            Read.midi(score, material)
+            material = score
+         if type(material) == PackedPhrase:
+            material = material.toPhrase()
+         if type(material) == Note:
+            material = Phrase(material)
+         if isinstance(material, jPhrase):   # no elif - we need to successively wrap from Note to Score (also, Repeats)
+            material = Part(material)
+            material.setInstrument(-1)     # indicate no default instrument (needed to access global instrument)
+         if type(material) == Part:     # no elif - we need to successively wrap from Note to Score
+            material = Score(material)
+         if not isinstance(material, jScore):
+            raise TypeError, "SoundtrackBank.write(): Unrecognized type " + str(type(material)) + " for cue '" + str(name) + "', expected Note, Phrase, Part, Score, or MIDI filename."
+         entries.append( (name, material.getTempo(), PlaybackPlan(material)) )
+
+      # lay out index
+      encodedNames = [unicode(name).encode("utf-8") for name, tempo, plan in entries]
+      indexSize = len(SOUNDTRACK_BANK_MAGIC) + 4 + sum([2 + len(name) + 8 + 8 + 4 + 4 + 4 + 8 for name in encodedNames])
+      offset = (indexSize + 7) // 8 * 8   # cue data is aligned to 8 bytes
+      index = [SOUNDTRACK_BANK_MAGIC, struct.pack(">i", len(entries))]
+      data = []
+      for (name, tempo, plan), encodedName in zip(entries, encodedNames):
+         channelBits = 0
+         for channel in set(plan.channels):
+            channelBits = channelBits | (1 << (channel & 0x0F))
+         index.append( struct.pack(">h", len(encodedName)) + encodedName )
+         index.append( struct.pack(">ddiiiq", tempo, plan.getLength(), channelBits, plan.size(), plan.onsetCount(), offset) )
+
+         n = plan.size()
+         cueData = struct.pack(">%dd" % n, *plan.frequencies)
+         for column in [plan.starts, plan.durations, plan.velocities, plan.channels, plan.instruments, plan.pannings]:
+            cueData = cueData + struct.pack(">%di" % n, *column)
+         cueData = cueData + struct.pack(">%di" % plan.onsetCount(), *plan.onsets)
+         cueData = cueData + "\0" * (-len(cueData) % 8)    # pad to keep next cue aligned
+         data.append( cueData )
+         offset = offset + len(cueData)
+
+      index = "".join(index)
+      bankFile = open(filename, "wb")
+      try:
+         bankFile.write( index + "\0" * (-len(index) % 8) )
+         bankFile.write( "".join(data) )
+      finally:
+         bankFile.close()
+
+      print "Soundtrack bank '" + filename + "' written with " + str(len(entries)) + " cues."
 
-# The MIDI specification stipulates that pitch bend be a 14-bit value, where zero is 
-# maximum downward bend, 16383 is maximum upward bend, and 8192 is the center (no pitch bend).
-PITCHBEND_MIN = 0 
-PITCHBEND_MAX = 16383 
-PITCHBEND_NORMAL = 8192
+   # make this function callable without having to instantiate this class
+   write = Callable(write)
 
-# calculate constants from the way we handle pitch bend
-OUR_PITCHBEND_MAX    = PITCHBEND_MAX - PITCHBEND_NORMAL
-OUR_PITCHBEND_MIN    = -PITCHBEND_NORMAL 
-OUR_PITCHBEND_NORMAL = 0 
 
-# initialize pitchbend across channels to 0
-CURRENT_PITCHBEND = {}    # holds pitchbend to be used when playing a note / frequency (see below)
-for i in range(16):
-   CURRENT_PITCHBEND[i] = 0   # set this channel's pitchbend to zero
+##################################################################################################################
+# Sequencer playback
+#
+# Play.midi(material, engine="sequencer") compiles the material into a javax.sound.midi.Sequence, and
+# hands it to a Java Sequencer wired to Java_synthesizer.  Java's sequencer then does all the timing,
+# so no Python code runs on the hot path (i.e., no interpreter pauses or thread contention affect note
+# timing).  This is best for long cues, which are played as-is (e.g., game background music).
+#
+# The sequence is built with a resolution of 500 ticks per quarter note at 120 BPM, i.e., one tick is one
+# millisecond, so the note start times and durations (in milliseconds) are used directly as ticks.
+#
+# Microtones (frequencies) are rendered using pitch bend, as in Play.noteOnPitchBend() - again, only one
+# pitch bend per channel is available, so concurrent microtones should be spread across channels.
+
+import jarray   # needed to pass byte arrays to Java
+
+SEQUENCER_RESOLUTION = 500     # ticks per quarter note (at 120 BPM, one tick is one millisecond)
+SEQUENCER_TEMPO = 500000       # microseconds per quarter note (i.e., 120 BPM)
+
+__sequencers__ = []            # holds Sequencers allocated so far (reused when available)
+__pausedSequencers__ = []      # holds Sequencers paused via a SequencerHandle (not available for reuse)
+
+def __getSequencer__():
+   """Returns an available Sequencer (connected to Java_synthesizer), creating one if all are busy."""
+
+   # find an available (idle) Sequencer
+   for sequencer in __sequencers__:
+      if not sequencer.isRunning() and sequencer not in __pausedSequencers__:
+         return sequencer
+
+   # none available, so create a new one and wire it to our synthesizer (instead of the default one)
+   sequencer = MidiSystem.getSequencer(False)   # False means not connected to the default synthesizer
+   sequencer.open()
+   sequencer.getTransmitter().setReceiver( Java_synthesizer.getReceiver() )
+   __sequencers__.append( sequencer )
+
+   return sequencer
+
+def __stopSequencers__():
+   """Stops all Sequencers from playing."""
+
+   for sequencer in __sequencers__:
+      if sequencer.isRunning():    # if playing, stop it
+         sequencer.stop()
+   del __pausedSequencers__[:]     # also, paused ones are done
+
+def __shortMessageEvent__(command, channel, data1, data2, tick):
+   """Returns a MidiEvent holding a MIDI short message for the given tick."""
+
+   message = ShortMessage()
+   message.setMessage(command, channel, data1, data2)
+   return MidiEvent(message, tick)
+
+def __planToSequence__(plan):
+   """Compiles a PlaybackPlan into a javax.sound.midi Sequence."""
+
+   sequence = Sequence(Sequence.PPQ, SEQUENCER_RESOLUTION)
+   track = sequence.createTrack()
+
+   # set tempo explicitly, so that one tick is one millisecond
+   tempoBytes = [(SEQUENCER_TEMPO >> 16) & 0xFF, (SEQUENCER_TEMPO >> 8) & 0xFF, SEQUENCER_TEMPO & 0xFF]
+   tempoBytes = [b - 256 * (b > 127) for b in tempoBytes]    # Java bytes are signed
+   tempoMessage = MetaMessage()
+   tempoMessage.setMessage(0x51, jarray.array(tempoBytes, 'b'), 3)
+   track.add( MidiEvent(tempoMessage, 0) )
+
+   # create note-on and note-off events (with the channel state changes needed before each note-on)
+   events = []           # holds (tick, order, command, channel, data1, data2) - note-offs come before note-ons at the same tick
+   instruments = {}      # holds current instrument per channel (to avoid redundant program changes)
+   pannings = {}         # holds current panning per channel (to avoid redundant controller messages)
+   bends = {}            # holds current MIDI pitch bend per channel
+   for i in range( plan.size() ):
+      start, duration, frequency, velocity, channel, instrument, panning = plan.getNote(i)
+      if frequency == REST:     # skip rests
+         continue
+
+      if instrument == -1:                         # no specific instrument?
+         instrument = Play.getInstrument(channel)     # so, use the global one
+      pitch, bend = freqToNote( frequency )                                # convert to MIDI note and pitch bend
+      bend = bend + PITCHBEND_NORMAL + CURRENT_PITCHBEND[channel]          # and add global pitch bend (as in Play.noteOnPitchBend())
+      bend = min(max(bend, PITCHBEND_MIN), PITCHBEND_MAX)                  # keep it within range
+
+      if instruments.get(channel) != instrument:
+         events.append( (start, 1, ShortMessage.PROGRAM_CHANGE, channel, instrument, 0) )
+         instruments[channel] = instrument
+      if panning != -1 and pannings.get(channel) != panning:
+         events.append( (start, 1, ShortMessage.CONTROL_CHANGE, channel, 10, panning) )
+         pannings[channel] = panning
+      if bends.get(channel) != bend:
+         events.append( (start, 1, ShortMessage.PITCH_BEND, channel, bend & 0x7F, (bend >> 7) & 0x7F) )
+         bends[channel] = bend
+
+      events.append( (start, 2, ShortMessage.NOTE_ON, channel, pitch, velocity) )
+      events.append( (start + duration, 0, ShortMessage.NOTE_OFF, channel, pitch, 0) )
+   events.sort()
+
+   # finally, add events to track - for overlapping instances of the same pitch on a channel, only the last 
+   # note-off is sent (as in Play.frequencyOff())
+   notesSounding = {}    # holds how many instances of a (pitch, channel) are currently sounding
+   for tick, order, command, channel, data1, data2 in events:
+      if command == ShortMessage.NOTE_ON:
+         noteID = (data1, channel)
+         notesSounding[noteID] = notesSounding.get(noteID, 0) + 1
+      elif command == ShortMessage.NOTE_OFF:
+         noteID = (data1, channel)
+         notesSounding[noteID] = notesSounding[noteID] - 1
+         if notesSounding[noteID] > 0:    # other instances still sounding?
+            continue                         # yes, so skip this note-off
+      track.add( __shortMessageEvent__(command, channel, data1, data2, tick) )
+
+   return sequence
+
+def __playPlan__(plan):
+   """Plays a PlaybackPlan using our own scheduler (see Play.midi())."""
+
+   # Schedule playing all onsets (notes or chords) in the plan
+   handle = PlaybackHandle()   # holds note-on and note-off events for this playback
+   globalInstruments = {}   # holds global instruments for channels (see Play.setInstrument())
+   for i in range( plan.onsetCount() ):
+      __scheduleMidiOnset__( handle, plan.getOnset(i), globalInstruments )
+
+   # start playing (all events share the same time origin)
+   handle.start()
+
+   # now, all notes have been scheduled for future playing - they can be controlled through the handle,
+   # and can always be stopped using JEM's stop button - this will cancel all playbacks (see Play.stop())
+   return handle
+
+def __playWithSequencer__(plan):
+   """Plays a PlaybackPlan using an available Sequencer."""
+
+   sequencer = __getSequencer__()
+   sequencer.setSequence( __planToSequence__(plan) )
+   __channelState__.addSequencer( sequencer, set(plan.channels) )   # it will change these channels directly
+   sequencer.setTickPosition(0)
+   sequencer.start()
+
+   return SequencerHandle(sequencer)
+
+class SequencerHandle():
+   """Controls a playback by a Sequencer (see Play.midi()), similarly to PlaybackHandle."""
+
+   def __init__(self, sequencer):
+      self.sequencer = sequencer
+      self.sequence = sequencer.getSequence()   # the sequence we are playing (the sequencer may be reused later)
+      self.paused = False
+      self.cancelled = False
+
+   def __owns__(self):
+      """Returns True if the sequencer is still playing our sequence."""
+      return not self.cancelled and self.sequencer.getSequence() == self.sequence
+
+   def cancel(self):
+      """Stops playback for good."""
+      if self.__owns__():
+         self.sequencer.stop()
+         if self.sequencer in __pausedSequencers__:
+            __pausedSequencers__.remove( self.sequencer )
+      self.cancelled = True
 
-  
-#########
-# NOTE:  The following code addresses Play.midi() functionality.  In order to be able to stop music
-# that is currently playing, we wrap the jMusic Play class inside a Python Play class and rebuild 
-# play music functionality from basic elements.
+   def pause(self):
+      """Pauses playback (sounding notes are turned off by the sequencer)."""
+      if self.__owns__() and not self.paused:
+         self.paused = True
+         __pausedSequencers__.append( self.sequencer )   # keep it for us
+         self.sequencer.stop()
 
-from jm.midi import MidiSynth  # needed to play and loop MIDI
-from time import sleep         # needed to implement efficient busy-wait loops (see below)
-from timer import *            # needed to schedule future tasks
+   def resume(self):
+      """Resumes a paused playback from where it was paused."""
+      if self.__owns__() and self.paused and self.sequencer in __pausedSequencers__:
+         self.paused = False
+         __pausedSequencers__.remove( self.sequencer )
+         self.sequencer.start()
 
-# allocate enough MidiSynths and reuse them (when available)
-__midiSynths__ = []            # holds all available jMusic MidiSynths 
-MAX_MIDI_SYNTHS = 12           # max number of concurrent MidiSynths allowed 
-                               # NOTE: This is an empirical value - not documented - may change.                               
-                               
-def __getMidiSynth__():
-   """Returns the next available MidiSynth (if any), or None."""
-         
-   # make sure all possible MidiSynths are allocated 
-   if __midiSynths__ == []:
-      for i in range(MAX_MIDI_SYNTHS):
-         __midiSynths__.append( MidiSynth() )   # create a new MIDI synthesizer
-   # now, all MidiSynths are allocated
-      
-   # find an available MidiSynth to play the material (it's possible that all are allocated,
-   # since this function may be called repeatedly, while other music is still sounding
-   i = 0
-   while i < MAX_MIDI_SYNTHS and __midiSynths__[i].isPlaying():
-      i = i + 1     # check if the next MidiSynth is available
-   # now, i either points to the next available MidiSynth, or MAX_MIDI_SYNTHS if none is available
-      
-   # did we find an available MidiSynth?
-   if i < MAX_MIDI_SYNTHS:
-      midiSynth = __midiSynths__[i]
-   else:
-      midiSynth = None
+   def isPlaying(self):
+      """Returns True if playback is still going on."""
+      return self.__owns__() and self.sequencer.isRunning()
 
-   return midiSynth    # let them have it (hopefully, they will use it right away)
+   def isPaused(self):
+      """Returns True if playback is paused."""
+      return self.paused and self.__owns__()
 
-# Provide a way to stop all MidiSynths from playing.
-def __stopMidiSynths__():
-   """Stops all MidiSynths from playing."""
-   for midiSynth in __midiSynths__:
-      if midiSynth.isPlaying():    # if playing, stop it
-         midiSynth.stop()
-   
+   def isDone(self):
+      """Returns True if playback has finished (or has been cancelled)."""
+      return not self.isPlaying() and not self.isPaused()
 
 
 ##################################################################################################################
 
 # Holds notes currently sounding, in order to prevent premature NOTE-OFF for overlapping notes on the same channel 
-# For every frequencyOn() we add the tuple (pitch, channel), and for every frequencyOff() we rmove the tuple.  
+# For every frequencyOn() we count one more instance of (pitch, channel), and for every frequencyOff() one less.  
 # If it is the last one, we execute a NOTE-OFF (otherwise, we don't). 
-notesCurrentlyPlaying = [] 
+#
+# Previously, this was a list of (pitch, channel) tuples, so every note-off had to search it (twice), which
+# slowed down dense scores considerably.  Now, instances are counted in a dictionary, so note-on and note-off
+# take constant time, regardless of how many notes are sounding.  Also, note-on and note-off come from different 
+# threads (e.g., EventScheduler, Play.code() functions, GUI callbacks), so updates are guarded by a lock.
+class ActiveNotes():
+   """Counts how many instances of each (pitch, channel) are currently sounding."""
+
+   def __init__(self):
+      self.counts = {}                 # holds number of instances sounding, indexed by (pitch, channel)
+      self.lock = threading.Lock()     # guards counts
+
+   def noteOn(self, pitch, channel):
+      """Records one more instance of this pitch sounding on this channel."""
+
+      noteID = (pitch, channel)              # create an ID using pitch-channel pair
+      self.lock.acquire()
+      try:
+         self.counts[noteID] = self.counts.get(noteID, 0) + 1
+      finally:
+         self.lock.release()
+
+   def noteOff(self, pitch, channel):
+      """Records one less instance of this pitch sounding on this channel.  Returns True if no instances are left
+         (i.e., the note should be turned off).  This includes notes not sounding at all (so, turning them off is harmless).
+      """
+
+      noteID = (pitch, channel)              # create an ID using pitch-channel pair
+      self.lock.acquire()
+      try:
+         count = self.counts.get(noteID, 0) - 1
+         if count > 0:                       # other instances still sounding?
+            self.counts[noteID] = count         # yes, so just count this one out
+            return False
+         elif noteID in self.counts:         # no, so forget this note
+            del self.counts[noteID]
+         return True
+      finally:
+         self.lock.release()
+
+   def isPlaying(self, pitch, channel):
+      """Returns True if at least one instance of this pitch is sounding on this channel."""
+
+      return (pitch, channel) in self.counts
+
+   def count(self, pitch, channel):
+      """Returns how many instances of this pitch are sounding on this channel."""
+
+      return self.counts.get((pitch, channel), 0)
+
+   def clear(self, channel=None):
+      """Forgets all notes sounding (on a specific channel, or all channels if none given)."""
+
+      self.lock.acquire()
+      try:
+         if channel == None:
+            self.counts.clear()
+         else:
+            for noteID in self.counts.keys():
+               if noteID[1] == channel:
+                  del self.counts[noteID]
+      finally:
+         self.lock.release()
+
+   def __len__(self):
+      """Returns how many instances are sounding (on all channels)."""
+
+      return sum( self.counts.values() )
+
+notesCurrentlyPlaying = ActiveNotes()
 
 class Play(jPlay):
 
    # redefine Play.midi to fix jMusic bug (see above) - now, we can play as many times as we wish.
-   def midi(material):
-      """Play jMusic material (Score, Part, Phrase, Note) using our own Play.note() function."""
+   def midi(material, engine="timer", streaming=False):
+      """Play jMusic material (Score, Part, Phrase, Note) using our own Play.note() function.
+         If 'engine' is "sequencer", the material is compiled into a MIDI sequence and played by Java's
+         sequencer (no Python code runs while playing - best for long cues).  Default is "timer".
+         If 'streaming' is True, notes are read from the material as playback goes along (instead of all in advance), 
+         so playback starts right away and memory stays low, regardless of length (best for very long scores).
+         Returns a handle to cancel(), pause(), or resume() this playback (see PlaybackHandle).
+      """
+
+      # in headless mode, there is nothing to play (see HEADLESS)
+      if HEADLESS:
+         return PlaybackHandle()   # (a handle with no events, i.e., already done)
       
+      # check engine
+      if engine != "timer" and engine != "sequencer":
+         print "Play.midi(): Unrecognized engine " + str(engine) + ", expected \"timer\" or \"sequencer\"."
+         return
+
+      # a compiled plan (e.g., a cue from a SoundtrackBank) is played as is
+      if isinstance(material, PlaybackPlan):
+         if engine == "sequencer":
+            return __playWithSequencer__( material )
+         return __playPlan__( material )
+
+      original = material   # remember material provided (used to look up its playback plan)
+
       # do necessary datatype wrapping (MidiSynth() expects a Score)
+      if type(material) == PackedPhrase:
+         material = material.toPhrase()
       if type(material) == Note:
          material = Phrase(material)
       if type(material) == jNote:    # (also wrap jMusic default Notes, in addition to our own)
          material = Phrase(material)
-      if type(material) == Phrase:   # no elif - we need to successively wrap from Note to Score
-         material = Part(material)
-         material.setInstrument(-1)     # indicate no default instrument (needed to access global instrument)
-      if type(material) == jPhrase:  # (also wrap jMusic default Phrases, in addition to our own)
+      if isinstance(material, jPhrase):   # no elif - we need to successively wrap from Note to Score (also, Repeats and jMusic default Phrases)
          material = Part(material)
          material.setInstrument(-1)     # indicate no default instrument (needed to access global instrument)
       if type(material) == Part:     # no elif - we need to successively wrap from Note to Score
          material = Score(material)
-      if type(material) == Score:
+      if isinstance(material, jScore):
 
          # we are good - let's play it then!
 
-         score = material   # by now, material is a score, so create an alias (for readability)
-
-
-         # loop through all parts and phrases to get all notes
-         noteList = []               # holds all notes
-         tempo = score.getTempo()    # get global tempo (can be overidden by part and phrase tempos)
-         for part in score.getPartArray():   # traverse all parts
-            channel = part.getChannel()        # get part channel
-            instrument = Play.getInstrument(channel)  # get global instrument for this channel
-            if part.getInstrument() > -1:      # has the part instrument been set?
-               instrument = part.getInstrument()  # yes, so it takes precedence
-            if part.getTempo() > -1:           # has the part tempo been set?
-               tempo = part.getTempo()            # yes, so update tempo
-            for phrase in part.getPhraseArray():   # traverse all phrases in part
-               if phrase.getInstrument() > -1:        # is this phrase's instrument set?
-                  instrument = phrase.getInstrument()    # yes, so it takes precedence
-               if phrase.getTempo() > -1:          # has the phrase tempo been set?
-                  tempo = phrase.getTempo()           # yes, so update tempo
-     
-               # time factor to convert time from jMusic Score units to milliseconds
-               # (this needs to happen here every time, as we may be using the tempo from score, part, or phrase)
-               FACTOR = 1000 * 60.0 / tempo   
-
-               # process notes in this phrase
-               startTime = phrase.getStartTime() * FACTOR   # in milliseconds
-               for note in phrase.getNoteArray():
-                  frequency = note.getFrequency()
-                  panning = note.getPan()
-                  panning = mapValue(panning, 0.0, 1.0, 0, 127)    # map from range 0.0..1.0 (Note panning) to range 0..127 (as expected by Java synthesizer)
-                  start = int(startTime)                           # remember this note's start time (in milliseconds)
-
-                  # NOTE:  Below we use note length as opposed to duration (getLength() vs. getDuration())
-                  # since note length gives us a more natural sounding note (with proper decay), whereas 
-                  # note duration captures the more formal (printed score) duration (which sounds unnatural).
-                  duration = int(note.getLength() * FACTOR)             # get note length (as oppposed to duration!) and convert to milliseconds
-                  startTime = startTime + note.getDuration() * FACTOR   # update start time (in milliseconds)
-                  velocity = note.getDynamic()
-                   
-                  # accumulate non-REST notes
-                  if (frequency != REST):
-                     noteList.append((start, duration, frequency, velocity, channel, instrument, panning))   # put start time first and duration second, so we can sort easily by start time (below),
-                     # and so that notes that are members of a chord as denoted by having a duration of 0 come before the note that gives the specified chord duration
-                   
-         # sort notes by start time
-         noteList.sort()
-
-         # Schedule playing all notes in noteList
-         chordNotes = []      # used to process notes belonging in a chord
-         for start, duration, pitch, velocity, channel, instrument, panning in noteList:
-            # set appropriate instrument for this channel
-            Play.setInstrument(instrument, channel)
-
-            # handle chord (if any)
-            # Chords are denoted by a sequence of notes having the same start time and 0 duration (except the last note
-            # of the chord).
-            if duration == 0:   # does this note belong in a chord?
-               chordNotes.append([start, duration, pitch, velocity, channel, panning])  # add it to the list of chord notes
-               
-            elif chordNotes == []:   # is this a regular, solo note (not part of a chord)?
-               
-               # yes, so schedule it to play via a Play.note event
-               Play.note(pitch, start, duration, velocity, channel, panning)
-               #print "Play.note(" + str(pitch) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
+         # stream notes as playback goes along?
+         if streaming and engine == "timer":
+            handle = PlaybackHandle()   # will hold upcoming note-on and note-off events for this playback
+            handle.stream( __streamOnsets__(__scoreOnsets__(material), __scheduleMidiOnset__, [handle, {}]) )
+            return handle.start()
 
-            else:   # note has a normal duration and it is part of a chord
+         # get all notes ordered by start time (compiled once, and reused while the material is unchanged)
+         plan = PlaybackPlan.forMaterial(original, material)
 
-               # first, add this note together with this other chord notes
-               chordNotes.append([start, duration, pitch, velocity, channel, panning])
-               
-               # now, schedule all notes in the chord list using last note's duration
-               for start, ignoreThisDuration, pitch, velocity, channel, panning in chordNotes:
-                  # schedule this note using chord's duration (provided by the last note in the chord)
-                  Play.note(pitch, start, duration, velocity, channel, panning)
-                  #print "Chord: Play.note(" + str(pitch) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
-               # now, all chord notes have been scheduled
-
-               # so, clear chord notes to continue handling new notes (if any)
-               chordNotes = []
-   
-         # now, all notes have been scheduled for future playing - scheduled notes can always be stopped using
-         # JEM's stop button - this will stop all running timers (used by Play.note() to schedule playing of notes)
-         #print "Play.note(" + str(pitch) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
+         # let Java's sequencer do the timing?
+         if engine == "sequencer":
+            return __playWithSequencer__( plan )   # yes, so hand it all notes (instrument, panning, etc. are part of the sequence)
+
+         # schedule playing all onsets (notes or chords) in the plan
+         return __playPlan__( plan )
 
       else:   # error check    
          print "Play.midi(): Unrecognized type " + str(type(material)) + ", expected Note, Phrase, Part, or Score."
@@ -1578,13 +5233,11 @@ class Play(jPlay):
             material = Phrase(material)
          if type(material) == jNote:    # (also wrap jMusic default Notes, in addition to our own)
             material = Phrase(material)
-         if type(material) == Phrase:   # no elif - we need to successively wrap from Note to Score
-            material = Part(material)
-         if type(material) == jPhrase:  # (also wrap jMusic default Phrases, in addition to our own)
+         if isinstance(material, jPhrase):   # no elif - we need to successively wrap from Note to Score (also, Repeats and jMusic default Phrases)
             material = Part(material)
          if type(material) == Part:     # no elif - we need to successively wrap from Note to Score
             material = Score(material)
-         if type(material) == Score:
+         if isinstance(material, jScore):
          
             midiSynth.play( material )   # play it!
          
@@ -1635,8 +5288,7 @@ class Play(jPlay):
 
          # also, keep track of how many overlapping instances of this pitch are currently sounding on this channel
          # so that we turn off only the last one - also see frequencyOff()
-         noteID = (pitch, channel)              # create an ID using pitch-channel pair
-         notesCurrentlyPlaying.append(noteID)   # add this note instance to list
+         notesCurrentlyPlaying.noteOn(pitch, channel)   # count this note instance
 
          Play.noteOnPitchBend(pitch, bend, velocity, channel, panning)      # and start it 
 
@@ -1669,14 +5321,11 @@ class Play(jPlay):
 
          # also, keep track of how many overlapping instances of this frequency are currently playing on this channel
          # so that we turn off only the last one - also see frequencyOn()
-         noteID = (pitch, channel)                   # create an ID using pitch-channel pair
-
-         # next, remove this noteID from the list, so that we may check for remaining instances
-         notesCurrentlyPlaying.remove(noteID)        # remove noteID
-         if noteID not in notesCurrentlyPlaying:     # is this last instance of note?
+         # count this note instance out, and check for remaining instances
+         if notesCurrentlyPlaying.noteOff(pitch, channel):     # is this last instance of note?
 
             # yes, so turn it off!
-            channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
+            channelHandle = __channelState__.getChannel(channel)      # get a handle to channel
             channelHandle.noteOff(pitch)                              # and turn it off
 
       else:     # frequency was outside expected range    
@@ -1701,19 +5350,9 @@ class Play(jPlay):
          
       # TODO: We should probably test for negative start times and durations.
          
-      # create a timer for the note-on event
-      noteOn = Timer2(start, Play.noteOn, [pitch, velocity, channel, panning], False)
-
-      # create a timer for the note-off event
-      noteOff = Timer2(start+duration, Play.noteOff, [pitch, channel], False)
-
-      # and activate timers (set things in motion)
-      noteOn.start()
-      noteOff.start()
-      
-      # NOTE:  Upon completion of this function, the two Timer objects become unreferenced.
-      #        When the timers elapse, then the two objects (in theory) should be garbage-collectable,
-      #        and should be eventually cleaned up.  So, here, no effort is made in reusing timer objects, etc.
+      # schedule the note-on and note-off events (see EventScheduler above - no new timers or threads are created)
+      __playScheduler__.scheduleAll( [(start, Play.noteOn, [pitch, velocity, channel, panning], channel), 
+                                      (start+duration, Play.noteOff, [pitch, channel], channel)] )
  
    def frequency(frequency, start, duration, velocity=100, channel=0, panning = -1):
       """Plays a frequency with given 'start' time (in milliseconds from now), 'duration' (in milliseconds
@@ -1726,17 +5365,9 @@ class Play(jPlay):
 
       # TODO: We should probably test for negative start times and durations.
          
-      # create a timer for the frequency-on event
-      frequencyOn = Timer2(start, Play.frequencyOn, [frequency, velocity, channel, panning], False)
-
-      # create a timer for the frequency-off event
-      frequencyOff = Timer2(start+duration, Play.frequencyOff, [frequency, channel], False)
-
-      # call pitchBendNormal to turn off the timer, if it is on
-      #setPitchBendNormal(channel)
-      # and activate timers (set things in motion)
-      frequencyOn.start()
-      frequencyOff.start()
+      # schedule the frequency-on and frequency-off events
+      __playScheduler__.scheduleAll( [(start, Play.frequencyOn, [frequency, velocity, channel, panning], channel), 
+                                      (start+duration, Play.frequencyOff, [frequency, channel], channel)] )
  
       #setPitchBendNormal(channel, start+duration, True)
 
@@ -1765,8 +5396,7 @@ class Play(jPlay):
          
          # and set the pitchbend on the Java synthesizer (this is the only place this is done!)   
          MIDI_pitchbend = bend + PITCHBEND_NORMAL                  # convert to MIDI pitchbend to set  
-         channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-         channelHandle.setPitchBend( MIDI_pitchbend )              # and set it (send message)!
+         __channelState__.setPitchBend( channel, MIDI_pitchbend )  # and set it (send message, if changed)!
 
       else:     # frequency was outside expected range    
 
@@ -1802,15 +5432,14 @@ class Play(jPlay):
       # let's check to make sure.
       if (MIDI_pitchbend <= PITCHBEND_MAX) and (MIDI_pitchbend >= PITCHBEND_MIN):   # is pitchbend within appropriate range?
 
-         # we are OK, so set pitchbend on the Java synthesizer!
-         channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-         channelHandle.setPitchBend( MIDI_pitchbend )              # send message
+         # we are OK, so set pitchbend on the Java synthesizer (only sent if changed)!
+         __channelState__.setPitchBend( channel, MIDI_pitchbend )
 
          # then, also send message to start the note on this channel
-         if panning != -1:                              # if we have a specific panning...
-            channelHandle.controlChange(10, panning)       # ... use it (otherwise, we use the default global panning)
+         if panning != -1:                                          # if we have a specific panning...
+            __channelState__.setController(channel, 10, panning)       # ... use it (otherwise, we use the default global panning)
 
-         channelHandle.noteOn(pitch, velocity)          # and start the note on Java synthesizer
+         __channelState__.getChannel(channel).noteOn(pitch, velocity)   # and start the note on Java synthesizer
 
       else:     # frequency was outside expected range    
 
@@ -1831,26 +5460,32 @@ class Play(jPlay):
       global Java_synthesizer
       
       for channel in range(16):  # cycle through all channels
-         channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
+         channelHandle = __channelState__.getChannel(channel)      # get a handle to channel
          channelHandle.allNotesOff()                               # send the message   
 
          # also reset pitch bend
          Play.setPitchBend(0, channel)      
 
+      notesCurrentlyPlaying.clear()     # nothing is sounding anymore
+
 
    def stop():
       """It stops all Play music from sounding."""
       
-      # NOTE:  This could also handle Play.note() notes, which may have been
-      #        scheduled to start sometime in the future.  For now, we assume that timer.py
-      #        (which provides Timer objects) handles stopping of timers on its own.  If so,
-      #        this takes care of our problem, for all practical purposes.  It is possible
-      #        to have a race condition (i.e., a note that starts playing right when stop()
+      # NOTE:  It is possible to have a race condition (i.e., a note that starts playing right when stop()
       #        is called, but a second call of stop() (e.g., double pressing of a stop button)
       #        will handle this, so we do not concern ourselves with it.
       
-      # first, stop the internal __getMidiSynth__ synthesizers
+      # first, cancel all playbacks (e.g., via Play.midi()), and remove all pending events (e.g., notes scheduled 
+      # via Play.note() to start sometime in the future)
+      for handle in __activePlaybacks__[:]:   # (cancelling a playback removes it from the list, so use a copy)
+         handle.cancel()
+      __playScheduler__.clear()
+      __codeExecutor__.clear()     # also, drop Play.code() function calls waiting for a worker
+
+      # then, stop the internal __getMidiSynth__ synthesizers, and any sequencers used by Play.midi()
       __stopMidiSynths__()
+      __stopSequencers__()
       
       # then, stop all sounding notes
       Play.allNotesOff()
@@ -1859,8 +5494,51 @@ class Play(jPlay):
       # also, stop all audio notes
       Play.allAudioNotesOff()
 
-      # NOTE: In the future, we may also want to handle scheduled notes through Play.note().  This could be done
-      # by creating a list of Timers created via note() and looping through them to stop them here.
+
+   def setLookahead(lookahead):
+      """Sets how early (in milliseconds) the scheduler wakes up before an event is due, to wait out the rest 
+         precisely (default is 5 - see EventScheduler.setLookahead())."""
+
+      __playScheduler__.setLookahead(lookahead)
+
+   def getLookahead():
+      """Returns how early (in milliseconds) the scheduler wakes up before an event is due."""
+
+      return __playScheduler__.getLookahead()
+
+   def setCodeWorkers(workers):
+      """Sets the number of worker threads calling Play.code() functions."""
+
+      __codeExecutor__.setWorkers(workers)
+
+   def getCodeStats(reset=False):
+      """Returns a dictionary with the number of Play.code() function calls submitted, executed, dropped, 
+         coalesced, waiting, and those that missed their deadline (CODE_DEADLINE).  If 'reset' is True, counters 
+         start over."""
+
+      stats = __codeExecutor__.getStats()
+      if reset:
+         __codeExecutor__.resetStats()
+      return stats
+
+   def setInstrumentation(enabled=True, reset=True):
+      """Turns on (or off) measuring how late scheduled events are dispatched, compared to their scheduled time.
+         If 'reset' is True, statistics collected so far are forgotten."""
+
+      if reset:
+         __schedulingMonitor__.reset()
+      __schedulingMonitor__.enabled = enabled
+
+   def getLatency(channel=None):
+      """Returns the lateness histogram (see LatencyHistogram) of events on this channel (or all events, if no
+         channel given).  Use getSummary() on it to get the median (p50), 99th percentile (p99), and max lateness."""
+
+      return __schedulingMonitor__.getLatency(channel)
+
+   def getSchedulingCounts():
+      """Returns the number of pending events, active playbacks, and live threads (see Play.setInstrumentation())."""
+
+      return __schedulingMonitor__.getCounts()
 
 
    def setInstrument(instrument, channel=0):
@@ -1868,16 +5546,14 @@ class Play(jPlay):
       
       global Java_synthesizer
       
-      channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-      channelHandle.programChange(channel, instrument)          # send the message
+      __channelState__.setProgram(channel, instrument)          # send the message (only if instrument changed)
 
    def getInstrument(channel=0):
       """Gets the current instrument for this channel of the Java synthesizer object."""
       
       global Java_synthesizer
       
-      channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-      instrument = channelHandle.getProgram()                   # get the instrument
+      instrument = __channelState__.getProgram(channel)         # get the instrument
       return instrument
 
    def setVolume(volume, channel=0):
@@ -1885,36 +5561,39 @@ class Play(jPlay):
       
       global Java_synthesizer
       
-      channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-      channelHandle.controlChange(7, volume)                    # send the message
+      __channelState__.setController(channel, 7, volume)        # send the message (only if volume changed)
 
    def getVolume(channel=0):
       """Gets the current coarse volume for this channel of the Java synthesizer object."""
 
       global Java_synthesizer
       
-      channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-      return channelHandle.getController(7)                     # obtain the current value for volume controller
+      return __channelState__.getController(channel, 7)         # obtain the current value for volume controller
 
    def setPanning(panning, channel=0):
       """Sets the current panning setting for this channel to the Java synthesizer object."""
       
       global Java_synthesizer
       
-      channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-      channelHandle.controlChange(10, panning)                  # send the message
+      __channelState__.setController(channel, 10, panning)      # send the message (only if panning changed)
 
    def getPanning(channel=0):
       """Gets the current panning setting for this channel of the Java synthesizer object."""
 
       global Java_synthesizer
       
-      channelHandle = Java_synthesizer.getChannels()[channel]   # get a handle to channel
-      return channelHandle.getController(10)                # obtain the current value for panning controller
+      return __channelState__.getController(channel, 10)        # obtain the current value for panning controller
 
 
-   def audio(material, audioSamples, loopFlags=[], envelopes=[]):
-      """Play jMusic material using a list of audio samples as voices"""
+   def audio(material, audioSamples, loopFlags=[], envelopes=[], streaming=False):
+      """Play jMusic material using a list of audio samples as voices.
+         If 'streaming' is True, notes are read from the material as playback goes along (see Play.midi()).
+         Returns a handle to cancel(), pause(), or resume() this playback (see PlaybackHandle).
+      """
+
+      # in headless mode, there is nothing to play (see HEADLESS)
+      if HEADLESS:
+         return PlaybackHandle()   # (a handle with no events, i.e., already done)
 
       # ensure optional parameters have appropriate defaults
       if loopFlags == []:
@@ -1922,106 +5601,44 @@ class Play(jPlay):
       if envelopes == []:         
          envelopes = [Envelope()] * len(audioSamples)
       
+      original = material   # remember material provided (used to look up its playback plan)
+
       # do necessary datatype wrapping (MidiSynth() expects a Score)
+      if type(material) == PackedPhrase:
+         material = material.toPhrase()
       if type(material) == Note:
          material = Phrase(material)
       if type(material) == jNote:    # (also wrap jMusic default Notes, in addition to our own)
          material = Phrase(material)
-      if type(material) == Phrase:   # no elif - we need to successively wrap from Note to Score
-         material = Part(material)
-      if type(material) == jPhrase:  # (also wrap jMusic default Phrases, in addition to our own)
+      if isinstance(material, jPhrase):   # no elif - we need to successively wrap from Note to Score (also, Repeats and jMusic default Phrases)
          material = Part(material)
       if type(material) == Part:     # no elif - we need to successively wrap from Note to Score
          material = Score(material)
-      if type(material) == Score:
+      if isinstance(material, jScore):
 
          # we are good - let's play it then!
 
-         score = material   # by now, material is a score, so create an alias (for readability)
-
-        # loop through all parts and phrases to get all notes
-         noteList = []               # holds all notes
-         tempo = score.getTempo()    # get global tempo (can be overidden by part and phrase tempos)
-         for part in score.getPartArray():   # traverse all parts
-            #NOTE: channel is used as an index for the audio voice
-            channel = part.getChannel()        # get part channel
-            instrument = part.getInstrument()  # get part instrument
-            if part.getTempo() > -1:           # has the part tempo been set?
-               tempo = part.getTempo()            # yes, so update tempo
-            for phrase in part.getPhraseArray():   # traverse all phrases in part
-               if phrase.getInstrument() > -1:        # is this phrase's instrument set?
-                  instrument = phrase.getInstrument()    # yes, so it takes precedence
-               if phrase.getTempo() > -1:          # has the phrase tempo been set?
-                  tempo = phrase.getTempo()           # yes, so update tempo
-     
-               # time factor to convert time from jMusic Score units to milliseconds
-               # (this needs to happen here every time, as we may be using the tempo from score, part, or phrase)
-               FACTOR = 1000 * 60.0 / tempo   
-
-               for index in range(phrase.length()):      # traverse all notes in this phrase
-                  note = phrase.getNote(index)              # and extract needed note data
-                  frequency = note.getFrequency()
-                  panning = note.getPan()
-                  panning = mapValue(panning, 0.0, 1.0, 0, 127)    # map from range 0.0..1.0 (Note panning) to range 0..127 (as expected by Java synthesizer)
-                  start = int(phrase.getNoteStartTime(index) * FACTOR)  # get time and convert to milliseconds
-
-                  # NOTE:  Below we use note length as opposed to duration (getLength() vs. getDuration())
-                  # since note length gives us a more natural sounding note (with proper decay), whereas 
-                  # note duration captures the more formal (printed score) duration (which sounds unnatural).
-                  duration = int(note.getLength() * FACTOR)             # get note length (as oppposed to duration!) and convert to milliseconds
-                  velocity = note.getDynamic()
-                   
-                  # accumulate non-REST notes
-                  if (frequency != REST):
-                     noteList.append((start, duration, frequency, velocity, channel, instrument, panning))   # put start time first and duration second, so we can sort easily by start time (below),
-                     # and so that notes that are members of a chord as denoted by having a duration of 0 come before the note that gives the specified chord duration
-                   
-         # sort notes by start time
-         noteList.sort()
-       
-         # Schedule playing all notes in noteList
-         chordNotes = []      # used to process notes belonging in a chord
-         for start, duration, pitch, velocity, channel, instrument, panning in noteList:
-            # *** not needed, since we are using audio to play back music (was: set appropriate instrument for this channel)
-            #Play.setInstrument(instrument, channel)
-
-            # handle chord (if any)
-            # Chords are denoted by a sequence of notes having the same start time and 0 duration (except the last note
-            # of the chord).
-            if duration == 0:   # does this note belong in a chord?
-               chordNotes.append([start, duration, pitch, velocity, channel, panning])  # add it to the list of chord notes
-               
-            elif chordNotes == []:   # is this a regular, solo note (not part of a chord)?
-               
-               # yes, so schedule it to play via a Play.audioNote event
-               if envelopes:
-                  Play.audioNote(pitch, start, duration, audioSamples[channel], velocity, panning, loopFlags[channel], envelopes[channel])
-               else:
-                  Play.audioNote(pitch, start, duration, audioSamples[channel], velocity, panning)
-               #***print "Play.note(" + str(pitch) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
+         # stream notes as playback goes along?
+         if streaming:
+            handle = PlaybackHandle()   # will hold upcoming note-on and note-off events for this playback
+            handle.stream( __streamOnsets__(__scoreOnsets__(material), __scheduleAudioOnset__, 
+                                            [handle, audioSamples, loopFlags, envelopes]) )
+            return handle.start()
 
-            else:   # note has a normal duration and it is part of a chord
+         # get all notes ordered by start time (compiled once, and reused while the material is unchanged)
+         plan = PlaybackPlan.forMaterial(original, material)
 
-               # first, add this note together with this other chord notes
-               chordNotes.append([start, duration, pitch, velocity, channel, panning])
-               
-               # now, schedule all notes in the chord list using last note's duration
-               for start, ignoreThisDuration, pitch, velocity, channel, panning in chordNotes:
-                  # schedule this note using chord's duration (provided by the last note in the chord)
-                  if listOfEnvelopes:   # have they provided a list of envelopes
-                     Play.audioNote(pitch, start, duration, audioSamples[channel], velocity, panning, loopFlags[channel], envelopes[channel])
-                  else:
-                     Play.audioNote(pitch, start, duration, audioSamples[channel], velocity, panning)
-
-                  #***print "Chord: Play.note(" + str(pitch) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
-               # now, all chord notes have been scheduled
-
-               # so, clear chord notes to continue handling new notes (if any)
-               chordNotes = []
+         # Schedule playing all onsets (notes or chords) in the plan
+         handle = PlaybackHandle()   # holds note-on and note-off events for this playback
+         for i in range( plan.onsetCount() ):
+            __scheduleAudioOnset__( handle, plan.getOnset(i), audioSamples, loopFlags, envelopes )
+
+         # start playing (all events share the same time origin)
+         handle.start()
    
-         # now, all notes have been scheduled for future playing - scheduled notes can always be stopped using
-         # JEM's stop button - this will stop all running timers (used by Play.note() to schedule playing of notes)       
-         #print "Play.note(" + str(pitch) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
+         # now, all notes have been scheduled for future playing - they can be controlled through the handle,
+         # and can always be stopped using JEM's stop button - this will cancel all playbacks (see Play.stop())
+         return handle
 
       else:   # error check    
          print "Play.audio(): Unrecognized type " + str(type(material)) + ", expected Note, Phrase, Part, or Score."
@@ -2037,13 +5654,9 @@ class Play(jPlay):
          # yes, so convert pitch from MIDI number (int) to Hertz (float)
          pitch = noteToFreq(pitch)
 
-      # create timers for note-on and note-off events
-      audioOn  = Timer2(start, Play.audioOn, [pitch, audioSample, velocity, panning, loopAudioSample, envelope], False)
-      audioOff = Timer2(start + duration, Play.audioOff, [pitch, audioSample, envelope], False)
-         
-      # everything is ready, so start timers to schedule playing of note
-      audioOn.start()
-      audioOff.start()
+      # schedule note-on and note-off events
+      __playScheduler__.scheduleAll( [(start, Play.audioOn, [pitch, audioSample, velocity, panning, loopAudioSample, envelope]), 
+                                      (start + duration, Play.audioOff, [pitch, audioSample, envelope])] )
 
 
 
@@ -2162,135 +5775,80 @@ class Play(jPlay):
       
     
 
-   def code(material, functions):
+   def code(material, functions, batch=False, overrun="queue"):
       """Use jMusic material (Score, Part, Phrase, Note) to trigger execution of arbitrary Python functions.
          Parameter 'functions' is a list of functions (at least one, for channel 0), where index corresponds to channel
          (i.e., channel of note being "played" determines which function to call).
+         Functions are called by worker threads (see CallbackExecutor), so slow functions do not delay the music.
+         If 'batch' is True, notes starting together on a channel trigger a single call, with a list of their 
+         arguments (instead of one call per note).  Parameter 'overrun' decides what happens when a channel's 
+         function cannot keep up - "queue" (default), "drop", or "coalesce" (see Play.getCodeStats()).
+         Returns a handle to cancel(), pause(), or resume() this playback (see PlaybackHandle).
       """
       
+      # check overrun policy
+      if overrun not in OVERRUN_POLICIES:
+         print "Play.code(): Unrecognized overrun policy " + str(overrun) + ", expected \"queue\", \"drop\", or \"coalesce\"."
+         return
+
+      original = material   # remember material provided (used to look up its playback plan)
+
       # do necessary datatype wrapping (MidiSynth() expects a Score)
+      if type(material) == PackedPhrase:
+         material = material.toPhrase()
       if type(material) == Note:
          material = Phrase(material)
       if type(material) == jNote:    # (also wrap jMusic default Notes, in addition to our own)
          material = Phrase(material)
-      if type(material) == Phrase:   # no elif - we need to successively wrap from Note to Score
-         material = Part(material)
-         material.setInstrument(-1)     # indicate no default instrument (needed to access global instrument)
-      if type(material) == jPhrase:  # (also wrap jMusic default Phrases, in addition to our own)
+      if isinstance(material, jPhrase):   # no elif - we need to successively wrap from Note to Score (also, Repeats and jMusic default Phrases)
          material = Part(material)
          material.setInstrument(-1)     # indicate no default instrument (needed to access global instrument)
       if type(material) == Part:     # no elif - we need to successively wrap from Note to Score
          material = Score(material)
-      if type(material) == Score:
+      if isinstance(material, jScore):
 
          # we are good - let's play it then!
 
-         score = material   # by now, material is a score, so create an alias (for readability)
-
-
-         # loop through all parts and phrases to get all notes
-         noteList = []               # holds all notes
-         tempo = score.getTempo()    # get global tempo (can be overidden by part and phrase tempos)
-         for part in score.getPartArray():   # traverse all parts
-            channel = part.getChannel()        # get part channel
-            instrument = Play.getInstrument(channel)  # get global instrument for this channel
-            if part.getInstrument() > -1:      # has the part instrument been set?
-               instrument = part.getInstrument()  # yes, so it takes precedence
-            if part.getTempo() > -1:           # has the part tempo been set?
-               tempo = part.getTempo()            # yes, so update tempo
-            for phrase in part.getPhraseArray():   # traverse all phrases in part
-               if phrase.getInstrument() > -1:        # is this phrase's instrument set?
-                  instrument = phrase.getInstrument()    # yes, so it takes precedence
-               if phrase.getTempo() > -1:          # has the phrase tempo been set?
-                  tempo = phrase.getTempo()           # yes, so update tempo
-     
-               # time factor to convert time from jMusic Score units to milliseconds
-               # (this needs to happen here every time, as we may be using the tempo from score, part, or phrase)
-               FACTOR = 1000 * 60.0 / tempo   
-
-               for index in range(phrase.length()):      # traverse all notes in this phrase
-                  note = phrase.getNote(index)              # and extract needed note data
-                  frequency = note.getFrequency()
-                  panning = note.getPan()
-                  panning = mapValue(panning, 0.0, 1.0, 0, 127)    # map from range 0.0..1.0 (Note panning) to range 0..127 (as expected by Java synthesizer)
-                  start = int(phrase.getNoteStartTime(index) * FACTOR)  # get time and convert to milliseconds
-
-                  # NOTE:  Below we use note length as opposed to duration (getLength() vs. getDuration())
-                  # since note length gives us a more natural sounding note (with proper decay), whereas 
-                  # note duration captures the more formal (printed score) duration (which sounds unnatural).
-                  duration = int(note.getLength() * FACTOR)             # get note length (as oppposed to duration!) and convert to milliseconds
-                  velocity = note.getDynamic()
-                   
-                  # accumulate non-REST notes
-                  # if (frequency != REST):
-                  #    noteList.append((start, duration, frequency, velocity, channel, instrument, panning))   # put start time first and duration second, so we can sort easily by start time (below),
-                     # and so that notes that are members of a chord as denoted by having a duration of 0 come before the note that gives the specified chord duration
-
-                  # since they may want to give special meaning to REST notes, accumulate all notes (including RESTs)
-                  # NOTE:  This is different from play.midi() and play.audio()
-                  noteList.append((start, duration, frequency, velocity, channel, instrument, panning))   # put start time first and duration second, so we can sort easily by start time (below),   
-                   
-         # sort notes by start time
-         noteList.sort()
-
-         # Schedule playing all notes in noteList
-         chordNotes = []      # used to process notes belonging in a chord
-         for start, duration, frequency, velocity, channel, instrument, panning in noteList:
-            # set appropriate instrument for this channel
-            #Play.setInstrument(instrument, channel)
-
-            # handle chord (if any)
-            # Chords are denoted by a sequence of notes having the same start time and 0 duration (except the last note
-            # of the chord).
-            if duration == 0:   # does this note belong in a chord?
-               chordNotes.append([start, duration, frequency, velocity, channel, instrument, panning])  # add it to the list of chord notes
-               
-            elif chordNotes == []:   # is this a regular, solo note (not part of a chord)?
-               
-               # yes, so schedule to execute the corresponding function for this note
-
-               # extract function associated with this channel
-               if len(functions) > channel:   # is there a function associated with this channel?
-
-                  # create timer to call this function
-                  function = functions[channel]
-                  functionTimer = Timer2(start, function, [frequency, start, duration, velocity, channel, instrument, panning], False)
-                  functionTimer.start()
-
-               else:   # no, there isn't, so let them know
-
-                  print "Play.code(): No function provided for channel", str(channel) + "."
-
-               #print "Play.note(" + str(frequency) + ", " + str(int(start * FACTOR)) + ", " + str(int(duration * FACTOR)) + ", " + str(velocity) + ", " + str(channel) + ")"
-
-            else:   # note has a normal duration and it is part of a chord
-
-               # first, add this note together with this other chord notes
-               chordNotes.append([start, duration, frequency, velocity, channel, instrument, panning])
-               
-               # now, schedule all notes in the chord list using last note's duration
-               for start, ignoreThisDuration, frequency, velocity, channel, instrument, panning in chordNotes:
-                  # schedule to execute the corresponding function for this note
-
-                  # extract function associated with this channel
-                  if len(functions) > channel:   # is there a function associated with this channel?
-
-                     # create timer to call this function
-                     function = functions[channel]
-                     functionTimer = Timer2(start, function, [frequency, start, duration, velocity, channel, instrument, panning], False)
-                     functionTimer.start()
-
-                  else:   # no, there isn't, so let them know
-
-                     print "Play.code(): No function provided for channel", str(channel) + "."
-
-               # now, all chord notes have been scheduled
-
-               # so, clear chord notes to continue handling new notes (if any)
-               chordNotes = []
+         # get all notes ordered by start time (compiled once, and reused while the material is unchanged)
+         plan = PlaybackPlan.forMaterial(original, material)
+
+         # Schedule calling functions for all notes in the plan
+         # NOTE:  Since they may want to give special meaning to REST notes, we include all notes (including RESTs).
+         #        This is different from play.midi() and play.audio()
+         handle = PlaybackHandle()   # holds function calls for this playback
+         globalInstruments = {}   # holds global instruments for channels (see Play.setInstrument())
+         batches = {}             # holds arguments of notes starting together, indexed by (start, channel) (if batching)
+         for i in range( plan.size() ):
+            start, duration, frequency, velocity, channel, instrument, panning = plan.getNote(i)
+            if instrument == -1:                             # no specific instrument?
+               if channel not in globalInstruments:             # so, use global instrument
+                  globalInstruments[channel] = Play.getInstrument(channel)
+               instrument = globalInstruments[channel]
+
+            # extract function associated with this channel
+            if len(functions) > channel:   # is there a function associated with this channel?
+
+               # schedule calling this function (via a worker, see CallbackExecutor)
+               function = functions[channel]
+               arguments = [frequency, start, duration, velocity, channel, instrument, panning]
+               if not batch:   # one call per note?
+                  handle.addEvent( start, __codeExecutor__.submit, [channel, function, arguments, overrun], channel )
+               elif (start, channel) in batches:   # batching, and other notes start together on this channel?
+                  batches[(start, channel)].append( arguments )   # yes, so join their call
+               else:                               # no, so this is a new call (other notes may join later)
+                  batches[(start, channel)] = [arguments]
+                  handle.addEvent( start, __codeExecutor__.submit, [channel, function, [batches[(start, channel)]], overrun], channel )
+
+            else:   # no, there isn't, so let them know
+
+               print "Play.code(): No function provided for channel", str(channel) + "."
    
-         # now, all notes have been scheduled for future playing - scheduled notes can always be stopped using
-         # JEM's stop button - this will stop all running timers
+         # start calling functions (all events share the same time origin)
+         handle.start()
+
+         # now, all function calls have been scheduled - they can be controlled through the handle,
+         # and can always be stopped using JEM's stop button - this will cancel all playbacks (see Play.stop())
+         return handle
 
       else:   # error check    
          print "Play.code(): Unrecognized type " + str(type(material)) + ", expected Note, Phrase, Part, or Score."
@@ -2313,6 +5871,13 @@ class Play(jPlay):
    frequencyOff = Callable(frequencyOff)  
    allFrequenciesOff = Callable(allFrequenciesOff)  
    stop = Callable(stop)  
+   setLookahead = Callable(setLookahead)
+   getLookahead = Callable(getLookahead)
+   setCodeWorkers = Callable(setCodeWorkers)
+   getCodeStats = Callable(getCodeStats)
+   setInstrumentation = Callable(setInstrumentation)
+   getLatency = Callable(getLatency)
+   getSchedulingCounts = Callable(getSchedulingCounts)
    setInstrument = Callable(setInstrument)  
    getInstrument = Callable(getInstrument)
    setVolume = Callable(setVolume)
@@ -3354,6 +6919,161 @@ except:  # otherwise (if we get an error), we are NOT inside JEM
 # JEM's Stop button is pressed
 __ActiveMidiSequences__ = []     # holds active MidiSequence objects
 
+##### SequenceIndex class ######################################
+
+# A MidiSequence can resume from any time (see MidiSequence.seek()).  To do so quickly, we index its events once, 
+# the first time it seeks (the events of its score, i.e., what is actually played).  The index holds all events in time order, plus checkpoints (every SEEK_CHECKPOINT_INTERVAL 
+# quarter notes) with the state of all channels at that point (instruments, controllers, pitch bend, and notes sounding).
+# The state at any time is found via binary search for the preceding checkpoint, and then replaying the few events
+# up to that time.  Similarly, a tempo map converts between seconds and quarter notes (binary search, too).
+
+SEEK_CHECKPOINT_INTERVAL = 4.0   # quarter notes between checkpoints (i.e., one per 4/4 measure)
+
+class SequenceState():
+   """The state of all MIDI channels at some point in a sequence."""
+
+   def __init__(self):
+      self.programs = {}       # holds instrument, indexed by channel
+      self.controllers = {}    # holds controller value, indexed by (channel, controller)
+      self.pitchBends = {}     # holds (MIDI) pitch bend, indexed by channel
+      self.sounding = {}       # holds velocity of notes sounding, indexed by (channel, pitch)
+
+   def copy(self):
+      state = SequenceState()
+      state.programs = self.programs.copy()
+      state.controllers = self.controllers.copy()
+      state.pitchBends = self.pitchBends.copy()
+      state.sounding = self.sounding.copy()
+      return state
+
+   def update(self, status, data1, data2):
+      """Updates state with this channel message."""
+
+      command = status & 0xF0
+      channel = status & 0x0F
+      if command == 0x90 and data2 > 0:     # note on
+         self.sounding[(channel, data1)] = data2
+      elif command == 0x80 or command == 0x90:   # note off (or note on with zero velocity)
+         self.sounding.pop( (channel, data1), None )
+      elif command == 0xB0:                 # controller
+         self.controllers[(channel, data1)] = data2
+      elif command == 0xC0:                 # program change
+         self.programs[channel] = data1
+      elif command == 0xE0:                 # pitch bend
+         self.pitchBends[channel] = (data2 << 7) | data1
+
+   def getMessages(self):
+      """Returns the channel messages which restore this state, as a list of (status, data1, data2) tuples."""
+
+      messages = []
+      for channel, program in self.programs.items():
+         messages.append( (0xC0 | channel, program, 0) )
+      for (channel, controller), value in self.controllers.items():
+         messages.append( (0xB0 | channel, controller, value) )
+      for channel, bend in self.pitchBends.items():
+         messages.append( (0xE0 | channel, bend & 0x7F, bend >> 7) )
+      for (channel, pitch), velocity in self.sounding.items():
+         messages.append( (0x90 | channel, pitch, velocity) )
+      return messages
+
+
+class SequenceIndex():
+   """Indexes the events of a sequence (a list of MidiTracks) by time, for seeking (see above)."""
+
+   def __init__(self, tracks, interval=SEEK_CHECKPOINT_INTERVAL):
+
+      # merge channel messages from all tracks in time order (ties keep track order)
+      events = []
+      tempos = []     # holds (time, microseconds per quarter note) of tempo changes
+      for trackIndex in range( len(tracks) ):
+         track = tracks[trackIndex]
+         for i in range( track.size() ):
+            status = track.statuses[i]
+            if status == 0xFF:
+               if track.data1[i] == 0x51:     # a tempo event?
+                  data = track.metaData[ track.data2[i] ]
+                  tempos.append( (track.times[i], (data[0] << 16) | (data[1] << 8) | data[2]) )
+            elif 0x80 <= status < 0xF0:       # a channel message?
+               events.append( (track.times[i], trackIndex, i, status, track.data1[i], track.data2[i]) )
+      events.sort()
+
+      self.times = array.array('d', [event[0] for event in events])
+      self.statuses = array.array('i', [event[3] for event in events])
+      self.data1 = array.array('i', [event[4] for event in events])
+      self.data2 = array.array('i', [event[5] for event in events])
+
+      # build tempo map, i.e., where tempo changes are in quarter notes and microseconds
+      tempos.sort( key=lambda tempo: tempo[0] )   # (stable, so the last of several changes at the same time wins)
+      if tempos == [] or tempos[0][0] > 0.0:
+         tempos.insert( 0, (0.0, 500000) )     # MIDI's default tempo (120 BPM) until the first tempo change
+      self.tempoTimes = array.array('d')       # in quarter notes
+      self.tempoMicroseconds = array.array('d')   # same, in microseconds
+      self.tempos = array.array('d')           # microseconds per quarter note
+      microseconds = 0.0
+      for time, tempo in tempos:
+         if len(self.tempoTimes) > 0:
+            microseconds = microseconds + (time - self.tempoTimes[-1]) * self.tempos[-1]
+         self.tempoTimes.append( time )
+         self.tempoMicroseconds.append( microseconds )
+         self.tempos.append( tempo )
+
+      # build checkpoints
+      self.interval = interval
+      self.checkpoints = []         # holds (index of first event after checkpoint, state before it), one per interval
+      state = SequenceState()
+      i = 0
+      checkpointTime = 0.0
+      length = 0.0
+      if len(self.times) > 0:
+         length = self.times[-1]
+      while checkpointTime <= length:
+         while i < len(self.times) and self.times[i] < checkpointTime:
+            state.update( self.statuses[i], self.data1[i], self.data2[i] )
+            i = i + 1
+         self.checkpoints.append( (i, state.copy()) )
+         checkpointTime = checkpointTime + interval
+
+      self.transposition = 0        # semitones to add to all pitches (see transpose())
+
+   def getState(self, time):
+      """Returns the state of all channels just before 'time' (in quarter notes)."""
+
+      checkpoint = min( int(max(time, 0.0) / self.interval), len(self.checkpoints) - 1 )   # index of preceding checkpoint
+      i, state = self.checkpoints[checkpoint]
+      state = state.copy()
+      while i < len(self.times) and self.times[i] < time:   # replay events since checkpoint
+         state.update( self.statuses[i], self.data1[i], self.data2[i] )
+         i = i + 1
+
+      if self.transposition != 0:   # have notes been transposed since indexing?
+         sounding = {}                 # yes, so transpose notes sounding, too
+         for (channel, pitch), velocity in state.sounding.items():
+            sounding[(channel, min(max(pitch + self.transposition, 0), 127))] = velocity
+         state.sounding = sounding
+
+      return state
+
+   def transpose(self, semitones):
+      """Transposes all notes by this many semitones (i.e., after transposing the sequence itself - nothing else,
+         such as timing or controllers, changes, so there is no need to index it again).
+      """
+
+      self.transposition = self.transposition + semitones
+
+   def toQuarterNotes(self, seconds):
+      """Converts time in seconds (at the sequence's own tempo) to quarter notes."""
+
+      microseconds = seconds * 1000000.0
+      i = max( bisect.bisect_right(self.tempoMicroseconds, microseconds) - 1, 0 )   # last tempo change before
+      return self.tempoTimes[i] + (microseconds - self.tempoMicroseconds[i]) / self.tempos[i]
+
+   def toSeconds(self, time):
+      """Converts time in quarter notes to seconds (at the sequence's own tempo)."""
+
+      i = max( bisect.bisect_right(self.tempoTimes, time) - 1, 0 )   # last tempo change before
+      return (self.tempoMicroseconds[i] + (time - self.tempoTimes[i]) * self.tempos[i]) / 1000000.0
+
+
 ##### MidiSequence class ######################################
 
 from time import sleep   # needed to wait for Java's MidiSynth object to initialize
@@ -3372,30 +7092,27 @@ class MidiSequence():
 
          self.filename = material                # assume it's an external MIDI filename
 
-         # load and create the MIDI sample
-         self.score = Score()                    # create an empty score
-         Read.midi(self.score, self.filename)    # load the external MIDI file
+         # open the external MIDI file (the whole file is loaded into a score only when first needed - see __getattr__())
+         self.midiFile = MidiFile(self.filename)
          
       else:  # determine what type of material we have 
 
          # and do necessary datatype wrapping (MidiSynth() expects a Score)
          if type(material) == Note:
             material = Phrase(material)
-         if type(material) == Phrase:   # no elif - we need to successively wrap from Note to Score
-            material = Part(material)
-         if type(material) == jPhrase:  # (also wrap jMusic default Phrases, in addition to our own)
+         if isinstance(material, jPhrase):   # no elif - we need to successively wrap from Note to Score (also, Repeats and jMusic default Phrases)
             material = Part(material)
          if type(material) == Part:     # no elif - we need to successively wrap from Note to Score
             material = Score(material)
          
-         if type(material) == Score:
+         if isinstance(material, jScore):
          
-            self.score = material     # and remember it
+            self.score = __expandRepeats__(material)   # and remember it (jMusic plays only one repetition of Repeats)
             
          else:   # error check    
             raise TypeError("Midi() - Unrecognized type", type(material), "- expected filename (string), Note, Phrase, Part, or Score.")
 
-      # now, self.score contains a Score object
+      # now, self.score contains a Score object (or will, once needed - see __getattr__())
       
       # create Midi sequencer to playback this sample
       self.midiSynth = self.__initMidiSynth__()
@@ -3407,7 +7124,10 @@ class MidiSequence():
       # set tempo factor
       self.tempoFactor = 1.0   # scales whatever tempo is set for the sequence (1.0 means no change) 
 
-      self.defaultTempo = self.score.getTempo()   # remember default tempo
+      if self.__dict__.has_key("score"):          # do we have a score already?
+         self.defaultTempo = self.score.getTempo()   # yes, so remember default tempo
+      else:                                       # no, so get it from the MIDI file (without loading the whole file)
+         self.defaultTempo = self.midiFile.getTempo()
       self.playbackTempo = self.defaultTempo      # set playback tempo to default tempo
 
       # set volume 
@@ -3417,10 +7137,27 @@ class MidiSequence():
       # set MIDI score's default pitch
       self.pitch = pitch                         # remember provided pitch
 
+      # events are indexed the first time we seek (see __getattr__()), not here, so that the MIDI file is not loaded 
+      # until needed
+
       # remember that this MidiSequence has been created and is active (so that it can be stopped by JEM, if desired)
       __ActiveMidiSequences__.append(self)
       
 
+   def __getattr__(self, name):
+      """Loads the score of a MIDI file, and indexes events, the first time they are needed (see __init__())."""
+
+      if name == "score" and self.__dict__.has_key("midiFile"):
+         self.score = Score()                    # create an empty score
+         Read.midi(self.score, self.filename)    # load the external MIDI file
+         return self.score
+      if name == "index":
+         # index the score, since that is what is played (jMusic keeps a single tempo, so a MIDI file's own 
+         # tempo changes would not match playback)
+         self.index = SequenceIndex( __scoreToMidiTracks__(self.score, asJMusic=True) )
+         return self.index
+      raise AttributeError, name
+
    def __initMidiSynth__(self):
       """Creates and initializes a MidiSynth object."""
       
@@ -3526,17 +7263,63 @@ class MidiSequence():
       
       semitones = pitch - self.pitch          # get the pitch change in semitones       
       Mod.transpose( self.score, semitones )  # update score pitch appropriately
+      if self.__dict__.has_key("index"):      # have events been indexed already?
+         self.index.transpose( semitones )       # yes, so update index, too (otherwise, it is built from the updated score)
       
       # do some low-level work inside MidiSynth
       updatedSequence = self.midiSynth.scoreToSeq( self.score )  # get new Midi sequence from updated score            
-      self.positionInMicroseconds = self.sequencer.getMicrosecondPosition()  # remember where to resume
+      time = self.__getQuarterNotes__()                          # remember where to resume
       self.sequencer.setSequence(updatedSequence)                # update the sequence - this restarts playing...
-      self.sequencer.setMicrosecondPosition( self.positionInMicroseconds )   # ...so reset playing to where we left off
+      self.__seekQuarterNotes__( time )                          # ...so reset playing to where we left off
       self.sequencer.setTempoInBPM( self.playbackTempo )         # set tempo (needed for the first (partial) iteration)
 
       # finally, remember new pitch
       self.pitch = pitch
 
+   def seek(self, seconds):
+      """Continues playing from this time (in seconds, at the sequence's default tempo).  Instruments, controllers, 
+         pitch bend, and notes sounding at that time are restored.  Starts playing, if needed."""
+
+      if not self.midiSynth.isPlaying():   # not playing?
+         self.play()                          # start it, so the sequencer has our sequence
+
+      self.__seekQuarterNotes__( self.index.toQuarterNotes(seconds) )
+      self.sequencer.setTempoInBPM( self.playbackTempo )   # (in case we moved across a tempo change)
+
+   def getPosition(self):
+      """Returns the current playback position (in seconds, at the sequence's default tempo), e.g., to resume
+         from there later (see seek())."""
+
+      return self.index.toSeconds( self.__getQuarterNotes__() )
+
+   # low-level helper functions
+   def __getQuarterNotes__(self):
+      """Returns the sequencer's position in quarter notes."""
+
+      sequence = self.sequencer.getSequence()
+      if sequence == None:
+         return 0.0
+      return float( self.sequencer.getTickPosition() ) / sequence.getResolution()
+
+   def __seekQuarterNotes__(self, time):
+      """Moves the sequencer to this time (in quarter notes), and restores channel state at that time."""
+
+      # move sequencer (by tick, i.e., no tempo map scanning needed)
+      tick = int( round(time * self.sequencer.getSequence().getResolution()) )
+      self.sequencer.setTickPosition( tick )
+
+      # restore channel state (notes sounding before this time end via their own note-off events, which are still ahead)
+      # (a new message for every send, as the receiver may hold on to it)
+      receiver = self.sequencer.getTransmitters()[0].getReceiver()  # get the MidiSynth receiver
+      for channel in range(16):
+         message = ShortMessage()
+         message.setMessage(0xB0 + channel, 123, 0)    # all notes off (notes sounding before seek)
+         receiver.send(message, -1)
+      for status, data1, data2 in self.index.getState( time ).getMessages():
+         message = ShortMessage()
+         message.setMessage(status, data1, data2)
+         receiver.send(message, -1)
+
    def getPitch(self):
       """Returns the MIDI score's pitch."""
       
@@ -67,6 +67,7 @@ tension_score.addPart(Part(tension_bass))
 tension_score.addPart(Part(tension_drums))
 tension_score.addPart(Part(tension_strings))
 
-Write.midi(tension_score, "tema_tension_preparacion_extendido.mid")
+Write.midi(tension_score, "tema_tension_preparacion_extendido.mid", incremental=True, async_=True)
 
 Play.midi(tension_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
@@ -33,8 +33,9 @@ menu_score.addPart(Part(menu_chords))
 menu_score.addPart(Part(menu_bass))
 
 # Guardar la música del menú en un archivo MIDI
-Write.midi(menu_score, "menu_inicial_alegre.mid")
+Write.midi(menu_score, "menu_inicial_alegre.mid", incremental=True, async_=True)
 
 # Reproducir la música del menú inicial
 Play.midi(menu_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
 
@@ -61,7 +61,8 @@ combat_score.addPart(Part(combat_drums))
 combat_score.addPart(Part(combat_strings_high))
 
 # Guardar la música de combate en un archivo MIDI
-Write.midi(combat_score, "musica_combate_rapida_tensa.mid")
+Write.midi(combat_score, "musica_combate_rapida_tensa.mid", incremental=True, async_=True)
 
 # Reproducir la música de combate
 Play.midi(combat_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
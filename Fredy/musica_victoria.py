@@ -83,8 +83,9 @@ victory_score.addPart(part_drums)
 victory_score.addPart(part_trumpets)
 
 # Guardar la música de victoria en un archivo MIDI
-Write.midi(victory_score, "musica_victoria.mid")
+Write.midi(victory_score, "musica_victoria.mid", incremental=True, async_=True)
 
 # Reproducir la música de victoria
 Play.midi(victory_score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
 
@@ -23,22 +23,18 @@ accompaniment_pitches = [A4, E5, D5, REST, F5, C5, A4, A4, E5, D5, REST, F5, C5,
 accompaniment_durations = [QN, QN, QN, QN, QN, QN, HN, QN, QN, QN, QN, QN, QN, HN]
 
 # Crear frases extendidas para la melodía principal, armonía, tambores y acompañamiento
-melody = Phrase()
+melody = Repeat(times=2)  # Repetimos la melodía para extenderla
 melody.addNoteList(pitches_main_melody, durations_main_melody)
-melody.addNoteList(pitches_main_melody, durations_main_melody)  # Repetimos la melodía para extenderla
 
-harmony = Phrase()
+harmony = Repeat(times=2)  # Repetimos la armonía también
 harmony.addNoteList(pitches_harmony, durations_harmony)
-harmony.addNoteList(pitches_harmony, durations_harmony)  # Repetimos la armonía también
 
 # Crear frase para los tambores de selva
-jungle_drums = Phrase()
+jungle_drums = Repeat(times=2)  # Repetimos el patrón de tambores
 jungle_drums.addNoteList(jungle_drums_pitches, jungle_drums_durations)
-jungle_drums.addNoteList(jungle_drums_pitches, jungle_drums_durations)  # Repetimos el patrón de tambores
 
-accompaniment = Phrase()
+accompaniment = Repeat(times=2)  # Repetimos el acompañamiento
 accompaniment.addNoteList(accompaniment_pitches, accompaniment_durations)
-accompaniment.addNoteList(accompaniment_pitches, accompaniment_durations)  # Repetimos el acompañamiento
 
 # Crear la partitura y agregar las frases
 score = Score("Música de Aventura en la Selva Extendida", 120)  # BPM ajustado a 120 para el ritmo de aventura
@@ -48,7 +44,8 @@ score.addPart(Part(jungle_drums))
 score.addPart(Part(accompaniment))
 
 # Guardar la partitura en un archivo MIDI
-Write.midi(score, "tema_principal.mid")
+Write.midi(score, "tema_principal.mid", incremental=True, async_=True)
 
 # Reproducir la música extendida con ambiente de selva
 Play.midi(score)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
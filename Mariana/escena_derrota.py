@@ -26,5 +26,6 @@ score_defeat.addPart(Part(melody_defeat))
 score_defeat.addPart(Part(harmony_defeat))
 score_defeat.addPart(Part(drums_defeat))
 
-Write.midi(score_defeat, "tema_derrota.mid")
+Write.midi(score_defeat, "tema_derrota.mid", incremental=True, async_=True)
 Play.midi(score_defeat)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
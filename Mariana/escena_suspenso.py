@@ -24,5 +24,6 @@ score_suspense.addPart(Part(melody_suspense))
 score_suspense.addPart(Part(harmony_suspense))
 score_suspense.addPart(Part(drums_suspense))
 
-Write.midi(score_suspense, "tema_suspenso.mid")
+Write.midi(score_suspense, "tema_suspenso.mid", incremental=True, async_=True)
 Play.midi(score_suspense)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
@@ -24,5 +24,6 @@ score_resolution.addPart(Part(melody_resolution))
 score_resolution.addPart(Part(harmony_resolution))
 score_resolution.addPart(Part(drums_resolution))
 
-Write.midi(score_resolution, "tema_resolucion.mid")
+Write.midi(score_resolution, "tema_resolucion.mid", incremental=True, async_=True)
 Play.midi(score_resolution)
+Write.flush()   # esperar a que se termine de escribir el archivo MIDI
@@ -0,0 +1,122 @@
+# build_soundtrack.py
+#
+# Builds the MIDI files of all scenes (i.e., runs every scene script in Angel, Fredy, and Mariana),
+# in parallel, one Jython process per scene, without playing anything (see HEADLESS in music.py).
+# Each scene's .mid file is written next to its script (only if it changed - see Write.midi()).
+#
+# Usage:  python build_soundtrack.py [--jobs N] [--jython JYTHON] [scene ...]
+#
+# where 'scene' (optional) selects scripts to build by name (e.g., "musica_victoria"), 'N' is the number of
+# scenes built at the same time (default is the number of cores), and 'JYTHON' is the command to run Jython
+# (default is the JYTHON environment variable, or "jython").
+#
+# Works with Python 2.7 or 3.
+#
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool   # each thread waits on its own Jython process
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SCENE_DIRECTORIES = ["Angel", "Fredy", "Mariana"]   # where scene scripts are
+LIBRARY_DIRECTORY = os.path.join(ROOT, "Angel")     # where music.py is
+
+# Runs one scene script inside Jython.  Some scene scripts do not import music themselves,
+# so they are run with music's names already defined.  Jython may keep running (e.g., the Java synthesizer's
+# threads), so we exit explicitly when done.
+BOOTSTRAP = """
+import sys
+sys.path.insert(0, %r)
+__scene__ = {'__name__': '__main__', '__file__': %r}
+exec "from music import *" in __scene__
+status = 0
+try:
+   exec compile(open(%r).read(), __scene__['__file__'], 'exec') in __scene__   # (scene scripts have no encoding declaration)
+except:
+   import traceback
+   traceback.print_exc()
+   status = 1
+try:
+   exec "Write.flush()" in __scene__   # finish any background writes (System.exit() below skips exit handlers)
+except:
+   import traceback
+   traceback.print_exc()
+   status = 1
+sys.stdout.flush()
+sys.stderr.flush()
+from java.lang import System
+System.exit(status)
+"""
+
+def findScenes(names=[]):
+   """Returns the paths of all scene scripts (only those in 'names', if given), sorted."""
+
+   scenes = []
+   for directory in SCENE_DIRECTORIES:
+      for filename in sorted( os.listdir(os.path.join(ROOT, directory)) ):
+         name, extension = os.path.splitext(filename)
+         if extension == ".py" and name != "music" and (names == [] or name in names):
+            scenes.append( os.path.join(ROOT, directory, filename) )
+   return scenes
+
+def buildScene(arguments):
+   """Runs this scene script in a headless Jython process.  Returns (scene, succeeded, seconds, output)."""
+
+   jython, scene = arguments
+   environment = dict(os.environ)
+   environment["JYTHONMUSIC_HEADLESS"] = "1"
+
+   code = BOOTSTRAP % (LIBRARY_DIRECTORY, scene, scene)
+   startTime = time.time()
+   try:
+      process = subprocess.Popen([jython, "-c", code], cwd=os.path.dirname(scene), env=environment,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+      output = process.communicate()[0].decode("utf-8", "replace")
+      succeeded = process.returncode == 0
+   except OSError as error:   # e.g., Jython not found
+      output = "Could not run " + jython + ": " + str(error) + "\n"
+      succeeded = False
+
+   return scene, succeeded, time.time() - startTime, output
+
+def main():
+
+   parser = argparse.ArgumentParser(description="Builds the MIDI files of all scenes, in parallel.")
+   parser.add_argument("scenes", nargs="*", help="names of scenes to build (default is all)")
+   parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="number of scenes built at the same time")
+   parser.add_argument("--jython", default=os.environ.get("JYTHON", "jython"), help="command to run Jython")
+   options = parser.parse_args()
+
+   scenes = findScenes(options.scenes)
+   if scenes == []:
+      print("No scenes found.")
+      return 1
+
+   startTime = time.time()
+   pool = ThreadPool( max(1, min(options.jobs, len(scenes))) )
+   failures = 0
+   try:
+      # report scenes as they finish
+      for scene, succeeded, seconds, output in pool.imap_unordered(buildScene, [(options.jython, scene) for scene in scenes]):
+         name = os.path.relpath(scene, ROOT)
+         if succeeded:
+            print("%-45s %7.2f s" % (name, seconds))
+         else:
+            failures = failures + 1
+            print("%-45s %7.2f s   FAILED" % (name, seconds))
+            sys.stdout.write(output)
+   finally:
+      pool.close()
+      pool.join()
+
+   print("Built %d of %d scenes in %.2f s (%d at a time)." % (len(scenes) - failures, len(scenes),
+         time.time() - startTime, max(1, min(options.jobs, len(scenes)))))
+
+   return 1 if failures > 0 else 0
+
+if __name__ == "__main__":
+   sys.exit( main() )
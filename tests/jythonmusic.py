@@ -0,0 +1,40 @@
+# jythonmusic.py
+#
+# Test support - imports music.py (from Angel) in headless mode (see HEADLESS in music.py), so tests play nothing.
+#
+# The tests need Jython and jMusic.  Run them from the repository root with
+#
+#    jython -m unittest discover -s tests
+#
+# Anywhere else (e.g., under CPython), they are skipped.
+#
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname( os.path.dirname(os.path.abspath(__file__)) )   # the repository
+
+os.environ["JYTHONMUSIC_HEADLESS"] = "1"
+sys.path.insert(0, os.path.join(ROOT, "Angel"))
+
+try:
+   import music
+except (ImportError, SyntaxError):   # not Jython (music.py is Jython 2.7), or no jMusic
+   raise unittest.SkipTest("music.py needs Jython and jMusic")
+
+
+def runScene(scene, directory):
+   """Runs a scene script (e.g., "Fredy/tema_principal.py") with music's names defined, in 'directory' (so the
+      files it writes go there).  Returns the script's namespace."""
+
+   namespace = {"__name__": "__scene__", "__file__": os.path.join(ROOT, scene)}
+   exec("from music import *", namespace)
+   currentDirectory = os.getcwd()
+   os.chdir(directory)
+   try:
+      exec(compile(open(namespace["__file__"]).read(), namespace["__file__"], "exec"), namespace)   # (works in Jython 2.7, too)
+      music.Write.flush()
+   finally:
+      os.chdir(currentDirectory)
+   return namespace
@@ -0,0 +1,115 @@
+# test_midi_optimizer.py
+#
+# Tests the MIDI export optimizer (see Write.midi(score, filename, optimize=True)), i.e., which events it drops,
+# which it keeps, merging tracks, and that an optimization which changes the music is rejected.
+#
+
+import sys
+import unittest
+
+from jythonmusic import music
+from music import Write, MidiFile, MidiTrack
+
+from StringIO import StringIO
+
+
+def tracks():
+   """Returns a tempo track, and a track of notes on channel 0, with some redundant events."""
+
+   tempoTrack = MidiTrack()
+   tempoTrack.addTempo(0.0, 120.0)
+   tempoTrack.addTempo(2.0, 120.0)      # redundant
+   tempoTrack.addTempo(4.0, 90.0)
+
+   track = MidiTrack()
+   track.addEvent(0.0, 0xC0, 5)          # program change
+   track.addEvent(0.0, 0xB0, 7, 100)     # volume
+   track.addEvent(0.0, 0xB0, 10, 64)     # pan
+   track.addEvent(0.0, 0x90, 60, 85)
+   track.addEvent(1.0, 0x80, 60, 0)      # (becomes a note on with velocity 0)
+   track.addEvent(1.0, 0xC0, 5)          # redundant
+   track.addEvent(1.0, 0xB0, 10, 64)     # redundant (jMusic sends pan at the start of every phrase)
+   track.addEvent(1.0, 0xE0, 0, 64)      # pitch bend (center)
+   track.addEvent(1.0, 0x90, 62, 85)
+   track.addEvent(2.0, 0x90, 62, 0)
+   track.addEvent(2.0, 0xE0, 0, 64)      # redundant
+   track.addEvent(2.0, 0xB0, 6, 2)       # data entry (not state, so never redundant)
+   track.addEvent(2.0, 0xB0, 6, 2)
+   track.addEvent(2.0, 0xB0, 121, 0)     # reset all controllers
+   track.addEvent(2.0, 0xB0, 7, 100)     # not redundant (after a reset)
+   track.addEvent(2.0, 0x90, 64, 85)
+   track.addEvent(3.0, 0x90, 64, 0)
+   return [tempoTrack, track]
+
+def events(data, trackIndex=0):
+   """Returns the events of a track in these MIDI file bytes, as (time, status, data1) tuples (data1 is the type
+      of meta events)."""
+
+   track = MidiFile(data=data).getTrack(trackIndex)
+   return [(track.times[i], track.statuses[i], track.data1[i]) for i in range( track.size() )]
+
+
+class OptimizerTest(unittest.TestCase):
+
+   def setUp(self):
+      self.original = Write.midiBytes( tracks() )
+      self.optimized = Write.midiBytes( tracks(), optimize=True )
+
+   def testSmallerAndEquivalent(self):
+      self.assertTrue(len(self.optimized) < len(self.original))
+      self.assertEqual(music.__midiSignature__(self.optimized), music.__midiSignature__(self.original))
+
+   def testMergesToFormat0(self):
+      midiFile = MidiFile(data=self.optimized)
+      self.assertEqual(midiFile.getFormat(), 0)
+      self.assertEqual(midiFile.getTrackCount(), 1)
+
+      midiFile = MidiFile(data=Write.midiBytes( tracks(), optimize=True, midiFormat=1 ))
+      self.assertEqual(midiFile.getFormat(), 1)
+      self.assertEqual(midiFile.getTrackCount(), 2)
+
+   def testTemposAreDeduplicated(self):
+      tempos = [time for time, status, data1 in events(self.optimized) if status == 0xFF and data1 == 0x51]
+      self.assertEqual(tempos, [0.0, 4.0])
+
+   def testRedundantEventsAreDropped(self):
+      optimized = events(self.optimized)
+      self.assertEqual([time for time, status, data1 in optimized if status == 0xC0], [0.0])
+      self.assertEqual([time for time, status, data1 in optimized if status == 0xE0], [1.0])
+      self.assertEqual([time for time, status, data1 in optimized if status == 0xB0 and data1 == 10], [0.0])
+      self.assertEqual([status for time, status, data1 in optimized if status & 0xF0 == 0x80], [])
+
+   def testControllersKept(self):
+      optimized = events(self.optimized)
+      self.assertEqual([time for time, status, data1 in optimized if status == 0xB0 and data1 == 6], [2.0, 2.0])
+      self.assertEqual([time for time, status, data1 in optimized if status == 0xB0 and data1 == 121], [2.0])
+      self.assertEqual([time for time, status, data1 in optimized if status == 0xB0 and data1 == 7], [0.0, 2.0])
+
+   def testChangedMusicIsRejected(self):
+
+      # an optimizer which changes a note
+      optimize = music.__optimizeMidiTracks__
+      def changeNote(tracks, resolution, midiFormat):
+         optimized = optimize(tracks, resolution, midiFormat)
+         for i in range( optimized[0].size() ):
+            if optimized[0].statuses[i] == 0x90:
+               optimized[0].data1[i] = optimized[0].data1[i] + 1    # (a different pitch)
+               break
+         return optimized
+
+      music.__optimizeMidiTracks__ = changeNote
+      stdout = sys.stdout
+      sys.stdout = StringIO()
+      try:
+         data = Write.midiBytes( tracks(), optimize=True )
+         message = sys.stdout.getvalue()
+      finally:
+         sys.stdout = stdout
+         music.__optimizeMidiTracks__ = optimize
+
+      self.assertEqual(data, self.original)      # the original is written instead
+      self.assertTrue("not optimized" in message)
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,121 @@
+# test_midi_writer.py
+#
+# Tests the standard MIDI file writer (see Write.midi() and Write.midiBytes()), against jMusic's own writer,
+# the .mid files committed with the scenes, and by reading back what it writes.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from jythonmusic import music, runScene, ROOT
+from music import Write, MidiFile, NoteArrays, Score, Part, Phrase, Repeat, C4, D4, E4, G4, QN, HN
+
+from jm.midi import SMF, MidiParser
+from java.io import ByteArrayOutputStream
+
+# the Fredy scenes - (script, name of its score, MIDI file it writes)
+FREDY_SCENES = [("Fredy/menu_principal.py",  "menu_score",    "menu_inicial_alegre.mid"),
+                ("Fredy/musica_combate.py",  "combat_score",  "musica_combate_rapida_tensa.mid"),
+                ("Fredy/musica_victoria.py", "victory_score", "musica_victoria.mid"),
+                ("Fredy/tema_principal.py",  "score",         "tema_principal.mid")]
+
+
+def jMusicBytes(score):
+   """Returns the bytes jMusic writes for this score (as jMusic's Write.midi() does, but into memory)."""
+
+   smf = SMF()
+   MidiParser.scoreToSMF(score, smf)
+   stream = ByteArrayOutputStream()
+   smf.write(stream)
+   return music.__byteString__( stream.toByteArray() )
+
+def readBytes(filename):
+   file = open(filename, "rb")
+   try:
+      return file.read()
+   finally:
+      file.close()
+
+def tempoEvents(data):
+   """Returns the tempo events in the first track of this MIDI file, as (beat, tempo) tuples."""
+
+   track = MidiFile(data=data).getTrack(0)
+   events = []
+   for i in range( track.size() ):
+      if track.statuses[i] == 0xFF and track.data1[i] == 0x51:
+         tempo = track.metaData[ track.data2[i] ]
+         events.append( (track.times[i], 60000000.0 / ((tempo[0] << 16) | (tempo[1] << 8) | tempo[2])) )
+   return events
+
+
+class FredySceneTest(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def testScenesMatchJMusicAndCommittedFiles(self):
+      for scene, scoreName, filename in FREDY_SCENES:
+         score = runScene(scene, self.directory)[scoreName]
+         committed = readBytes( os.path.join(ROOT, "Fredy", filename) )
+
+         data = Write.midiBytes(score)
+         self.assertEqual(data, jMusicBytes( music.__expandRepeats__(score) ), scene)   # (jMusic sees one repetition of Repeats)
+         self.assertEqual(data, committed, scene)
+         self.assertEqual(readBytes( os.path.join(self.directory, filename) ), committed, scene)   # (as written by the scene)
+
+   def testRunningStatusReadsTheSame(self):
+      score = runScene("Fredy/tema_principal.py", self.directory)["score"]
+
+      data = Write.midiBytes(score)
+      compact = Write.midiBytes(score, runningStatus=True)
+      self.assertTrue(len(compact) < len(data))
+      self.assertEqual([track.size() for track in MidiFile(data=compact).getTracks()],
+                       [track.size() for track in MidiFile(data=data).getTracks()])
+      self.assertEqual(NoteArrays.fromTracks( MidiFile(data=compact).getTracks() ).starts,
+                       NoteArrays.fromTracks( MidiFile(data=data).getTracks() ).starts)
+
+
+class RoundTripTest(unittest.TestCase):
+
+   def testTempoMap(self):
+      phrase = Phrase()
+      phrase.addNoteList([C4, D4, E4, G4] * 2, [QN] * 8)
+      score = Score( Part(phrase) )
+      score.setTempo(120.0)
+      score.addTempoChange(2.0, 90.0)
+      score.addTempoChange(6.0, 150.0, ramp=True)
+
+      data = Write.midiBytes(score)
+
+      written = tempoEvents(data)
+      expected = score.getTempoMap().getTempoEvents()
+      self.assertEqual(len(written), len(expected))
+      for (beat, tempo), (expectedBeat, expectedTempo) in zip(written, expected):
+         self.assertAlmostEqual(beat, expectedBeat, 6)
+         self.assertAlmostEqual(tempo, expectedTempo, 1)    # (MIDI tempos are whole microseconds per beat)
+
+      notes = NoteArrays.fromTracks( MidiFile(data=data).getTracks() )
+      self.assertEqual(list(notes.starts), [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])
+      self.assertEqual(list(notes.pitches), [C4, D4, E4, G4] * 2)
+
+   def testRepeat(self):
+      repeat = Repeat(times=3)
+      repeat.setStartTime(1.0)
+      repeat.addNoteList([C4, E4], [QN, HN])
+      score = Score( Part(repeat) )
+
+      data = Write.midiBytes(score)
+      self.assertEqual(data, Write.midiBytes( Score(Part(repeat.toPhrase())) ))   # same as writing out all repetitions
+
+      notes = NoteArrays.fromTracks( MidiFile(data=data).getTracks() )
+      self.assertEqual(list(notes.starts), [1.0, 2.0, 4.0, 5.0, 7.0, 8.0])
+      self.assertEqual(list(notes.pitches), [C4, E4] * 3)
+
+
+if __name__ == "__main__":
+   unittest.main()
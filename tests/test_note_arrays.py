@@ -0,0 +1,41 @@
+# test_note_arrays.py
+#
+# Tests importing MIDI events into parallel note arrays (see NoteArrays, and Read.midi(NoteArrays(), filename)).
+#
+
+import os
+import unittest
+
+from jythonmusic import music, ROOT
+from music import NoteArrays, MidiTrack, Read, Write, A4, C4, D4
+
+
+class NoteArraysTest(unittest.TestCase):
+
+   def testNotesStartingTogetherKeepNoteOnOrder(self):
+      # A on at 0, C on at 2, A off at 2, D on at 2 - C must come before D (as it was turned on first)
+      track = MidiTrack()
+      track.addEvent(0.0, 0x90, A4, 80)
+      track.addEvent(2.0, 0x90, C4, 81)
+      track.addEvent(2.0, 0x80, A4, 0)
+      track.addEvent(2.0, 0x90, D4, 82)
+      track.addEvent(3.0, 0x80, C4, 0)
+      track.addEvent(3.0, 0x80, D4, 0)
+
+      notes = NoteArrays.fromTracks([track])
+      self.assertEqual([notes.getNote(i) for i in range( notes.size() )],
+                       [(0.0, 2.0, A4, 80, 0, -1), (2.0, 1.0, C4, 81, 0, -1), (2.0, 1.0, D4, 82, 0, -1)])
+
+   def testRoundTrip(self):
+      notes = NoteArrays()
+      Read.midi(notes, os.path.join(ROOT, "Fredy", "tema_principal.mid"))
+      self.assertTrue(notes.size() > 0)
+
+      again = Read.midiBytes(Write.midiBytes(notes), NoteArrays())
+      self.assertEqual(again.tempo, notes.tempo)
+      self.assertEqual(sorted([again.getNote(i) for i in range( again.size() )]),     # (notes starting together may be
+                       sorted([notes.getNote(i) for i in range( notes.size() )]))     #  in another order, e.g., by channel)
+
+
+if __name__ == "__main__":
+   unittest.main()
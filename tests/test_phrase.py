@@ -0,0 +1,69 @@
+# test_phrase.py
+#
+# Tests Phrase extensions (addNoteList(), and note start times - see Phrase.getNoteStartTime()).
+#
+
+import unittest
+
+from jythonmusic import music
+from music import Phrase, Note, jPhrase, C4, D4, E4, F4, QN, HN, EN
+
+
+class PhraseAddNoteListTest(unittest.TestCase):
+
+   def testNotesAreNotes(self):
+      phrase = Phrase()
+      phrase.addNoteList([C4, D4, 440.0], [QN, QN, QN])
+
+      for note in phrase.getNoteArray():
+         self.assertEqual(type(note), Note)    # (so Note's fixes apply, e.g., setDuration() keeps length proportional)
+
+   def testSetDurationKeepsLengthProportional(self):
+      phrase = Phrase()
+      phrase.addNoteList([C4], [QN])
+
+      note = phrase.getNote(0)
+      note.setDuration(HN)
+      self.assertAlmostEqual(note.getLength(), HN * 0.9)
+
+   def testBadPitchIsRejected(self):
+      self.assertRaises(TypeError, Phrase().addNoteList, [C4, 128], [QN, QN])
+      self.assertRaises(TypeError, Phrase().addNoteList, [C4, -1.0], [QN, QN])
+
+
+class PhraseStartTimeTest(unittest.TestCase):
+
+   def setUp(self):
+      self.phrase = Phrase()
+      self.phrase.setStartTime(1.0)
+      self.phrase.addNoteList([C4, D4, E4, F4], [QN, EN, HN, QN])
+
+   def assertStartTimes(self, startTimes):
+      self.assertEqual([self.phrase.getNoteStartTime(i) for i in range(self.phrase.size())], startTimes)
+      # (and the same as jMusic's)
+      self.assertEqual([jPhrase.getNoteStartTime(self.phrase, i) for i in range(self.phrase.size())], startTimes)
+
+   def testStartTimes(self):
+      self.assertStartTimes([1.0, 2.0, 2.5, 4.5])
+      self.assertEqual(self.phrase.getNoteStartTime(4), -1.0)
+
+   def testStartTimesChangeAfterDurationEdit(self):
+      self.assertStartTimes([1.0, 2.0, 2.5, 4.5])
+      self.phrase.getNote(0).setDuration(HN)
+      self.assertStartTimes([1.0, 3.0, 3.5, 5.5])
+      self.phrase.getNote(1).setRhythmValue(QN)
+      self.assertStartTimes([1.0, 3.0, 4.0, 6.0])
+
+   def testStartTimesChangeAfterRemoveAndAdd(self):
+      self.assertStartTimes([1.0, 2.0, 2.5, 4.5])
+      self.phrase.removeNote(0)                 # (same size, after adding a note below)
+      self.phrase.addNote( Note(C4, HN) )
+      self.assertStartTimes([1.0, 1.5, 3.5, 4.5])
+
+   def testStartTimesChangeAfterSetNote(self):
+      self.phrase.setNote( Note(C4, HN), 1 )
+      self.assertStartTimes([1.0, 2.0, 4.0, 6.0])
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,72 @@
+# test_playback_plan.py
+#
+# Tests caching of compiled playback plans (see PlaybackPlan.forMaterial()).
+#
+
+import unittest
+
+from jythonmusic import music
+from music import PlaybackPlan, Phrase, Part, Score, Note, Mod, C4, E4, G4, QN
+
+
+class PlaybackPlanCacheTest(unittest.TestCase):
+
+   def setUp(self):
+      PlaybackPlan.clearCache()
+      self.phrase = Phrase()
+      self.phrase.addNoteList([C4, E4, G4], [QN, QN, QN])
+
+   def planOf(self, phrase):
+      part = Part(phrase)
+      part.setInstrument(-1)
+      return PlaybackPlan.forMaterial(phrase, Score(part))    # (wrapped as in Play.midi())
+
+   def testUnchangedMaterialIsNotFingerprinted(self):
+      plan = self.planOf(self.phrase)
+
+      fingerprint = music.__fingerprint__
+      def fail(score):
+         self.fail("unchanged material was fingerprinted again")
+      music.__fingerprint__ = fail
+      try:
+         self.assertTrue(self.planOf(self.phrase) is plan)
+      finally:
+         music.__fingerprint__ = fingerprint
+
+   def testChangedMaterialGetsNewPlan(self):
+      plan = self.planOf(self.phrase)
+
+      self.phrase.addNote( Note(C4, QN) )
+      self.assertEqual(self.planOf(self.phrase).size(), plan.size() + 1)
+
+      plan = self.planOf(self.phrase)
+      Mod.transpose(self.phrase, 2)
+      self.assertNotEqual(self.planOf(self.phrase).frequencies, plan.frequencies)
+
+      plan = self.planOf(self.phrase)
+      self.phrase.getNote(0).setDuration(QN * 2)
+      self.assertNotEqual(self.planOf(self.phrase).starts, plan.starts)
+
+   def testChangeToOtherMaterialKeepsPlan(self):
+      plan = self.planOf(self.phrase)
+
+      other = Phrase()
+      other.addNoteList([C4], [QN])
+      self.planOf(other)
+      self.assertTrue(self.planOf(self.phrase) is plan)
+
+   def testIdenticalMaterialSharesPlan(self):
+      twin = Phrase()
+      twin.addNoteList([C4, E4, G4], [QN, QN, QN])
+      self.assertTrue(self.planOf(twin) is self.planOf(self.phrase))
+
+   def testClearCacheAfterDirectChange(self):
+      plan = self.planOf(self.phrase)
+
+      self.phrase.getNote(0).setPitch(E4)    # (not noticed - see PlaybackPlan.clearCache())
+      PlaybackPlan.clearCache()
+      self.assertNotEqual(self.planOf(self.phrase).frequencies, plan.frequencies)
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,37 @@
+# test_sequence_index.py
+#
+# Tests indexing of sequences for seeking (see SequenceIndex and MidiSequence.seek()).
+#
+
+import unittest
+
+from jythonmusic import music
+from music import SequenceIndex, Phrase, Part, Score, Mod, C4, E4, WN, QN
+
+
+class SequenceIndexTest(unittest.TestCase):
+
+   def setUp(self):
+      phrase = Phrase()
+      phrase.addNoteList([C4, E4], [WN, QN])
+      self.score = Score( Part(phrase) )
+
+   def indexOf(self, score):
+      return SequenceIndex( music.__scoreToMidiTracks__(score, asJMusic=True) )
+
+   def testNotesSounding(self):
+      sounding = self.indexOf(self.score).getState(1.0).sounding
+      self.assertEqual([pitch for channel, pitch in sounding.keys()], [C4])
+
+   def testTransposeMatchesIndexOfTransposedScore(self):
+      index = self.indexOf(self.score)
+      index.transpose(2)
+      index.transpose(1)
+
+      Mod.transpose(self.score, 3)
+      for time in [0.0, 1.0, 4.5]:
+         self.assertEqual(index.getState(time).sounding, self.indexOf(self.score).getState(time).sounding)
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,101 @@
+# test_tempo_map.py
+#
+# Tests tempo maps (see TempoMap), and that Play and Write.midi() place notes at the same times, when a score
+# has tempo changes, and a part has its own tempo.
+#
+
+import unittest
+
+from jythonmusic import music
+from music import TempoMap, Score, Part, Phrase, Write, MidiFile, NoteArrays, C4, E4, QN
+
+
+class TempoMapTest(unittest.TestCase):
+
+   def assertRoundTrips(self, tempoMap):
+      for milliseconds in [0.0, 1.0, 250.0, 999.5, 1000.0, 2345.678, 5000.0, 12000.0, 60000.0]:
+         self.assertAlmostEqual(tempoMap.toMilliseconds( tempoMap.toBeats(milliseconds) ), milliseconds, 6)
+      for beat in [0.0, 0.5, 2.0, 3.999, 4.0, 6.25, 8.0, 10.0, 100.0]:
+         self.assertAlmostEqual(tempoMap.toBeats( tempoMap.toMilliseconds(beat) ), beat, 6)
+
+   def testConstant(self):
+      tempoMap = TempoMap(120.0)
+      self.assertEqual(tempoMap.toMilliseconds(4.0), 2000.0)
+      self.assertRoundTrips(tempoMap)
+
+   def testSteps(self):
+      tempoMap = TempoMap(120.0)
+      tempoMap.addChange(2.0, 60.0)
+      tempoMap.addChange(4.0, 180.0)
+      self.assertAlmostEqual(tempoMap.toMilliseconds(4.0), 1000.0 + 2000.0)
+      self.assertRoundTrips(tempoMap)
+
+   def testRamps(self):
+      tempoMap = TempoMap(60.0)
+      tempoMap.addChange(4.0, 120.0, ramp=True)     # accelerando
+      tempoMap.addChange(8.0, 90.0, ramp=True)      # ritardando
+      tempoMap.addChange(8.0, 150.0)                # and a step right after it
+      self.assertAlmostEqual(tempoMap.getTempo(2.0), 90.0)
+      self.assertAlmostEqual(tempoMap.getTempo(9.0), 150.0)
+      self.assertRoundTrips(tempoMap)
+
+
+class PartTempoTest(unittest.TestCase):
+   """A part with its own tempo plays at that tempo, ignoring the score's tempo changes - in Play.midi() and
+      Write.midi() alike."""
+
+   def setUp(self):
+      self.score = Score()
+      self.score.setTempo(120.0)
+      self.score.addTempoChange(2.0, 60.0)
+      self.score.addTempoChange(6.0, 180.0, ramp=True)
+
+      for channel, tempo in [(0, -1), (1, 90.0)]:
+         phrase = Phrase()
+         phrase.addNoteList([C4, E4] * 4, [QN] * 8)
+         part = Part()
+         part.addPhrase(phrase)
+         part.setChannel(channel)
+         if tempo > -1:
+            part.setTempo(tempo)
+         self.score.addPart(part)
+
+   def playedStarts(self):
+      """Returns the note start times (in milliseconds) Play.midi() uses, indexed by channel."""
+
+      starts = {}
+      for start, order, notes in music.__scoreOnsets__(self.score):
+         for note in notes:
+            starts.setdefault(note[4], []).append( note[0] )
+      return starts
+
+   def writtenStarts(self):
+      """Returns the note start times (in quarter notes, i.e., score beats) in the MIDI file Write.midi() writes, 
+         indexed by channel."""
+
+      notes = NoteArrays.fromTracks( MidiFile(data=Write.midiBytes(self.score)).getTracks() )
+      starts = {}
+      for i in range( notes.size() ):
+         starts.setdefault(notes.channels[i], []).append( notes.starts[i] )
+      return starts
+
+   def testPartTempoIgnoresScoreTempoChanges(self):
+      starts = self.playedStarts()[1]
+      self.assertEqual(len(starts), 8)
+      for beat in range(8):
+         self.assertTrue(abs(starts[beat] - beat * 60000.0 / 90.0) < 1.0, (beat, starts[beat]))   # (whole milliseconds)
+
+   def testPlayAndWriteAgree(self):
+      # (compared in score beats - a file has tempo ramps in steps, so only step boundaries are exactly on time)
+      tempoMap = self.score.getTempoMap()
+      played = self.playedStarts()
+      written = self.writtenStarts()
+      self.assertEqual(sorted(written.keys()), [0, 1])
+      for channel in [0, 1]:
+         self.assertEqual(len(written[channel]), len(played[channel]))
+         for writtenStart, playedStart in zip(written[channel], played[channel]):
+            self.assertAlmostEqual(writtenStart, tempoMap.toBeats(playedStart), delta=0.01)   # (ticks, and whole milliseconds)
+
+
+if __name__ == "__main__":
+   unittest.main()